@@ -1,22 +1,51 @@
 from functools import lru_cache
 
-from backend.retrieval.assets import load_retrieval_assets, RetrievalAssets
+from starlette.concurrency import run_in_threadpool
+
+from backend.core.singleflight import get_single_flight as _get_single_flight
+from backend.retrieval.asset_manager import AssetManager
+from backend.retrieval.assets import RetrievalAssets
 from backend.retrieval.reranker import get_reranker as _get_reranker
+from backend.retrieval.result_cache import get_retrieval_cache as _get_retrieval_cache
 from backend.generation.cache import get_cache as _get_cache
-from backend.generation.chain import build_rag_chain
+from backend.generation.chain import build_rag_chain, build_rag_stream_chain
 
 @lru_cache()
-def get_assets() -> RetrievalAssets:
-    return load_retrieval_assets()
+def get_asset_manager() -> AssetManager:
+    def invalidate_caches(assets: RetrievalAssets):
+        get_retrieval_cache().set_index_version(assets.build_id)
+        get_cache().set_index_version(assets.build_id)
+
+    return AssetManager(on_swap=[invalidate_caches])
+
+async def get_assets():
+    # pinned for the whole request; a build swapped out meanwhile is released after it
+    manager = get_asset_manager()
+    if manager.build_id is None:
+        await run_in_threadpool(manager.reload)  # cold load, off the event loop
+    with manager.acquire() as assets:
+        yield assets
 
 @lru_cache()
 def get_reranker():
     return _get_reranker()
 
+@lru_cache()
+def get_retrieval_cache():
+    return _get_retrieval_cache()
+
 @lru_cache()
 def get_cache():
     return _get_cache()
 
+@lru_cache()
+def get_single_flight():
+    return _get_single_flight()
+
 @lru_cache()
 def get_chain():
-    return build_rag_chain()
\ No newline at end of file
+    return build_rag_chain()
+
+@lru_cache()
+def get_stream_chain():
+    return build_rag_stream_chain()
@@ -1,19 +1,70 @@
-from fastapi import FastAPI, Depends
+import json
+import secrets
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from backend.core.config import get_settings
 from backend.core.logging import setup_logging, get_logger
 
-from backend.api.schemas import QueryRequest, QueryResponse
-from backend.api.deps import get_assets, get_reranker, get_cache, get_chain
-from backend.retrieval.retriever import build_merged_chunks
+from backend.api.schemas import QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryItem
+from backend.api.deps import (
+    get_assets, get_reranker, get_cache, get_chain, get_stream_chain, get_retrieval_cache, get_asset_manager,
+    get_single_flight,
+)
+from backend.core.metrics import CACHE_LOOKUPS, QUERY_TTFT, render_metrics
+from backend.core.query_context import QueryContext
+from backend.core.tracing import record, setup_tracing, span
+from backend.generation.chain import AnswerStream, track_token_usage
+from backend.retrieval.retriever import aretrieve_top_chunks, aretrieve_top_chunks_batch
 
 logger = get_logger(__name__)
 
+NO_INFO_ANSWER = "I don't have enough information in the provided documents to answer this."
+
+def cited_sources(top_chunks: list[dict], cited: list[str] | None) -> list[str]:
+    """LLM-cited sources that are file names of the retrieved chunks."""
+    valid_files = {c.get("metadata", {}).get("file_name") for c in top_chunks if c.get("metadata", {}).get("file_name")}
+    return sorted(set(s for s in (cited or []) if s in valid_files))
+
+def debug_payload(top_chunks: list[dict], timings: dict | None = None) -> dict:
+    payload = {
+        "retrieved_chunks": [
+            {
+                "id": c.get("id"),
+                "doc": c.get("metadata", {}).get("file_name"),
+                "text": c.get("text", "")[:2000]
+            }
+            for c in top_chunks
+        ]
+    }
+    if timings is not None:
+        payload["timings_ms"] = dict(timings)
+    return payload
+
+def count_cache_lookup(answer: str | None) -> None:
+    CACHE_LOOKUPS.inc(cache="answer", result="hit" if answer else "miss")
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 def create_app() -> FastAPI:
     s = get_settings()
     setup_logging(s.LOG_LEVEL)
+    if s.OTEL_ENABLED:
+        setup_tracing(s.OTEL_SERVICE_NAME)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # pick up builds published by run_ingestion without restarting the workers
+        manager = get_asset_manager()
+        manager.start_watching(s.INDEX_WATCH_INTERVAL_S)
+        yield
+        manager.stop_watching()
 
-    app = FastAPI(title="LegalMind API", version="1.0.0")
+    app = FastAPI(title="LegalMind API", version="1.0.0", lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
@@ -25,60 +76,227 @@ def create_app() -> FastAPI:
     def health():
         return {"status": "ok"}
 
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        # Prometheus text format; counters and histograms are per API process
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    @app.post("/admin/reload")
+    def reload_endpoint(x_admin_token: str = Header(default="")):
+        if not s.ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, s.ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        try:
+            return get_asset_manager().reload()
+        except Exception as e:
+            logger.error(f"[api] reload failed: {e}")
+            raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous build: {e}")
+
     @app.post("/query", response_model=QueryResponse)
-    def query_endpoint(
+    async def query_endpoint(
         request: QueryRequest,
         assets=Depends(get_assets),
         reranker=Depends(get_reranker),
         cache=Depends(get_cache),
         chain=Depends(get_chain),
+        retrieval_cache=Depends(get_retrieval_cache),
+        single_flight=Depends(get_single_flight),
     ):
         logger.info(f"[api] question={request.question}")
 
-        # 1) cache
-        cached = cache.check(request.question)
-        if cached:
-            return QueryResponse(answer=cached, sources=[], cache_hit=True)
-
-        # 2) hybrid retrieval
-        merged_chunks = build_merged_chunks(assets, request.question, top_k=20)
-
-        # optional metadata filter (doc_type)
-        if request.doc_type:
-            merged_chunks = [
-                c for c in merged_chunks
-                if c.get("metadata", {}).get("doc_type") == request.doc_type
-            ]
-
-        # 3) rerank
-        top_chunks = reranker.rerank(request.question, merged_chunks, top_n=5)
-
-        # 4) generate (structured: answer + sources_used from LLM)
-        output = chain.invoke({"question": request.question, "chunks": top_chunks})
-
-        # 5) use LLM-cited sources only; validate against actual chunk file names
-        valid_files = {c.get("metadata", {}).get("file_name") for c in top_chunks if c.get("metadata", {}).get("file_name")}
-        sources = sorted(set(s for s in (output.sources_used or []) if s in valid_files))
-
-        # don't cache "no info" fallback answers to avoid polluting the cache
-        _no_info = "I don't have enough information in the provided documents to answer this."
-        if output.answer.strip() != _no_info:
-            cache.save(request.question, output.answer)
-
-        debug_payload = None
-        if request.debug:
-            debug_payload = {
-                "retrieved_chunks": [
-                    {
-                        "id": c.get("id"),
-                        "doc": c.get("metadata", {}).get("file_name"),
-                        "text": c.get("text", "")[:2000]
-                    }
-                    for c in top_chunks
-                ]
-            }
+        # the question is embedded at most once, shared by cache lookup, vector search and cache save
+        filters = {"doc_type": request.doc_type} if request.doc_type else None
+        ctx = QueryContext(request.question, embedder=assets.embedder, filters=filters, index_version=assets.build_id)
+
+        async def answer() -> dict:
+            # every stage is timed into ctx.timings and query_stage_seconds (see tracing.span)
+            with span("query", ctx.timings, endpoint="/query"):
+                # 1) cache
+                with span("cache_lookup", ctx.timings):
+                    cached = await cache.acheck(ctx)
+                count_cache_lookup(cached)
+                if cached:
+                    return QueryResponse(answer=cached, sources=[], cache_hit=True).model_dump()
+
+                # 2) hybrid retrieval (optional doc_type filter applied inside both legs) + 3) rerank,
+                # or the cached reranked rows of an identical earlier retrieval
+                top_chunks = await aretrieve_top_chunks(assets, ctx, reranker, retrieval_cache, top_k=20, top_n=5)
+
+                # 4) generate (structured: answer + sources_used from LLM)
+                with span("llm", ctx.timings), track_token_usage():
+                    output = await chain.ainvoke({"question": request.question, "chunks": top_chunks})
+
+                # 5) use LLM-cited sources only; validate against actual chunk file names
+                sources = cited_sources(top_chunks, output.sources_used)
+
+                # don't cache "no info" fallback answers to avoid polluting the cache
+                if output.answer.strip() != NO_INFO_ANSWER:
+                    await cache.asave(ctx, output.answer)
+
+            debug = debug_payload(top_chunks, ctx.timings) if request.debug else None
+            return QueryResponse(answer=output.answer, sources=sources, cache_hit=False, debug=debug).model_dump()
+
+        # identical questions asked while this one runs (same text, filters, build) wait for
+        # its answer instead of missing the not-yet-saved cache entry and running it again
+        return await single_flight.do(f"{ctx.key}:{int(request.debug)}", answer)
+
+    @app.post("/query/batch")
+    async def query_batch_endpoint(
+        request: BatchQueryRequest,
+        assets=Depends(get_assets),
+        reranker=Depends(get_reranker),
+        cache=Depends(get_cache),
+        chain=Depends(get_chain),
+        retrieval_cache=Depends(get_retrieval_cache),
+    ):
+        """Many questions in one request, answered as newline-delimited JSON: one BatchQueryItem
+        per question as soon as it is done (cache hits first), `index` giving its position."""
+        if len(request.queries) > s.BATCH_QUERY_MAX_SIZE:
+            raise HTTPException(status_code=413, detail=f"At most {s.BATCH_QUERY_MAX_SIZE} queries per batch")
+        logger.info(f"[api] batch of {len(request.queries)} questions")
+        queries = request.queries
+        ctxs = [
+            QueryContext(
+                q.question,
+                embedder=assets.embedder,
+                filters={"doc_type": q.doc_type} if q.doc_type else None,
+                index_version=assets.build_id,
+            )
+            for q in queries
+        ]
+
+        async def items():
+            sent = set()
+
+            def line(item: BatchQueryItem) -> str:
+                sent.add(item.index)
+                return item.model_dump_json() + "\n"
+
+            try:
+                # 1) cache: one pipelined pass for the whole batch
+                with span("cache_lookup_batch"):
+                    cached = await cache.acheck_many(ctxs)
+                for i, answer in enumerate(cached):
+                    count_cache_lookup(answer)
+                    if answer:
+                        yield line(BatchQueryItem(index=i, answer=answer, cache_hit=True))
+                todo = [i for i, answer in enumerate(cached) if not answer]
+                if not todo:
+                    return
+
+                # 2) + 3) one embedding request, batched FAISS / BM25 per filter group, bounded reranks
+                retrieved = await aretrieve_top_chunks_batch(
+                    assets, [ctxs[i] for i in todo], reranker, retrieval_cache,
+                    top_k=20, top_n=5, concurrency=s.BATCH_CONCURRENCY,
+                )
+                generate = []
+                for i, chunks in zip(todo, retrieved):
+                    if isinstance(chunks, Exception):
+                        yield line(BatchQueryItem(index=i, error=f"Retrieval failed: {chunks}"))
+                    else:
+                        generate.append((i, chunks))
+
+                # 4) + 5) generations BATCH_CONCURRENCY at a time, each sent as it completes
+                inputs = [{"question": queries[i].question, "chunks": chunks} for i, chunks in generate]
+                outputs = chain.abatch_as_completed(
+                    inputs, config={"max_concurrency": s.BATCH_CONCURRENCY}, return_exceptions=True
+                )
+                with track_token_usage():
+                    async for n, output in outputs:
+                        i, chunks = generate[n]
+                        if isinstance(output, Exception):
+                            logger.error(f"[api] batch item {i} failed: {output}")
+                            yield line(BatchQueryItem(index=i, error=f"Generation failed: {output}"))
+                            continue
+                        if output.answer.strip() != NO_INFO_ANSWER:
+                            await cache.asave(ctxs[i], output.answer)
+                        yield line(BatchQueryItem(
+                            index=i,
+                            answer=output.answer,
+                            sources=cited_sources(chunks, output.sources_used),
+                            debug=debug_payload(chunks, ctxs[i].timings) if queries[i].debug else None,
+                        ))
+            except Exception as e:
+                logger.error(f"[api] batch failed: {e}")
+                for i in range(len(queries)):
+                    if i not in sent:
+                        yield line(BatchQueryItem(index=i, error=str(e)))
+
+        return StreamingResponse(items(), media_type="application/x-ndjson")
+
+    @app.post("/query/stream")
+    async def query_stream_endpoint(
+        request: QueryRequest,
+        assets=Depends(get_assets),
+        reranker=Depends(get_reranker),
+        cache=Depends(get_cache),
+        chain=Depends(get_stream_chain),
+        retrieval_cache=Depends(get_retrieval_cache),
+    ):
+        """Server-sent events: `token` events ({"text"}) as the answer is generated, then one
+        `done` event ({"sources", "cache_hit", "ttft_ms", "debug"}), or `error` ({"detail"})."""
+        start = time.perf_counter()
+        logger.info(f"[api] stream question={request.question}")
+        filters = {"doc_type": request.doc_type} if request.doc_type else None
+        ctx = QueryContext(request.question, embedder=assets.embedder, filters=filters, index_version=assets.build_id)
+
+        # the assets dependency stays pinned until the response has been fully streamed
+        async def events():
+            ttft_ms = None
+
+            def first_token(cache_hit: bool) -> None:
+                nonlocal ttft_ms
+                if ttft_ms is None:
+                    ttft = time.perf_counter() - start
+                    QUERY_TTFT.observe(ttft, cache_hit=cache_hit)
+                    ttft_ms = round(ttft * 1000, 1)
+                    logger.info(f"[api] ttft={ttft_ms}ms cache_hit={cache_hit}")
+
+            try:
+                # 1) cache: the whole answer goes out as the first event
+                with span("cache_lookup", ctx.timings):
+                    cached = await cache.acheck(ctx)
+                count_cache_lookup(cached)
+                if cached:
+                    first_token(cache_hit=True)
+                    record("query", time.perf_counter() - start, ctx.timings)
+                    yield sse("token", {"text": cached})
+                    yield sse("done", {"sources": [], "cache_hit": True, "ttft_ms": ttft_ms, "debug": None})
+                    return
+
+                # 2) + 3) retrieval and rerank, as in /query
+                top_chunks = await aretrieve_top_chunks(assets, ctx, reranker, retrieval_cache, top_k=20, top_n=5)
+
+                # 4) generate, forwarding answer text as it arrives; the sources trailer is held back
+                # (timed by hand: a span can't stay current across the yields)
+                answer = AnswerStream()
+                llm_start = time.perf_counter()
+                with track_token_usage():
+                    async for chunk in chain.astream({"question": request.question, "chunks": top_chunks}):
+                        delta = answer.feed(chunk)
+                        if delta:
+                            first_token(cache_hit=False)
+                            yield sse("token", {"text": delta})
+                record("llm", time.perf_counter() - llm_start, ctx.timings)
+                if delta := answer.close():
+                    first_token(cache_hit=False)
+                    yield sse("token", {"text": delta})
+
+                # 5) cited sources, validated as in /query
+                sources = cited_sources(top_chunks, answer.sources)
+                text = answer.answer.strip()
+                if text and text != NO_INFO_ANSWER:
+                    await cache.asave(ctx, text)
+
+                record("query", time.perf_counter() - start, ctx.timings)
+                debug = debug_payload(top_chunks, ctx.timings) if request.debug else None
+                yield sse("done", {"sources": sources, "cache_hit": False, "ttft_ms": ttft_ms, "debug": debug})
+            except Exception as e:
+                logger.error(f"[api] stream failed: {e}")
+                yield sse("error", {"detail": str(e)})
 
-        return QueryResponse(answer=output.answer, sources=sources, cache_hit=False, debug=debug_payload)
+        # no-cache / no proxy buffering, or tokens arrive in bursts
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
 
     return app
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Any
 
 class QueryRequest(BaseModel):
@@ -10,4 +10,15 @@ class QueryResponse(BaseModel):
     answer: str
     sources: list[str]
     cache_hit: bool = False
-    debug: Optional[dict[str, Any]] = None 
\ No newline at end of file
+    debug: Optional[dict[str, Any]] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: list[QueryRequest] = Field(min_length=1)
+
+class BatchQueryItem(BaseModel):
+    index: int                    # position in BatchQueryRequest.queries
+    answer: str | None = None
+    sources: list[str] = []
+    cache_hit: bool = False
+    error: str | None = None
+    debug: Optional[dict[str, Any]] = None
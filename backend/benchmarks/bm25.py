@@ -0,0 +1,69 @@
+"""BM25 query latency: rank_bm25.BM25Okapi + full sort vs BM25Index + partial top-k.
+
+Run from project root:
+    python -m backend.benchmarks.bm25 --docs 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from backend.benchmarks.synthetic import legal_corpus, legal_queries
+from backend.retrieval.bm25_index import BM25Index
+from backend.retrieval.bm25_search import top_k_indices
+
+
+def _okapi_top_k(bm25, tokens, k):
+    scores = bm25.get_scores(tokens)
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+
+
+def _index_top_k(bm25, tokens, k):
+    return top_k_indices(bm25.get_scores(tokens), k).tolist()
+
+
+def _time_queries(fn, bm25, queries, k):
+    latencies, ranked = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        ranked.append(fn(bm25, q.split(), k))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return ranked, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = legal_corpus(args.docs)
+    queries = legal_queries(args.queries)
+
+    report = {"docs": args.docs, "queries": args.queries, "k": args.k}
+    ranked = {}
+    for name, build, search in (
+        ("bm25okapi", BM25Okapi, _okapi_top_k),
+        ("bm25index", BM25Index.from_corpus, _index_top_k),
+    ):
+        t0 = time.perf_counter()
+        bm25 = build(corpus)
+        build_s = time.perf_counter() - t0
+        ranked[name], lat = _time_queries(search, bm25, queries, args.k)
+        report[name] = {
+            "build_s": round(build_s, 2),
+            "p50_ms": round(float(np.percentile(lat, 50)), 2),
+            "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        }
+        del bm25
+
+    report["same_ranking"] = ranked["bm25okapi"] == ranked["bm25index"]
+    report["speedup_p50"] = round(report["bm25okapi"]["p50_ms"] / report["bm25index"]["p50_ms"], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Memory cost of the FAISS index across several worker processes, heap load vs mmap.
+
+Every worker loads the same index file, runs a few searches to fault its pages in and
+reports RSS plus PSS/USS from /proc/self/smaps_rollup (Linux). RSS counts shared page
+cache in every process; PSS splits it between them, so sum(PSS) is the real footprint.
+
+Run from project root:
+    python -m backend.benchmarks.mmap_rss --workers 8 --n 200000 --dim 384
+    python -m backend.benchmarks.mmap_rss --workers 8 --index ./storage/vectors.faiss
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from backend.core.vectorstores.faiss_vector_store import (
+    create_faiss_index,
+    train_faiss_index,
+    read_faiss_index,
+    describe_faiss_index,
+)
+
+
+def memory_mb() -> dict:
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Private_Clean": "uss_mb", "Private_Dirty": "uss_mb"}
+    out = {"rss_mb": 0.0, "pss_mb": 0.0, "uss_mb": 0.0}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in fields:
+                out[fields[key]] += int(rest.split()[0]) / 1024
+    return out
+
+
+def _worker(path: str, index_type: str, mmap: bool, n_queries: int, barrier, results):
+    faiss.omp_set_num_threads(1)
+    before = memory_mb()
+    t0 = time.perf_counter()
+    index = read_faiss_index(path, index_type=index_type, mmap=mmap)
+    load_s = time.perf_counter() - t0
+
+    rng = np.random.default_rng(os.getpid())
+    index.search(rng.standard_normal((n_queries, index.d)).astype("float32"), 20)
+
+    barrier.wait()  # every worker holds the index while we measure
+    after = memory_mb()
+    results.put({"load_s": load_s, **{k: after[k] - before[k] for k in after}})
+    barrier.wait()
+
+
+def measure(path: str, index_type: str, mmap: bool, workers: int, n_queries: int) -> dict:
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, index_type, mmap, n_queries, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    return {
+        "mode": "mmap" if mmap else "heap",
+        "workers": workers,
+        "load_s_max": round(max(r["load_s"] for r in rows), 3),
+        "rss_mb_per_worker": round(float(np.mean([r["rss_mb"] for r in rows])), 1),
+        "uss_mb_per_worker": round(float(np.mean([r["uss_mb"] for r in rows])), 1),
+        "pss_mb_total": round(sum(r["pss_mb"] for r in rows), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--type", default="flat", help="index type for the synthetic index")
+    parser.add_argument("--index", help="existing FAISS index file instead of a synthetic one")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path, index_type = args.index, args.type
+        if path:
+            index_type = describe_faiss_index(faiss.read_index(path))["type"]
+        else:
+            rng = np.random.default_rng(0)
+            vectors = rng.standard_normal((args.n, args.dim)).astype("float32")
+            index = create_faiss_index(args.dim, index_type, n_train=args.n, nlist=256)
+            train_faiss_index(index, vectors)
+            index.add(vectors)
+            path = os.path.join(tmp, "index.faiss")
+            faiss.write_index(index, path)
+            del index, vectors
+
+        report = {
+            "index_type": index_type,
+            "file_mb": round(os.path.getsize(path) / 2**20, 1),
+            "results": [measure(path, index_type, mmap, args.workers, args.queries) for mmap in (False, True)],
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""Retrieval benchmark on synthetic legal-style corpora: build, load, memory and query latency.
+
+For each corpus size, one child process builds the indexes through the real ingestion path
+(index_batches: embed_nodes -> FAISS || BM25 + node store, manifest) with the deterministic
+local embedder, and a fresh one loads the build with load_retrieval_assets and times
+vector_search, bm25_search, reciprocal_rank_fusion and build_merged_chunks (with and
+without a doc_type filter). Each phase runs in its own process, so one size's memory doesn't
+inflate the next. Latencies are per query, one at a time, as a serving worker sees them;
+throughput is also measured with --clients concurrent callers.
+
+The JSON report records the machine, settings and commit, so runs can be compared across
+releases; --baseline compares against an earlier report and exits 1 on regressions.
+
+Run from project root:
+    python -m backend.benchmarks.retrieval                                   # 10k, 100k, 1M chunks
+    python -m backend.benchmarks.retrieval --sizes 10000 100000 --out bench/retrieval.json
+    python -m backend.benchmarks.retrieval --baseline bench/retrieval-1.0.json --tolerance 1.25
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import faiss
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from backend.benchmarks.mmap_rss import memory_mb
+from backend.benchmarks.synthetic import legal_corpus_batches, legal_queries
+
+CHUNKS_PER_FILE = 40
+_FILE_KINDS = ("contract", "case", "memo")  # infer_doc_type: contract, case_file, other
+
+# settings every benchmark process runs with (children inherit the environment)
+_BENCH_ENV = {
+    "EMBED_PROVIDER": "local",
+    "EMBED_CACHE_PATH": "",  # measure embedding, not cache reads
+    "QUERY_EMBED_CACHE_SIZE": "0",
+}
+
+
+def synthetic_nodes(n_chunks: int, batch_size: int, seed: int = 0):
+    """Lists of TextNodes shaped like the chunker's output, CHUNKS_PER_FILE per synthetic file."""
+    from backend.ingestion.chunker import infer_doc_type
+
+    row = 0
+    for docs in legal_corpus_batches(n_chunks, batch_size=batch_size, seed=seed):
+        nodes = []
+        for tokens in docs:
+            file_no = row // CHUNKS_PER_FILE
+            file_name = f"{_FILE_KINDS[file_no % len(_FILE_KINDS)]}_{file_no}.pdf"
+            nodes.append(TextNode(
+                id_=f"chunk-{row}",
+                text=" ".join(tokens),
+                metadata={"file_name": file_name, "doc_type": infer_doc_type(file_name)},
+            ))
+            row += 1
+        yield nodes
+
+
+def _timed(iterable, spent: list[float]):
+    """Yield from iterable, adding the time spent producing items to spent[0]."""
+    it = iter(iterable)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        finally:
+            spent[0] += time.perf_counter() - t0
+        yield item
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def build_phase(n_chunks: int, storage_dir: str, batch_size: int, seed: int) -> dict:
+    """Child process: build the indexes of a synthetic corpus into storage_dir."""
+    from backend.core.embeddings.factory import get_embedder
+    from backend.core.vectorstores.faiss_vector_store import describe_faiss_index
+    from backend.ingestion.indexer import write_manifest
+    from backend.ingestion.pipeline import index_batches
+
+    embedder = get_embedder()
+    generate_s = [0.0]
+    t0 = time.perf_counter()
+    index = index_batches(_timed(synthetic_nodes(n_chunks, batch_size, seed), generate_s), embedder, storage_dir)
+    write_manifest(
+        embedder_name=embedder.name,
+        embed_dim=embedder.dimension,
+        storage_dir=storage_dir,
+        vector_index=describe_faiss_index(index),
+        build_id=f"bench-{n_chunks}",
+    )
+    build_s = time.perf_counter() - t0 - generate_s[0]
+    return {
+        "generate_s": round(generate_s[0], 2),
+        "build_s": round(build_s, 2),
+        "chunks_per_s": round(n_chunks / build_s, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "files_mb": {
+            name: round(os.path.getsize(os.path.join(storage_dir, name)) / 2**20, 1)
+            for name in sorted(os.listdir(storage_dir))
+        },
+    }
+
+
+def _latency_stats(latencies_ms: np.ndarray) -> dict:
+    return {
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "qps": round(len(latencies_ms) / (latencies_ms.sum() / 1000), 1),
+    }
+
+
+def _measure(fn, args: list, clients: int) -> dict:
+    fn(args[0])  # warm-up: first-touch page faults, lazy imports
+    latencies = np.empty(len(args))
+    for i, arg in enumerate(args):
+        t0 = time.perf_counter()
+        fn(arg)
+        latencies[i] = (time.perf_counter() - t0) * 1000
+    stats = _latency_stats(latencies)
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        t0 = time.perf_counter()
+        list(pool.map(fn, args))
+        stats[f"qps_{clients}_clients"] = round(len(args) / (time.perf_counter() - t0), 1)
+    return stats
+
+
+def query_phase(storage_dir: str, n_queries: int, top_k: int, clients: int, seed: int) -> dict:
+    """Child process: load the build in storage_dir and time each retrieval stage."""
+    from backend.core.embeddings.factory import get_embedder
+    from backend.core.query_context import QueryContext
+    from backend.retrieval.asset_manager import check_assets
+    from backend.retrieval.assets import load_retrieval_assets
+    from backend.retrieval.bm25_search import bm25_search
+    from backend.retrieval.fusion import reciprocal_rank_fusion
+    from backend.retrieval.retriever import build_merged_chunks
+    from backend.retrieval.vector_search import vector_search
+
+    before = memory_mb()
+    t0 = time.perf_counter()
+    assets = load_retrieval_assets(storage_dir)
+    check_assets(assets)
+    load_s = time.perf_counter() - t0
+    loaded = memory_mb()
+
+    embedder = get_embedder()  # uncached, so every query pays for its embedding
+    queries = legal_queries(n_queries, seed=seed)
+    legs = [
+        (vector_search(assets.index, embedder, q, top_k=top_k), bm25_search(assets.bm25, q, top_k=top_k))
+        for q in queries
+    ]
+
+    def merged(filters):
+        return lambda q: build_merged_chunks(assets, QueryContext(q, embedder=embedder, filters=filters), top_k=top_k)
+
+    stages = {
+        "vector_search": (lambda q: vector_search(assets.index, embedder, q, top_k=top_k), queries),
+        "bm25_search": (lambda q: bm25_search(assets.bm25, q, top_k=top_k), queries),
+        "reciprocal_rank_fusion": (lambda pair: reciprocal_rank_fusion(*pair), legs),
+        "build_merged_chunks": (merged(None), queries),
+        "build_merged_chunks_doc_type": (merged({"doc_type": "contract"}), queries),
+    }
+    results = {name: _measure(fn, args, clients) for name, (fn, args) in stages.items()}
+    after = memory_mb()
+
+    return {
+        "load": {"load_s": round(load_s, 3), "rss_mb": round(loaded["rss_mb"] - before["rss_mb"], 1)},
+        "memory": {
+            "rss_mb": round(after["rss_mb"], 1),
+            "pss_mb": round(after["pss_mb"], 1),
+            "assets_rss_mb": round(after["rss_mb"] - before["rss_mb"], 1),
+        },
+        "queries": results,
+    }
+
+
+def _in_child(fn, *args):
+    # a fresh interpreter per phase: clean RSS / peak RSS and no state shared between sizes
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Metrics of `report` that are more than `tolerance` times slower than in `baseline`."""
+    regressions = []
+    old_by_size = {r["chunks"]: r for r in baseline.get("results", [])}
+    for new in report["results"]:
+        old = old_by_size.get(new["chunks"])
+        if old is None:
+            continue
+        pairs = [("build_s", old["build"]["build_s"], new["build"]["build_s"]),
+                 ("load_s", old["load"]["load_s"], new["load"]["load_s"])]
+        for stage, stats in new["queries"].items():
+            for metric in ("p50_ms", "p95_ms"):
+                if stage in old["queries"]:
+                    pairs.append((f"{stage}.{metric}", old["queries"][stage][metric], stats[metric]))
+        for name, before, after in pairs:
+            if before > 0 and after / before > tolerance:
+                regressions.append(f"{new['chunks']} chunks {name}: {before} -> {after} ({after / before:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=4, help="concurrent callers for the throughput run")
+    parser.add_argument("--dim", type=int, default=384, help="local embedder dimension")
+    parser.add_argument("--index-type", default="flat", help="VECTOR_INDEX_TYPE: flat, ivf_flat, ivf_pq, hnsw")
+    parser.add_argument("--batch-size", type=int, default=2048, help="chunks per build batch (INGEST_BATCH_SIZE)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="where builds go (default: a temporary directory, deleted afterwards)")
+    parser.add_argument("--out", default="benchmark_results/retrieval.json", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier report to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    os.environ.update(_BENCH_ENV)
+    os.environ.update({
+        "EMBED_DIMENSION": str(args.dim),
+        "VECTOR_INDEX_TYPE": args.index_type,
+        "INGEST_BATCH_SIZE": str(args.batch_size),
+    })
+
+    report = {
+        "benchmark": "retrieval",
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "faiss": faiss.__version__,
+        },
+        "config": {
+            "embedder": "local", "dim": args.dim, "index_type": args.index_type, "top_k": args.top_k,
+            "queries": args.queries, "clients": args.clients, "batch_size": args.batch_size, "seed": args.seed,
+        },
+        "results": [],
+    }
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="retrieval-bench-")
+    try:
+        for n in args.sizes:
+            storage_dir = os.path.join(workdir, f"chunks-{n}")
+            shutil.rmtree(storage_dir, ignore_errors=True)
+            print(f"[bench] {n} chunks: building", flush=True)
+            build = _in_child(build_phase, n, storage_dir, args.batch_size, args.seed)
+            print(f"[bench] {n} chunks: built in {build['build_s']}s, querying", flush=True)
+            measured = _in_child(query_phase, storage_dir, args.queries, args.top_k, args.clients, args.seed)
+            row = {"chunks": n, "build": build, **measured}
+            report["results"].append(row)
+            print(json.dumps(row), flush=True)
+            if not args.workdir:
+                shutil.rmtree(storage_dir, ignore_errors=True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[bench] REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"[bench] No regressions beyond {args.tolerance}x against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Deterministic synthetic legal-style corpora for benchmarks."""
+import numpy as np
+
+_LEGAL_TERMS = (
+    "agreement party parties shall indemnify indemnification liability limitation damages breach "
+    "termination terminate notice days written consent assignment governing law jurisdiction court "
+    "arbitration dispute confidential information disclosure obligations warranty warranties represent "
+    "representations covenant remedy remedies injunctive relief force majeure payment invoice fees "
+    "schedule exhibit amendment waiver severability entire counterparts successor assigns employee "
+    "contractor services deliverables intellectual property license licensor licensee term renewal "
+    "plaintiff defendant motion filed hearing deposition discovery evidence testimony judgment appeal "
+    "settlement claim claims statute limitations negligence contract tort counsel attorney client "
+    "privilege policy compliance audit records retention insurance coverage premium employer lease "
+    "tenant landlord premises rent security deposit default cure period lien collateral guarantee"
+).split()
+
+
+def _vocab(vocab_size: int) -> np.ndarray:
+    return np.array(list(_LEGAL_TERMS) + [f"term{i}" for i in range(vocab_size - len(_LEGAL_TERMS))])
+
+
+def _draw_docs(rng, vocab: np.ndarray, n_docs: int, doc_len: int) -> list[list[str]]:
+    lengths = rng.integers(doc_len // 2, doc_len * 3 // 2, size=n_docs)
+    ranks = (rng.zipf(1.15, size=int(lengths.sum())) - 1) % len(vocab)
+    tokens = vocab[ranks]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return [tokens[bounds[i]:bounds[i + 1]].tolist() for i in range(n_docs)]
+
+
+def legal_corpus(n_docs: int, vocab_size: int = 50_000, doc_len: int = 120, seed: int = 0) -> list[list[str]]:
+    """Tokenized chunks with a Zipfian term distribution: a core of legal terms plus a long tail
+    of rarer tokens (names, numbers, defined terms), which is what makes BM25 postings skewed."""
+    return _draw_docs(np.random.default_rng(seed), _vocab(vocab_size), n_docs, doc_len)
+
+
+def legal_corpus_batches(n_docs: int, batch_size: int = 10_000, vocab_size: int = 50_000, doc_len: int = 120,
+                         seed: int = 0):
+    """legal_corpus in lists of batch_size chunks, so corpora of millions of chunks are generated
+    in constant memory. Batch b is drawn from seed (seed, b): the same arguments always give the
+    same corpus, and a larger corpus starts with the full batches of a smaller one."""
+    vocab = _vocab(vocab_size)
+    for b, start in enumerate(range(0, n_docs, batch_size)):
+        yield _draw_docs(np.random.default_rng([seed, b]), vocab, min(batch_size, n_docs - start), doc_len)
+
+
+def legal_queries(n_queries: int, terms_per_query: int = 4, seed: int = 1) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(_LEGAL_TERMS, size=terms_per_query)) for _ in range(n_queries)]
@@ -0,0 +1,132 @@
+"""Recall-vs-latency report for the FAISS index types against the flat (exact) baseline.
+
+Run from project root:
+    python -m backend.benchmarks.vector_index --n 100000 --dim 384
+    python -m backend.benchmarks.vector_index --storage ./storage   # vectors of an ingested flat index
+"""
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from backend.core.constants import VECTOR_INDEX_FILE
+from backend.core.vectorstores.faiss_vector_store import (
+    create_faiss_index,
+    train_faiss_index,
+    set_search_params,
+    describe_faiss_index,
+)
+
+
+def synthetic_embeddings(n: int, dim: int, n_topics: int = 200, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around topic centroids, roughly how chunk embeddings cluster."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_topics, dim)).astype("float32")
+    topics = rng.integers(0, n_topics, size=n)
+    x = centers[topics] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def stored_embeddings(storage_dir: str) -> np.ndarray:
+    index = faiss.read_index(os.path.join(storage_dir, VECTOR_INDEX_FILE))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def search_one_by_one(index, queries: np.ndarray, k: int):
+    """Serving issues one query per request, so time them individually."""
+    ids = np.empty((len(queries), k), dtype="int64")
+    latencies = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, found = index.search(q[np.newaxis, :], k)
+        latencies[i] = (time.perf_counter() - t0) * 1000
+        ids[i] = found[0]
+    return ids, latencies
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, k: int, args) -> dict:
+    dim = vectors.shape[1]
+    report = {"n": len(vectors), "dim": dim, "queries": len(queries), "k": k, "results": []}
+
+    configs = [("flat", {}, [None])]
+    configs.append(("ivf_flat", {"nlist": args.nlist}, [("nprobe", p) for p in args.nprobe]))
+    if dim % args.pq_m == 0:
+        configs.append(("ivf_pq", {"nlist": args.nlist, "pq_m": args.pq_m}, [("nprobe", p) for p in args.nprobe]))
+    configs.append(("hnsw", {"hnsw_m": args.hnsw_m}, [("ef_search", e) for e in args.ef_search]))
+
+    truth = None
+    for index_type, params, knobs in configs:
+        index = create_faiss_index(dim, index_type, n_train=len(vectors), **params)
+        t0 = time.perf_counter()
+        train_faiss_index(index, vectors)
+        index.add(vectors)
+        build_s = time.perf_counter() - t0
+
+        for knob in knobs:
+            if knob is not None:
+                set_search_params(index, **{knob[0]: knob[1]})
+            found, lat = search_one_by_one(index, queries, k)
+            if truth is None:
+                truth = found
+            row = {
+                **describe_faiss_index(index),
+                "build_s": round(build_s, 2),
+                "recall_at_k": round(recall_at_k(truth, found), 4),
+                "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                "p95_ms": round(float(np.percentile(lat, 95)), 3),
+                "qps": round(len(queries) / (lat.sum() / 1000), 1),
+            }
+            if knob is not None:
+                row[knob[0]] = knob[1]
+            report["results"].append(row)
+            print(json.dumps(row))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--storage", help="use vectors from an ingested flat index instead of synthetic ones")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)  # per-query latency, like a serving worker
+
+    if args.storage:
+        vectors = stored_embeddings(args.storage)
+        rng = np.random.default_rng(1)
+        picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+        queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), vectors.shape[1])).astype("float32")
+    else:
+        all_vectors = synthetic_embeddings(args.n + args.queries, args.dim)
+        vectors, queries = all_vectors[:args.n], all_vectors[args.n:]
+
+    report = run(np.ascontiguousarray(vectors), np.ascontiguousarray(queries, dtype="float32"), args.k, args)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Versioned single-file container for named numpy arrays.
+
+Layout: 8-byte magic | uint32 version | uint32 header length | JSON header | arrays.
+Each array starts on a 64-byte boundary, so readers can np.memmap it in place and
+only the pages a query touches are ever read from disk. No pickle involved.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from backend.core.exceptions import ConfigError
+
+_ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_array_file(path: str, magic: bytes, version: int, meta: dict, arrays: dict[str, np.ndarray]) -> None:
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+
+    # offsets depend on the header length, which depends on the offsets; iterate until stable
+    layout, header, start = {}, b"", 0
+    while start != _aligned(_PREFIX.size + len(header)):
+        start = _aligned(_PREFIX.size + len(header))
+        offset = start
+        for name, a in arrays.items():
+            layout[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+            offset = _aligned(offset + a.nbytes)
+        header = json.dumps({"meta": meta, "arrays": layout}).encode("utf-8")
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(magic.ljust(8, b"\0"), version, len(header)))
+        f.write(header)
+        for name, a in arrays.items():
+            f.write(b"\0" * (layout[name]["offset"] - f.tell()))
+            f.write(a.data)  # no copy, so memmapped (spilled) arrays stream through
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def read_array_file(path: str, magic: bytes, versions: tuple[int, ...]) -> tuple[int, dict, dict[str, np.ndarray]]:
+    """Return (version, meta, arrays); arrays are read-only memmaps into the file."""
+    with open(path, "rb") as f:
+        file_magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if file_magic != magic.ljust(8, b"\0"):
+            raise ConfigError(f"{path} is not a {magic.decode()} file")
+        if version not in versions:
+            raise ConfigError(f"{path} has format version {version}, supported: {versions}. Rebuild index.")
+        header = json.loads(f.read(header_len))
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=spec["offset"], shape=shape)
+    return version, header["meta"], arrays
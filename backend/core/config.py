@@ -10,23 +10,62 @@ class Settings(BaseSettings):
     COHERE_API_KEY: str | None = None
     USE_COHERE_RERANK: bool = Field(default=True, description="Set False to use no-op reranker (avoids rate limits with trial keys)")
     REDIS_URL: str = Field(default="redis://localhost:6379")
+    CACHE_L1_SIZE: int = Field(default=4096, description="Exact-match answers kept in each API process in front of Redis; 0 disables")
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(default=100_000, description="Cached answers searchable by embedding; 4 * dim bytes each per API process")
 
-    EMBED_PROVIDER: str = Field(default="openai")  
+    EMBED_PROVIDER: str = Field(default="openai", description="openai | local (offline hashed n-grams)")
     EMBED_MODEL: str = Field(default="text-embedding-3-small")
+    EMBED_DIMENSION: int = Field(default=384, description="Vector size of the local provider")
+    EMBED_BATCH_SIZE: int = Field(default=256, description="Max chunks per embedding request")
+    EMBED_BATCH_MAX_TOKENS: int = Field(default=100_000, description="Max tokens per embedding request (OpenAI allows 300k)")
+    EMBED_CONCURRENCY: int = Field(default=4, description="Embedding requests in flight during ingestion")
+    EMBED_CACHE_PATH: str = Field(default="./.cache/embeddings.sqlite", description="Ingestion embedding cache; empty disables")
+    EMBED_MAX_RETRIES: int = Field(default=6, description="Retries per batch on 429 / transient errors, exponential backoff")
+    QUERY_EMBED_CACHE_SIZE: int = Field(default=1024, description="Recent query embeddings kept per process; 0 disables")
 
     VECTOR_STORE: str = Field(default="faiss")
+    VECTOR_INDEX_TYPE: str = Field(default="flat", description="flat | ivf_flat | ivf_pq | hnsw")
+    VECTOR_IVF_NLIST: int = Field(default=1024, description="IVF cells; clamped to the corpus size at build time")
+    VECTOR_PQ_M: int = Field(default=64, description="IVF-PQ sub-quantizers; must divide the embedding dimension")
+    VECTOR_PQ_NBITS: int = Field(default=8)
+    VECTOR_HNSW_M: int = Field(default=32)
+    VECTOR_HNSW_EF_CONSTRUCTION: int = Field(default=200)
+    VECTOR_NPROBE: int = Field(default=16, description="IVF cells scanned per query")
+    VECTOR_EF_SEARCH: int = Field(default=64, description="HNSW candidate list size per query")
+    VECTOR_INDEX_MMAP: bool = Field(default=True, description="Map the FAISS index read-only so uvicorn workers share it via the page cache")
 
     CHUNK_SIZE: int = Field(default=512)
     CHUNK_OVERLAP: int = Field(default=51)
 
     TOP_K: int = Field(default=8)
+    RETRIEVAL_LEG_WORKERS: int = Field(default=16, description="Threads for CPU-bound request work: vector and BM25 legs, semantic cache search")
+    VECTOR_SEARCH_TIMEOUT_S: float = Field(default=10.0, description="Vector leg budget (includes the embedding call)")
+    BM25_SEARCH_TIMEOUT_S: float = Field(default=2.0)
     RERANK_TOP_K: int = Field(default=5)
+    RETRIEVAL_CACHE_SIZE: int = Field(default=2048, description="Reranked chunk-id lists kept per API process; 0 disables")
+    RETRIEVAL_CACHE_TTL_S: float = Field(default=600.0)
+    QUERY_COALESCE: bool = Field(default=True, description="Identical /query requests in flight share one pipeline run")
+    QUERY_COALESCE_REDIS: bool = Field(default=False, description="Also coalesce across API workers via a Redis lock + pub/sub")
+    QUERY_COALESCE_TIMEOUT_S: float = Field(default=60.0, description="Longest a worker waits on another's run before running its own")
+    OTEL_ENABLED: bool = Field(default=False, description="Export query stage spans over OTLP (OTEL_EXPORTER_OTLP_ENDPOINT)")
+    OTEL_SERVICE_NAME: str = Field(default="legalmind-api")
 
     STORAGE_DIR: str = Field(default="./storage")
+    STORAGE_KEEP_BUILDS: int = Field(default=3, description="Index builds kept under STORAGE_DIR/builds; older ones are deleted on publish")
+    INDEX_WATCH_INTERVAL_S: float = Field(default=5.0, description="How often the API checks for a newly published build; 0 disables")
+    ADMIN_TOKEN: str = Field(default="", description="X-Admin-Token for /admin endpoints; empty disables them")
     DOCUMENTS_DIR: str = Field(default="./documents")
+    INGEST_WORKERS: int = Field(default=0, description="Processes parsing and chunking documents; 0 = one per CPU")
+    PDF_PAGES_PER_TASK: int = Field(default=50, description="Larger PDFs are split into page ranges across workers")
+    PARSE_CACHE_DIR: str = Field(default="./.cache/parsed", description="Extracted text + chunks per file hash; empty disables")
+    INGEST_BATCH_SIZE: int = Field(default=2048, description="Chunks per embed/index batch in the streaming build")
+    INGEST_QUEUE_SIZE: int = Field(default=4, description="Batches buffered ahead of each index stage (backpressure)")
+    INGEST_INCREMENTAL: bool = Field(default=True, description="Re-index only new/changed/removed files when the stored build is compatible")
 
     LLM_MODEL: str = Field(default="gpt-4o-mini")
     LLM_TEMPERATURE: float = Field(default=0.0)
+    BATCH_QUERY_MAX_SIZE: int = Field(default=500, description="Questions accepted per /query/batch request")
+    BATCH_CONCURRENCY: int = Field(default=8, description="LLM generations and reranks in flight per /query/batch request")
 
     EVAL_API_URL: str = Field(default="http://127.0.0.1:8000/query")
     EVAL_DATASET_PATH: str = Field(default="tests/golden_dataset.json")
@@ -1,3 +1,7 @@
 MANIFEST_FILE = "manifest.json"
-BM25_FILE = "bm25.pkl"
-NODES_FILE = "nodes.json"
\ No newline at end of file
+BM25_FILE = "bm25.bin"  # BM25Index binary format, see retrieval/bm25_index.py
+NODES_FILE = "nodes.bin"  # NodeStore binary format, see retrieval/node_store.py
+VECTOR_INDEX_FILE = "vectors.faiss"  # faiss.write_index; FAISS id == NodeStore row
+EMBED_KEYS_FILE = "embedding_keys.bin"  # embedding cache key per NodeStore row, see ingestion/embedding_cache.py
+CURRENT_BUILD_FILE = "CURRENT"  # name of the live build under BUILDS_DIR; swapped atomically by ingestion
+BUILDS_DIR = "builds"
@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import List
 
@@ -10,4 +11,15 @@ class BaseEmbedder(ABC):
 
     @abstractmethod
     def embed_query(self, text: str) -> List[float]:
-        pass
\ No newline at end of file
+        pass
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries; providers override this to use one request."""
+        return [self.embed_query(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """embed_query for async callers; providers with an async client override this."""
+        return await asyncio.to_thread(self.embed_query, text)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_queries, texts)
@@ -0,0 +1,68 @@
+from typing import List
+
+from backend.core.embeddings.base import BaseEmbedder
+from backend.core.lru import LocalLRU
+
+
+class CachedQueryEmbedder(BaseEmbedder):
+    """Wraps an embedder with a process-level LRU of recent query embeddings.
+
+    Repeated questions skip the embedding request entirely. Document embeddings pass through.
+    """
+
+    def __init__(self, embedder: BaseEmbedder, maxsize: int = 1024):
+        self.embedder = embedder
+        self.name = getattr(embedder, "name", type(embedder).__name__)
+        self.dimension = getattr(embedder, "dimension", None)
+        self.maxsize = maxsize
+        self._lru = LocalLRU(maxsize)
+
+    @property
+    def hits(self) -> int:
+        return self._lru.hits
+
+    @property
+    def misses(self) -> int:
+        return self._lru.misses
+
+    def _get(self, text: str):
+        return self._lru.get(text)
+
+    def _put(self, text: str, vector: List[float]) -> None:
+        self._lru.set(text, vector, ttl_seconds=float("inf"))  # an embedding never goes stale
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._get(text)
+        if vector is None:
+            vector = self.embedder.embed_query(text)
+            self._put(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._get(text)
+        if vector is None:
+            vector = await self.embedder.aembed_query(text)
+            self._put(text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        vectors = [self._get(t) for t in texts]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            # one request for all misses
+            for i, vector in zip(missing, self.embedder.embed_queries([texts[i] for i in missing])):
+                vectors[i] = vector
+                self._put(texts[i], vector)
+        return vectors
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        vectors = [self._get(t) for t in texts]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            for i, vector in zip(missing, await self.embedder.aembed_queries([texts[i] for i in missing])):
+                vectors[i] = vector
+                self._put(texts[i], vector)
+        return vectors
@@ -1,6 +1,16 @@
+from functools import lru_cache
+
 from backend.core.config import get_settings
 from backend.core.embeddings.openai_embedder import OpenAIEmbedder
+from backend.core.embeddings.local_embedder import LocalHashEmbedder, LOCAL_MODEL
 from backend.core.embeddings.base import BaseEmbedder
+from backend.core.embeddings.cached_embedder import CachedQueryEmbedder
+
+
+def get_embed_model_id() -> str:
+    """Model recorded in / checked against the manifest for the configured provider."""
+    s = get_settings()
+    return LOCAL_MODEL if s.EMBED_PROVIDER == "local" else s.EMBED_MODEL
 
 
 def get_llama_embed_model():
@@ -9,6 +19,9 @@ def get_llama_embed_model():
     if s.EMBED_PROVIDER == "openai":
         from llama_index.embeddings.openai import OpenAIEmbedding
         return OpenAIEmbedding(model=s.EMBED_MODEL, api_key=s.OPENAI_API_KEY)
+    if s.EMBED_PROVIDER == "local":
+        from backend.core.embeddings.local_llama import LocalHashEmbedding
+        return LocalHashEmbedding(dimension=s.EMBED_DIMENSION, embed_batch_size=s.EMBED_BATCH_SIZE)
     raise ValueError(f"Unsupported embed provider: {s.EMBED_PROVIDER}")
 
 
@@ -18,4 +31,13 @@ def get_embedder() -> BaseEmbedder:
     if settings.EMBED_PROVIDER == "openai":
         return OpenAIEmbedder()
 
-    raise ValueError("Unsupported embedding provider")
\ No newline at end of file
+    if settings.EMBED_PROVIDER == "local":
+        return LocalHashEmbedder(dimension=settings.EMBED_DIMENSION)
+
+    raise ValueError("Unsupported embedding provider")
+
+
+@lru_cache()
+def get_query_embedder() -> BaseEmbedder:
+    """Process-wide embedder for questions, with an LRU of recent query embeddings."""
+    return CachedQueryEmbedder(get_embedder(), maxsize=get_settings().QUERY_EMBED_CACHE_SIZE)
@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+import xxhash
+
+from backend.core.embeddings.base import BaseEmbedder
+from backend.core.executors import run_cpu
+
+LOCAL_MODEL = "hash-ngram-v1"  # bump if the feature scheme changes; it is recorded in the manifest
+
+_TOKEN_RE = re.compile(r"\w+")
+_BIGRAM_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+@lru_cache(maxsize=1 << 18)
+def _token_features(token: str) -> np.ndarray:
+    """uint64 hashes of a token and its boundary-marked character trigrams."""
+    marked = f"<{token}>"
+    grams = [token] + [marked[i:i + 3] for i in range(len(marked) - 2)]
+    return np.array([xxhash.xxh3_64_intdigest(g.encode("utf-8")) for g in grams], dtype="uint64")
+
+
+class LocalHashEmbedder(BaseEmbedder):
+    """Deterministic, offline embeddings: word, word-bigram and char-trigram features hashed
+    into `dimension` signed buckets (feature hashing), sublinear tf, L2-normalised.
+
+    No network or model download, identical vectors on every machine, and batches are
+    vectorised in numpy, so ingestion and retrieval can be load-tested at scale in CI.
+    Retrieval quality is lexical, not semantic; use it for benchmarks and air-gapped runs.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.model = LOCAL_MODEL
+        self.dimension = dimension
+        self.name = f"local:{LOCAL_MODEL}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)  # microseconds of numpy; a thread hop would cost more
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        return await run_cpu(self.embed_queries, texts)  # batches are worth the hop
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimension) float32 matrix, one bincount for the whole batch."""
+        tokenized = [_TOKEN_RE.findall(text.lower()) for text in texts]
+        lengths = [len(tokens) for tokens in tokenized]
+        all_tokens = [t for tokens in tokenized for t in tokens]
+        vocab = {t: i for i, t in enumerate(dict.fromkeys(all_tokens))}
+        token_ids = np.fromiter(map(vocab.__getitem__, all_tokens), dtype="int64", count=len(all_tokens))
+        token_doc = np.repeat(np.arange(len(texts), dtype="int64"), lengths)
+
+        # features of each distinct token once, as CSR; element 0 of a row is the word hash
+        features = [_token_features(t) for t in vocab] or [np.zeros(0, dtype="uint64")]
+        indptr = np.zeros(len(vocab) + 1, dtype="int64")
+        np.cumsum([len(f) for f in features[:len(vocab)]], out=indptr[1:])
+        flat = np.concatenate(features)
+
+        # expand every token occurrence to its features
+        counts = indptr[1:][token_ids] - indptr[:-1][token_ids]
+        offsets = np.zeros(len(counts) + 1, dtype="int64")
+        np.cumsum(counts, out=offsets[1:])
+        take = np.repeat(indptr[:-1][token_ids] - offsets[:-1], counts) + np.arange(offsets[-1])
+        hashes, rows = flat[take], np.repeat(token_doc, counts)
+
+        # word bigrams within a document
+        words = flat[indptr[:-1][token_ids]]
+        same_doc = token_doc[:-1] == token_doc[1:]
+        with np.errstate(over="ignore"):
+            bigrams = (words[:-1] * _BIGRAM_MULT + words[1:])[same_doc]
+        hashes = np.concatenate([hashes, bigrams])
+        rows = np.concatenate([rows, token_doc[:-1][same_doc]])
+
+        # low bits pick the bucket, the top bit the sign, so collisions cancel instead of pile up
+        buckets = (hashes % np.uint64(self.dimension)).astype("int64")
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        counts = np.bincount(rows * self.dimension + buckets, weights=signs, minlength=len(texts) * self.dimension)
+
+        vectors = counts.reshape(len(texts), self.dimension)
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms == 0, 1.0, norms)).astype("float32")
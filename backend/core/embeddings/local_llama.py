@@ -0,0 +1,29 @@
+from typing import List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from backend.core.embeddings.local_embedder import LocalHashEmbedder, LOCAL_MODEL
+
+
+class LocalHashEmbedding(BaseEmbedding):
+    """LlamaIndex adapter over LocalHashEmbedder, for the ingestion path."""
+
+    _embedder: LocalHashEmbedder = PrivateAttr()
+
+    def __init__(self, dimension: int = 384, **kwargs):
+        kwargs.setdefault("model_name", LOCAL_MODEL)
+        super().__init__(**kwargs)
+        self._embedder = LocalHashEmbedder(dimension)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embedder.embed_query(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embedder.embed_query(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embedder.embed_query(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embedder.embed_documents(texts)
@@ -1,4 +1,4 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from typing import List
 from backend.core.config import get_settings
 from backend.core.embeddings.base import BaseEmbedder
@@ -16,6 +16,7 @@ class OpenAIEmbedder(BaseEmbedder):
     def __init__(self):
         settings = get_settings()
         self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.aclient = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.EMBED_MODEL
         self.name = f"openai:{self.model}"
         self.dimension = _MODEL_DIMENSIONS.get(self.model, 1536)
@@ -32,4 +33,29 @@ class OpenAIEmbedder(BaseEmbedder):
             model=self.model,
             input=text
         )
-        return response.data[0].embedding
\ No newline at end of file
+        return response.data[0].embedding
+
+    async def aembed_query(self, text: str) -> List[float]:
+        response = await self.aclient.embeddings.create(
+            model=self.model,
+            input=text
+        )
+        return response.data[0].embedding
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=texts
+        )
+        return [item.embedding for item in response.data]
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        response = await self.aclient.embeddings.create(
+            model=self.model,
+            input=texts
+        )
+        return [item.embedding for item in response.data]
@@ -0,0 +1,15 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from backend.core.config import get_settings
+
+# CPU-bound request work (FAISS, BM25, numpy similarity) mostly releases the GIL, so it
+# overlaps well on threads. Sync code submits to this pool directly; async endpoints await
+# run_cpu() so the event loop keeps serving I/O-bound requests meanwhile.
+CPU_POOL = ThreadPoolExecutor(max_workers=get_settings().RETRIEVAL_LEG_WORKERS, thread_name_prefix="cpu")
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """fn(*args, **kwargs) on CPU_POOL, awaited without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(CPU_POOL, partial(fn, *args, **kwargs))
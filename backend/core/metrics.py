@@ -0,0 +1,136 @@
+import bisect
+import threading
+
+# seconds; fine-grained under a second, where first-token and cache latencies live
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 20.0, 30.0)
+
+# quantiles /metrics reports next to each histogram's buckets
+EXPORTED_QUANTILES = (0.5, 0.95, 0.99)
+
+REGISTRY: list = []  # every metric defined, in /metrics order
+
+
+def _label_str(key: tuple, **extra) -> str:
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Prometheus-style histogram per label set: bucket counts, sum and count, safe to share
+    between request threads. Quantiles are interpolated within buckets, as histogram_quantile
+    does, so memory stays fixed however many requests are observed."""
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # sorted label items -> [bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(sorted(labels.items())))
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q: float, **labels) -> float | None:
+        """Estimated q-quantile (0..1) of one label set, or None before any observation."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            counts = list(series[0]) if series else []
+        return self._quantile(q, counts)
+
+    def _quantile(self, q: float, counts: list[int]) -> float | None:
+        total = sum(counts)
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # beyond the last bound, as Prometheus reports it
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def render(self) -> list[str]:
+        """Exposition lines: cumulative buckets, sum and count per label set, then a
+        `<name>_quantile` gauge with p50 / p95 / p99 for readers without PromQL."""
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                lines.append(f"{self.name}_bucket{_label_str(key, le=le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_label_str(key)} {cumulative}")
+        lines += [f"# HELP {self.name}_quantile {self.description} (interpolated quantiles)",
+                  f"# TYPE {self.name}_quantile gauge"]
+        for key, (counts, _) in series.items():
+            for q in EXPORTED_QUANTILES:
+                lines.append(f"{self.name}_quantile{_label_str(key, quantile=q)} {_num(self._quantile(q, counts))}")
+        return lines
+
+
+class Counter:
+    """Monotonic count per label set, safe to share between request threads."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = dict(self._series)
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_label_str(key)} {_num(value)}" for key, value in series.items()]
+        return lines
+
+
+def render_metrics() -> str:
+    """Every metric of this process in the Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+QUERY_TTFT = Histogram("query_ttft_seconds", "Request start to the first answer token sent by /query/stream")
+QUERY_STAGE_SECONDS = Histogram(
+    "query_stage_seconds", "Time spent per query stage: cache_lookup, embed, faiss, bm25, fusion, rerank, llm, query (whole request)"
+)
+QUERY_COALESCED = Counter(
+    "query_coalesced_total", "/query requests answered by an identical request already in flight, by scope (process | workers)"
+)
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Answer and retrieval cache lookups, by cache (answer | retrieval) and result (hit | miss)")
+RETRIEVAL_LEG_FAILURES = Counter("retrieval_leg_failures_total", "Retrieval legs fused without, by leg (vector | bm25) and reason (timeout | error)")
+RERANK_FALLBACKS = Counter("rerank_fallbacks_total", "Reranks that failed and kept the fused order instead")
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used by answer generation, by model and kind (input | output)")
@@ -0,0 +1,68 @@
+import json
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import numpy as np
+import xxhash
+
+from backend.core.tracing import span
+
+
+@dataclass
+class QueryContext:
+    """Everything derived from one question, computed at most once per request.
+
+    The embedding is fetched lazily on first use (semantic cache lookup or the vector leg)
+    and then shared by retrieval and cache save.
+    """
+    question: str
+    embedder: object                       # BaseEmbedder, normally get_query_embedder()
+    filters: dict | None = None            # metadata equality filters, e.g. {"doc_type": "contract"}
+    index_version: str = ""                # RetrievalAssets.build_id of the index answering it
+    degraded: bool = False                 # set when a retrieval leg or the rerank failed
+    timings: dict = field(default_factory=dict)  # stage -> ms, filled by tracing.span
+
+    @cached_property
+    def normalized(self) -> str:
+        return " ".join(self.question.split())
+
+    @cached_property
+    def tokens(self) -> list[str]:
+        return self.normalized.split()
+
+    @cached_property
+    def key(self) -> str:
+        """Stable id of (normalised question, filters, index build): requests with equal keys
+        retrieve and generate the same thing."""
+        raw = json.dumps([self.normalized.casefold(), self.filters or {}, self.index_version], sort_keys=True)
+        return xxhash.xxh3_128_hexdigest(raw.encode("utf-8"))
+
+    @cached_property
+    def embedding(self) -> np.ndarray:
+        with span("embed", self.timings):
+            return np.asarray(self.embedder.embed_query(self.normalized), dtype="float32")
+
+    async def aembed(self) -> np.ndarray:
+        """Fill `embedding` through the embedder's async client, for async endpoints."""
+        if "embedding" not in self.__dict__:
+            with span("embed", self.timings):
+                vector = await self.embedder.aembed_query(self.normalized)
+            self.__dict__["embedding"] = np.asarray(vector, dtype="float32")
+        return self.embedding
+
+    @property
+    def doc_type(self) -> str | None:
+        return (self.filters or {}).get("doc_type")
+
+
+async def aembed_contexts(ctxs: list[QueryContext]) -> None:
+    """Fill `embedding` of every context still lacking one with a single embedding request
+    (each distinct question once); all contexts must share one embedder."""
+    pending = [c for c in ctxs if "embedding" not in c.__dict__]
+    if not pending:
+        return
+    texts = list(dict.fromkeys(c.normalized for c in pending))
+    with span("embed_batch"):
+        vectors = dict(zip(texts, await pending[0].embedder.aembed_queries(texts)))
+    for c in pending:
+        c.__dict__["embedding"] = np.asarray(vectors[c.normalized], dtype="float32")
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import secrets
+import time
+
+from backend.core.config import get_settings
+from backend.core.logging import get_logger
+from backend.core.metrics import QUERY_COALESCED
+
+logger = get_logger(__name__)
+
+FLIGHT_LOCK_PREFIX = "flight:lock:"      # held by the worker running a key's pipeline, with TTL
+FLIGHT_CHANNEL_PREFIX = "flight:done:"   # its result is published here to the waiting workers
+FLIGHT_RESULT_PREFIX = "flight:result:"  # ...and kept briefly, for workers subscribing just after it
+RESULT_TTL_MS = 5000
+
+# delete the lock only if this worker still holds it (it may have expired and been retaken)
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+def get_single_flight():
+    """SingleFlight per settings: within this process, and across workers through Redis
+    when QUERY_COALESCE_REDIS is set and Redis is reachable."""
+    s = get_settings()
+    if not s.QUERY_COALESCE:
+        return NoOpSingleFlight()
+    redis_client = None
+    if s.QUERY_COALESCE_REDIS:
+        try:
+            import redis
+            import redis.asyncio
+            redis.from_url(s.REDIS_URL).ping()  # verify connection
+            redis_client = redis.asyncio.from_url(s.REDIS_URL)
+        except Exception as e:
+            logger.warning(f"[singleflight] Redis unavailable ({e}), coalescing within this process only")
+    return SingleFlight(redis_client, timeout_s=s.QUERY_COALESCE_TIMEOUT_S)
+
+
+class NoOpSingleFlight:
+    """Every call runs its own pipeline (QUERY_COALESCE=false)."""
+
+    async def do(self, key: str, fn):
+        return await fn()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution of `fn`.
+
+    The first call for a key runs fn() as a task; calls arriving while it runs await that
+    task and get its result (or its exception) instead of running fn() again. The task is
+    shielded, so a caller that disconnects doesn't cancel it for the others.
+
+    With a Redis client, the running call also takes a lock for its key, and calls in other
+    workers that find the key locked wait for its result over pub/sub instead of running
+    fn(). Results must then be JSON-serialisable. A worker whose leader fails, dies or takes
+    longer than timeout_s runs fn() itself, so Redis only ever saves work, never blocks it.
+    """
+
+    def __init__(self, redis_client=None, timeout_s: float = 60.0):
+        self.redis = redis_client
+        self.timeout_s = timeout_s
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn):
+        task = self._inflight.get(key)
+        if task is not None:
+            QUERY_COALESCED.inc(scope="process")
+        else:
+            task = asyncio.ensure_future(self._lead(key, fn) if self.redis is not None else fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller went away
+
+    async def _lead(self, key: str, fn):
+        """fn() once across workers: run it under the Redis lock, or wait for whoever holds it."""
+        lock = f"{FLIGHT_LOCK_PREFIX}{key}"
+        token = secrets.token_hex(8)
+        try:
+            acquired = await self.redis.set(lock, token, nx=True, px=int(self.timeout_s * 1000))
+        except Exception as e:
+            logger.warning(f"[singleflight] Redis lock failed ({e}), running locally")
+            return await fn()
+        if not acquired:
+            result = await self._follow(key, lock)
+            if result is not None:
+                QUERY_COALESCED.inc(scope="workers")
+                return result["value"]
+            return await fn()
+
+        message = {"ok": False}
+        try:
+            value = await fn()
+            message = {"ok": True, "value": value}
+            return value
+        finally:
+            try:
+                payload = json.dumps(message)
+                await self.redis.pipeline(transaction=False) \
+                    .set(f"{FLIGHT_RESULT_PREFIX}{key}", payload, px=RESULT_TTL_MS) \
+                    .publish(f"{FLIGHT_CHANNEL_PREFIX}{key}", payload) \
+                    .eval(_RELEASE, 1, lock, token) \
+                    .execute()
+            except Exception as e:
+                logger.warning(f"[singleflight] Publishing result of {key} failed: {e}")
+
+    async def _follow(self, key: str, lock: str) -> dict | None:
+        """The leader's {"ok": True, "value": ...} message, or None if it failed or never came."""
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(f"{FLIGHT_CHANNEL_PREFIX}{key}")
+            # the leader may have finished between our SET NX and SUBSCRIBE
+            raw = await self.redis.get(f"{FLIGHT_RESULT_PREFIX}{key}")
+            deadline = time.monotonic() + self.timeout_s
+            while raw is None and time.monotonic() < deadline:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    raw = message["data"]
+                elif not await self.redis.exists(lock):
+                    # leader gone (crashed, or its lock expired) without publishing
+                    raw = await self.redis.get(f"{FLIGHT_RESULT_PREFIX}{key}")
+                    break
+        except Exception as e:
+            logger.warning(f"[singleflight] Waiting for {key} failed ({e}), running locally")
+            raw = None
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+        result = json.loads(raw) if raw is not None else None
+        return result if result and result.get("ok") else None
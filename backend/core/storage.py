@@ -0,0 +1,57 @@
+"""Versioned index storage: every ingestion writes a complete build into
+STORAGE_DIR/builds/<build_id>/ and then atomically repoints STORAGE_DIR/CURRENT at it, so
+servers never see a half-written index and can reload by re-reading the pointer.
+A STORAGE_DIR without a CURRENT file is a single unversioned build (the older layout)."""
+import os
+import shutil
+import time
+import uuid
+
+from backend.core.constants import CURRENT_BUILD_FILE, BUILDS_DIR
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def new_build_id() -> str:
+    """Sortable by creation time, unique across machines."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:12]}"
+
+
+def pointer_path(storage_dir: str) -> str:
+    return os.path.join(storage_dir, CURRENT_BUILD_FILE)
+
+
+def current_build_dir(storage_dir: str) -> str:
+    """Directory of the live build."""
+    try:
+        with open(pointer_path(storage_dir)) as f:
+            return os.path.join(storage_dir, BUILDS_DIR, f.read().strip())
+    except FileNotFoundError:
+        return storage_dir
+
+
+def new_build_dir(storage_dir: str, build_id: str) -> str:
+    path = os.path.join(storage_dir, BUILDS_DIR, build_id)
+    os.makedirs(path)
+    return path
+
+
+def publish_build(storage_dir: str, build_dir: str, keep: int = 3) -> None:
+    """Make build_dir the live build, then delete all but the `keep` newest builds.
+
+    Servers still serving a deleted build keep working: their files are open or mapped,
+    and the data stays on disk until they let go of it.
+    """
+    tmp = f"{pointer_path(storage_dir)}.tmp"
+    with open(tmp, "w") as f:
+        f.write(os.path.basename(build_dir))
+    os.replace(tmp, pointer_path(storage_dir))
+    logger.info(f"[storage] Live build is now {build_dir}")
+
+    builds_root = os.path.join(storage_dir, BUILDS_DIR)
+    builds = sorted(os.listdir(builds_root), reverse=True)
+    for name in builds[max(keep, 1):]:
+        if name != os.path.basename(build_dir):
+            shutil.rmtree(os.path.join(builds_root, name), ignore_errors=True)
+            logger.info(f"[storage] Removed old build {name}")
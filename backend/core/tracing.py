@@ -0,0 +1,48 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+from backend.core.logging import get_logger
+from backend.core.metrics import QUERY_STAGE_SECONDS
+
+logger = get_logger(__name__)
+
+_tracer = None  # set by setup_tracing when OTEL_ENABLED
+
+
+def setup_tracing(service_name: str) -> None:
+    """Export stage spans over OTLP/gRPC; endpoint, headers etc. come from the standard
+    OTEL_EXPORTER_OTLP_* environment variables."""
+    global _tracer
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        logger.warning(f"[tracing] OpenTelemetry unavailable ({e}), spans are not exported")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("backend")
+    logger.info(f"[tracing] Exporting spans as service {service_name}")
+
+
+def record(stage: str, seconds: float, timings: dict | None = None) -> None:
+    """Observe a stage duration in query_stage_seconds and add it (ms) to `timings`."""
+    QUERY_STAGE_SECONDS.observe(seconds, stage=stage)
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 1)
+
+
+@contextmanager
+def span(stage: str, timings: dict | None = None, **attributes):
+    """Time the block as one query stage (see record), and as an OpenTelemetry span nested
+    in the current one when tracing is set up. Failed and cancelled stages count too."""
+    start = time.perf_counter()
+    try:
+        with _tracer.start_as_current_span(stage, attributes=attributes) if _tracer else nullcontext():
+            yield
+    finally:
+        record(stage, time.perf_counter() - start, timings)
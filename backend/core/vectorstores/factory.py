@@ -6,6 +6,14 @@ def get_vector_store(dimension: int):
     settings = get_settings()
 
     if settings.VECTOR_STORE == "faiss":
-        return FAISSVectorStore(dimension)
+        return FAISSVectorStore(
+            dimension,
+            index_type=settings.VECTOR_INDEX_TYPE,
+            nlist=settings.VECTOR_IVF_NLIST,
+            pq_m=settings.VECTOR_PQ_M,
+            pq_nbits=settings.VECTOR_PQ_NBITS,
+            hnsw_m=settings.VECTOR_HNSW_M,
+            ef_construction=settings.VECTOR_HNSW_EF_CONSTRUCTION,
+        )
 
     raise ValueError("Unsupported vector store")
\ No newline at end of file
@@ -2,25 +2,201 @@ import faiss
 import numpy as np
 from typing import List
 from backend.core.vectorstores.base import BaseVectorStore
+from backend.core.exceptions import IndexBuildError
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# FAISS k-means wants ~39 training points per centroid; below that we shrink nlist
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def create_faiss_index(
+    dimension: int,
+    index_type: str = "flat",
+    n_train: int = 0,
+    nlist: int = 1024,
+    pq_m: int = 64,
+    pq_nbits: int = 8,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+):
+    """Create an (untrained) L2 FAISS index of the given type.
+
+    n_train is the number of vectors that will be used for training; IVF nlist is
+    clamped to it so small corpora still build.
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimension)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        if n_train:
+            nlist = max(1, min(nlist, n_train // _MIN_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatL2(dimension)
+
+        if index_type == "ivf_flat":
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist)
+
+        if dimension % pq_m != 0:
+            raise IndexBuildError(f"IVF-PQ needs dimension ({dimension}) divisible by pq_m ({pq_m})")
+        if n_train and n_train < 2 ** pq_nbits:
+            raise IndexBuildError(
+                f"IVF-PQ needs at least {2 ** pq_nbits} training vectors (got {n_train}); use flat or ivf_flat"
+            )
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits)
+
+    raise IndexBuildError(f"Unsupported vector index type: {index_type} (expected one of {INDEX_TYPES})")
+
+
+def train_faiss_index(index, vectors: np.ndarray) -> None:
+    """Train the index on the embedded chunks if its type needs it (IVF*)."""
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(vectors, dtype="float32"))
+
+
+def update_faiss_index(index, keep: np.ndarray, vectors: np.ndarray):
+    """Drop the rows where `keep` is False and append `vectors`.
+
+    Ids stay dense and in row order (kept rows shift down, new rows follow), exactly as the
+    node store and BM25 renumber on the same update, so row == FAISS id still holds and no
+    IndexIDMap / id translation is needed at query time. Flat and IVF delete in place, IVF
+    then rewrites its list ids (O(ntotal) ints, no vectors touched). Returns the updated
+    index; HNSW can't delete graph nodes, so when rows are removed it is rebuilt from its
+    stored vectors (no re-embedding, but the cost of a full HNSW build) and a new index is
+    returned.
+    """
+    keep = np.asarray(keep, dtype=bool)
+    removed = np.flatnonzero(~keep)
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+
+    hnsw = _as_hnsw(index)
+    if hnsw is not None and len(removed):
+        rebuilt = create_faiss_index(
+            hnsw.d, "hnsw", hnsw_m=hnsw.hnsw.nb_neighbors(1), ef_construction=hnsw.hnsw.efConstruction
+        )
+        rebuilt.hnsw.efSearch = hnsw.hnsw.efSearch
+        rebuilt.add(hnsw.reconstruct_n(0, hnsw.ntotal)[keep])
+        index = rebuilt
+    elif len(removed):
+        index.remove_ids(faiss.IDSelectorBatch(removed))  # flat compacts, so ids shift with it
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            # IVF keeps the removed rows' neighbours under their old ids; renumber them in place
+            new_ids = np.cumsum(keep) - 1
+            for list_no in range(ivf.nlist):
+                n = ivf.invlists.list_size(list_no)
+                if n:
+                    ids = faiss.rev_swig_ptr(ivf.invlists.get_ids(list_no), n)
+                    ids[:] = new_ids[ids]
+
+    if len(vectors):
+        index.add(vectors)  # ids continue from ntotal
+    return index
+
+
+def set_search_params(index, nprobe: int | None = None, ef_search: int | None = None) -> None:
+    """Apply query-time knobs; no-op for index types that don't use them."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+
+    hnsw = _as_hnsw(index)
+    if hnsw is not None and ef_search:
+        hnsw.hnsw.efSearch = ef_search
+
+
+def id_selector(ids: np.ndarray, ntotal: int):
+    """IDSelectorBitmap admitting only `ids`; membership is one bit test per candidate."""
+    bits = np.zeros(ntotal, dtype=bool)
+    bits[ids] = True
+    bitmap = np.packbits(bits, bitorder="little")
+    selector = faiss.IDSelectorBitmap(bitmap)
+    selector.referenced_objects = [bitmap]  # the selector doesn't own its bitmap
+    return selector
+
+
+def search_params(index, selector=None, exhaustive: bool = False):
+    """SearchParameters for one filtered search call.
+
+    A params object replaces the index's own nprobe / efSearch instead of inheriting them,
+    so they are copied over. exhaustive=True widens them to the whole index, for when a
+    selective filter leaves too few members in the probed lists / visited graph.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist if exhaustive else ivf.nprobe)
+
+    hnsw = _as_hnsw(index)
+    if hnsw is not None:
+        ef_search = max(hnsw.hnsw.efSearch, index.ntotal) if exhaustive else hnsw.hnsw.efSearch
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+
+    return faiss.SearchParameters(sel=selector)
+
+
+def describe_faiss_index(index) -> dict:
+    """Build parameters of a FAISS index, as recorded in the manifest."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf = faiss.downcast_index(ivf)
+        if isinstance(ivf, faiss.IndexIVFPQ):
+            return {"type": "ivf_pq", "nlist": ivf.nlist, "pq_m": ivf.pq.M, "pq_nbits": ivf.pq.nbits}
+        return {"type": "ivf_flat", "nlist": ivf.nlist}
+
+    hnsw = _as_hnsw(index)
+    if hnsw is not None:
+        return {"type": "hnsw", "hnsw_m": hnsw.hnsw.nb_neighbors(1)}
+
+    return {"type": "flat"}
+
+
+def read_faiss_index(path: str, index_type: str = "flat", mmap: bool = False):
+    """Read a persisted index. With mmap the vector data stays in the OS page cache and is
+    shared by every process that maps the file instead of being copied onto each heap."""
+    if not mmap:
+        return faiss.read_index(path)
+    # IVF inverted lists map through OnDiskInvertedLists; flat codes (flat, HNSW storage) map in place
+    flags = faiss.IO_FLAG_MMAP if index_type.startswith("ivf") else faiss.IO_FLAG_MMAP_IFC
+    return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def _as_hnsw(index):
+    index = faiss.downcast_index(index)
+    return index if isinstance(index, faiss.IndexHNSW) else None
 
 
 class FAISSVectorStore(BaseVectorStore):
 
-    def __init__(self, dimension: int):
-        self.index = faiss.IndexFlatL2(dimension)
+    def __init__(self, dimension: int, index_type: str = "flat", **index_params):
+        self.dimension = dimension
+        self.index_type = index_type
+        self.index_params = index_params
+        self.index = None
         self.metadata = []
 
     def add(self, embeddings: List[List[float]], metadata: List[dict]):
         vectors = np.array(embeddings).astype("float32")
+        if self.index is None:
+            # first batch doubles as the training set for IVF types
+            self.index = create_faiss_index(self.dimension, self.index_type, n_train=len(vectors), **self.index_params)
+            train_faiss_index(self.index, vectors)
         self.index.add(vectors)
         self.metadata.extend(metadata)
 
     def search(self, query_vector: List[float], top_k: int):
+        if self.index is None:
+            return []
         vector = np.array([query_vector]).astype("float32")
         distances, indices = self.index.search(vector, top_k)
         results = []
 
         for idx in indices[0]:
+            if idx < 0:
+                continue
             results.append(self.metadata[idx])
 
-        return results
\ No newline at end of file
+        return results
@@ -1,12 +1,22 @@
+import asyncio
 import json
+import threading
+import time
+
 import numpy as np
+import xxhash
 
 from backend.core.config import get_settings
+from backend.core.executors import run_cpu
 from backend.core.logging import get_logger
+from backend.core.lru import LocalLRU
+from backend.core.query_context import aembed_contexts
 
 logger = get_logger(__name__)
 
-CACHE_KEYS_LIST = "cache:keys"   # list of cache keys (bounded)
+CACHE_STREAM = "cache:stream"         # append-only log of (answer key, embedding, expiry, index build) per save
+CACHE_ANSWER_PREFIX = "cache:answer:"  # answer text per exact key, with TTL; shared by both tiers
+SYNC_BATCH = 5000                     # stream entries read per XREAD while catching up
 
 
 def get_cache():
@@ -21,63 +31,343 @@ def get_cache():
 class NoOpCache:
     """No-op cache when Redis is unavailable."""
 
-    def check(self, query: str, threshold: float = 0.95):
+    def check(self, ctx, threshold: float = 0.95):
+        return None
+
+    def save(self, ctx, answer: str, ttl_seconds: int = 3600):
+        pass
+
+    async def acheck(self, ctx, threshold: float = 0.95):
         return None
 
-    def save(self, query: str, answer: str, ttl_seconds: int = 3600):
+    async def acheck_many(self, ctxs, threshold: float = 0.95):
+        return [None] * len(ctxs)
+
+    async def asave(self, ctx, answer: str, ttl_seconds: int = 3600):
         pass
 
+    def set_index_version(self, build_id: str) -> None:
+        pass
+
+
+def exact_key(ctx) -> str:
+    """Stable across processes and restarts (unlike hash()): normalised question, doc_type, index build."""
+    raw = json.dumps([ctx.normalized.casefold(), ctx.doc_type, ctx.index_version])
+    return f"{CACHE_ANSWER_PREFIX}{xxhash.xxh3_128_hexdigest(raw.encode('utf-8'))}"
+
+
+def cache_scope(ctx) -> str:
+    """The part of exact_key besides the question: a semantic hit must share it."""
+    return json.dumps(ctx.doc_type)
+
+
+def normalize(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype="float32").ravel()
+    return v / (np.linalg.norm(v) + 1e-9)
+
+
+class EmbeddingMatrix:
+    """In-process ring buffer of unit-norm float32 embeddings; cosine similarity is one mat-vec.
+
+    Grows by doubling up to max_entries, then overwrites the oldest row, so memory is
+    4 * dim bytes per cached entry. Each entry has a scope (the filters its answer was
+    retrieved under); searches only match entries of the query's scope. Safe to share
+    between threads: writes take the lock, searches snapshot the live rows under it and run
+    the product outside it.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.vectors = None                    # float32[capacity, dim]
+        self.keys: list[str | None] = []
+        self.expires_at = np.zeros(0)          # unix seconds per row
+        self.scopes = np.zeros(0, dtype="int32")  # code per row, into _scope_codes
+        self._scope_codes: dict[str, int] = {}
+        self.size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, key: str, vector: np.ndarray, expires_at: float, scope: str = "") -> None:
+        with self._lock:
+            if self.vectors is not None and len(vector) != self.vectors.shape[1]:
+                return  # written under another embedding model
+            if self.vectors is None:
+                self.vectors = np.zeros((min(1024, self.max_entries), len(vector)), dtype="float32")
+                self.keys = [None] * len(self.vectors)
+                self.expires_at = np.zeros(len(self.vectors))
+                self.scopes = np.zeros(len(self.vectors), dtype="int32")
+            elif self._next == len(self.vectors) and len(self.vectors) < self.max_entries:
+                # new arrays rather than resizing, so snapshots taken by searches stay valid
+                capacity = min(2 * len(self.vectors), self.max_entries)
+                grown = np.zeros((capacity, self.vectors.shape[1]), dtype="float32")
+                grown[:len(self.vectors)] = self.vectors
+                self.vectors = grown
+                self.keys = self.keys + [None] * (capacity - len(self.keys))
+                self.expires_at = np.concatenate([self.expires_at, np.zeros(capacity - len(self.expires_at))])
+                self.scopes = np.concatenate([self.scopes, np.zeros(capacity - len(self.scopes), dtype="int32")])
+
+            row = self._next % len(self.vectors)
+            self.vectors[row] = vector
+            self.keys[row] = key
+            self.expires_at[row] = expires_at
+            self.scopes[row] = self._scope_codes.setdefault(scope, len(self._scope_codes))
+            self._next = row + 1
+            self.size = min(self.size + 1, len(self.vectors))
+
+    def drop(self, key: str) -> None:
+        with self._lock:
+            for row, k in enumerate(self.keys):
+                if k == key:
+                    self.expires_at[row] = 0.0
+
+    def _snapshot(self, now: float, scopes: list[str]):
+        """(vectors, keys, live mask per scope) over the filled rows, consistent with each other."""
+        with self._lock:
+            if not self.size:
+                return None, None, None
+            live = self.expires_at[:self.size] > now
+            codes = np.array([self._scope_codes.get(scope, -1) for scope in scopes], dtype="int32")
+            return self.vectors[:self.size], self.keys[:self.size], live & (self.scopes[:self.size] == codes[:, None])
 
-def cosine_similarity(a, b):
-    a = np.array(a, dtype="float32")
-    b = np.array(b, dtype="float32")
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9))
+    def _resolve(self, rows, keys: list) -> list[str]:
+        """Snapshot keys of `rows`, minus rows overwritten while the product ran: their
+        vector may already be the new entry's, which doesn't belong to the old key."""
+        with self._lock:
+            return [keys[i] for i in rows if self.keys[i] == keys[i]]
+
+    def search(self, query: np.ndarray, threshold: float, limit: int = 4, now: float | None = None,
+               scope: str = "") -> list[str]:
+        """Keys of live entries of `scope` with cosine >= threshold, most similar first."""
+        vectors, keys, live = self._snapshot(time.time() if now is None else now, [scope])
+        if vectors is None or len(query) != vectors.shape[1]:
+            return []
+        sims = vectors @ query
+        sims[~live[0]] = -np.inf
+        hits = np.flatnonzero(sims >= threshold)
+        return self._resolve(hits[np.argsort(-sims[hits], kind="stable")[:limit]], keys)
+
+    def search_many(self, queries: np.ndarray, threshold: float, limit: int = 4,
+                    scopes: list[str] | None = None) -> list[list[str]]:
+        """search() for each row of `queries` (n, dim) and its scope, as one mat-mat product."""
+        queries = np.atleast_2d(queries)
+        vectors, keys, live = self._snapshot(time.time(), scopes or [""] * len(queries))
+        if vectors is None or queries.shape[1] != vectors.shape[1]:
+            return [[] for _ in queries]
+        sims = queries @ vectors.T
+        sims[~live] = -np.inf
+        results = []
+        for row in sims:
+            hits = np.flatnonzero(row >= threshold)
+            results.append(self._resolve(hits[np.argsort(-row[hits], kind="stable")[:limit]], keys))
+        return results
 
 
 class SemanticCache:
-    def __init__(self, max_keys: int = 300):
+    """Two-tier answer cache. Takes the request's QueryContext so the question is embedded
+    at most once and reused by retrieval instead of being re-embedded here.
+
+    Exact tier: answers under exact_key(ctx), served from an in-process LRU and then Redis,
+    without any embedding call. Semantic tier, only on an exact miss: each save also appends
+    the unit-norm float32 embedding as raw bytes to a Redis stream that every process tails
+    into an EmbeddingMatrix, so a lookup is one XREAD for new entries, one mat-vec and one
+    pipelined GET of the best candidates, independent of how many entries are cached.
+
+    Answers belong to one index build: exact keys include it, and the matrix only holds
+    entries saved under the build set by set_index_version (the first one seen by default).
+
+    check / save block on Redis; acheck / asave are the same over redis.asyncio for async
+    endpoints, with the mat-vec on the CPU pool.
+    """
+
+    def __init__(self, max_entries: int | None = None):
         import redis
-        from backend.core.embeddings.factory import get_embedder
+        import redis.asyncio
         s = get_settings()
         self.r = redis.from_url(s.REDIS_URL)
         self.r.ping()  # verify connection
-        self.embedder = get_embedder()
-        self.max_keys = max_keys
+        self.ar = redis.asyncio.from_url(s.REDIS_URL)
+        self.max_entries = max_entries or s.SEMANTIC_CACHE_MAX_ENTRIES
+        self.matrix = EmbeddingMatrix(self.max_entries)
+        self.local = LocalLRU(s.CACHE_L1_SIZE)
+        self._last_id = b"0"
+        self._lock = threading.Lock()
+        self._async_lock = asyncio.Lock()
+        self.index_version = None
 
-    def _embed_query(self, text: str) -> list[float]:
-        return self.embedder.embed_query(text)
+    def set_index_version(self, build_id: str) -> None:
+        """Serve semantic hits from `build_id` only; the matrix is rebuilt from the stream."""
+        with self._lock:
+            if build_id == self.index_version:
+                return
+            if self.index_version is not None:
+                logger.info(f"[cache] index build changed, dropping {len(self.matrix)} semantic entries")
+            self.index_version = build_id
+            self.matrix = EmbeddingMatrix(self.max_entries)
+            self.local.clear()
+            self._last_id = b"0"
 
-    def check(self, query: str, threshold: float = 0.95):
-        qv = self._embed_query(query)
+    def _add_entries(self, since: bytes, batch) -> bool:
+        """Add one XREAD batch read after `since`; True if the stream may hold more."""
+        entries = batch[0][1] if batch else []
+        with self._lock:
+            if self._last_id != since:
+                return False  # reset by set_index_version meanwhile; the next sync starts over
+            for entry_id, fields in entries:
+                if fields.get(b"ver", b"").decode() == self.index_version:
+                    vector = np.frombuffer(fields[b"emb"], dtype="float32")
+                    # entries saved without a scope can't be matched safely; "" is no query's scope
+                    self.matrix.add(fields[b"key"].decode(), vector, float(fields[b"exp"]), fields.get(b"scope", b"").decode())
+                self._last_id = entry_id
+        return len(entries) == SYNC_BATCH
 
-        # Get recent keys only (bounded)
-        keys = self.r.lrange(CACHE_KEYS_LIST, 0, self.max_keys - 1)
-        if not keys:
+    def _sync(self) -> None:
+        """Append stream entries written (by any process) since the last sync."""
+        while True:
+            since = self._last_id
+            if not self._add_entries(since, self.r.xread({CACHE_STREAM: since}, count=SYNC_BATCH)):
+                return
+
+    async def _async_sync(self) -> None:
+        async with self._async_lock:
+            while True:
+                since = self._last_id
+                if not self._add_entries(since, await self.ar.xread({CACHE_STREAM: since}, count=SYNC_BATCH)):
+                    return
+
+    def _current_build(self, ctx) -> bool:
+        """Whether ctx runs on the build semantic hits are served for; a request still on a
+        build that was just swapped out only gets exact hits."""
+        if self.index_version is None:
+            self.set_index_version(ctx.index_version)
+        if ctx.index_version != self.index_version:
+            logger.info("[cache] semantic tier skipped (request on a retired index build)")
+            return False
+        return True
+
+    def _exact_hit(self, key: str, raw, pttl) -> str | None:
+        if raw is None:
             return None
+        answer = raw.decode()
+        self.local.set(key, answer, max(pttl, 0) / 1000)
+        logger.info("[cache] HIT exact")
+        return answer
 
-        for k in keys:
-            raw = self.r.get(k)
-            if not raw:
-                continue
-            cached = json.loads(raw)
-            sim = cosine_similarity(qv, cached["embedding"])
-            if sim >= threshold:
-                logger.info(f"[cache] HIT sim={sim:.3f}")
-                return cached["answer"]
-
-        logger.info("[cache] MISS")
+    def _first_live(self, candidates: list[str], answers) -> str | None:
+        # candidates can have expired or been cleared in Redis
+        for key, raw in zip(candidates, answers):
+            if raw is not None:
+                logger.info(f"[cache] HIT semantic entries={len(self.matrix)}")
+                return raw.decode()
+            self.matrix.drop(key)
+        logger.info("[cache] MISS (expired)")
         return None
 
-    def save(self, query: str, answer: str, ttl_seconds: int = 3600):
-        key = f"cache:{abs(hash(query))}"
-        payload = {
-            "embedding": self._embed_query(query),
-            "answer": answer
+    def _stream_fields(self, ctx, key: str, ttl_seconds: int) -> dict:
+        return {
+            "key": key, "emb": normalize(ctx.embedding).tobytes(), "exp": time.time() + ttl_seconds,
+            "ver": ctx.index_version or "", "scope": cache_scope(ctx),
         }
-        self.r.setex(key, ttl_seconds, json.dumps(payload))
 
-        # push into recent keys list and trim
-        self.r.lpush(CACHE_KEYS_LIST, key)
-        self.r.ltrim(CACHE_KEYS_LIST, 0, self.max_keys - 1)
+    def check(self, ctx, threshold: float = 0.95):
+        key = exact_key(ctx)
+        answer = self.local.get(key)
+        if answer is not None:
+            logger.info("[cache] HIT exact (local)")
+            return answer
+        pipe = self.r.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        answer = self._exact_hit(key, *pipe.execute())
+        if answer is not None or not self._current_build(ctx):
+            return answer
+
+        self._sync()
+        candidates = self.matrix.search(normalize(ctx.embedding), threshold, scope=cache_scope(ctx))
+        if not candidates:
+            logger.info("[cache] MISS")
+            return None
+
+        # fetch all candidates in one round trip
+        pipe = self.r.pipeline(transaction=False)
+        for key in candidates:
+            pipe.get(key)
+        return self._first_live(candidates, pipe.execute())
+
+    async def acheck(self, ctx, threshold: float = 0.95):
+        key = exact_key(ctx)
+        answer = self.local.get(key)
+        if answer is not None:
+            logger.info("[cache] HIT exact (local)")
+            return answer
+        async with self.ar.pipeline(transaction=False) as pipe:
+            answer = self._exact_hit(key, *await pipe.get(key).pttl(key).execute())
+        if answer is not None or not self._current_build(ctx):
+            return answer
+
+        _, embedding = await asyncio.gather(self._async_sync(), ctx.aembed())
+        candidates = await run_cpu(self.matrix.search, normalize(embedding), threshold, scope=cache_scope(ctx))
+        if not candidates:
+            logger.info("[cache] MISS")
+            return None
+
+        async with self.ar.pipeline(transaction=False) as pipe:
+            for key in candidates:
+                pipe.get(key)
+            return self._first_live(candidates, await pipe.execute())
+
+    async def acheck_many(self, ctxs, threshold: float = 0.95) -> list[str | None]:
+        """acheck for a batch of questions: one pipelined exact lookup for all of them, one
+        embedding request and one mat-mat for the exact misses, one pipelined GET of every
+        semantic candidate."""
+        keys = [exact_key(ctx) for ctx in ctxs]
+        answers = [self.local.get(key) for key in keys]
+        todo = [i for i, a in enumerate(answers) if a is None]
+        if todo:
+            async with self.ar.pipeline(transaction=False) as pipe:
+                for i in todo:
+                    pipe.get(keys[i]).pttl(keys[i])
+                replies = await pipe.execute()
+            for n, i in enumerate(todo):
+                answers[i] = self._exact_hit(keys[i], replies[2 * n], replies[2 * n + 1])
+
+        todo = [i for i, a in enumerate(answers) if a is None and self._current_build(ctxs[i])]
+        if todo:
+            await asyncio.gather(self._async_sync(), aembed_contexts([ctxs[i] for i in todo]))
+            queries = np.stack([normalize(ctxs[i].embedding) for i in todo])
+            candidates = await run_cpu(self.matrix.search_many, queries, threshold, scopes=[cache_scope(ctxs[i]) for i in todo])
+            flat = [key for found in candidates for key in found]
+            if flat:
+                async with self.ar.pipeline(transaction=False) as pipe:
+                    for key in flat:
+                        pipe.get(key)
+                    replies = iter(await pipe.execute())
+                for i, found in zip(todo, candidates):
+                    if found:
+                        answers[i] = self._first_live(found, [next(replies) for _ in found])
+
+        logger.info(f"[cache] batch of {len(ctxs)}: {sum(a is not None for a in answers)} hits")
+        return answers
+
+    def save(self, ctx, answer: str, ttl_seconds: int = 3600):
+        key = exact_key(ctx)
+        self.local.set(key, answer, ttl_seconds)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.setex(key, ttl_seconds, answer)
+        pipe.xadd(CACHE_STREAM, self._stream_fields(ctx, key, ttl_seconds), maxlen=self.max_entries, approximate=True)
+        pipe.execute()
+
+        logger.info("[cache] SAVED")
+
+    async def asave(self, ctx, answer: str, ttl_seconds: int = 3600):
+        key = exact_key(ctx)
+        self.local.set(key, answer, ttl_seconds)
+        await ctx.aembed()
+        async with self.ar.pipeline(transaction=False) as pipe:
+            pipe.setex(key, ttl_seconds, answer)
+            pipe.xadd(CACHE_STREAM, self._stream_fields(ctx, key, ttl_seconds), maxlen=self.max_entries, approximate=True)
+            await pipe.execute()
 
-        logger.info("[cache] SAVED")
\ No newline at end of file
+        logger.info("[cache] SAVED")
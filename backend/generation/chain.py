@@ -1,15 +1,43 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from pydantic import BaseModel, Field
 
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
+from langchain_core.tracers.context import register_configure_hook
 
 from backend.core.config import get_settings
 from backend.core.logging import get_logger
-from backend.generation.prompts import SYSTEM_PROMPT
+from backend.core.metrics import LLM_TOKENS
+from backend.generation.prompts import SYSTEM_PROMPT, STREAM_SYSTEM_PROMPT, SOURCES_TRAILER
 
 logger = get_logger(__name__)
 
+# chat model calls made while it is set report their token usage to this handler
+_usage_handler: ContextVar[UsageMetadataCallbackHandler | None] = ContextVar("llm_usage_handler", default=None)
+register_configure_hook(_usage_handler, inheritable=True)
+
+
+@contextmanager
+def track_token_usage():
+    """Count the tokens of every chain call made in the block in llm_tokens_total."""
+    handler = UsageMetadataCallbackHandler()
+    token = _usage_handler.set(handler)
+    try:
+        yield handler
+    finally:
+        try:
+            _usage_handler.reset(token)
+        except ValueError:
+            pass  # closed from another context (an abandoned stream); the variable dies with that one
+        for model, usage in handler.usage_metadata.items():
+            LLM_TOKENS.inc(usage.get("input_tokens", 0), model=model, kind="input")
+            LLM_TOKENS.inc(usage.get("output_tokens", 0), model=model, kind="output")
+
 
 class RAGOutput(BaseModel):
     """Structured output: answer + only the documents actually used."""
@@ -49,4 +77,79 @@ def build_rag_chain():
     )
 
     logger.info("[generation.chain] RAG chain built (structured output)")
-    return chain
\ No newline at end of file
+    return chain
+
+
+def build_rag_stream_chain():
+    """Same context and rules as build_rag_chain, but the answer streams as plain text with a
+    SOURCES trailer line (split off by AnswerStream) instead of one structured object."""
+    s = get_settings()
+    llm = ChatOpenAI(
+        model=s.LLM_MODEL,
+        temperature=s.LLM_TEMPERATURE,
+        api_key=s.OPENAI_API_KEY,
+        streaming=True,
+        stream_usage=True,  # usage of streamed answers arrives with the last chunk
+    )
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", STREAM_SYSTEM_PROMPT),
+        ("human", "Context:\n{context}\n\nQuestion: {question}"),
+    ])
+
+    chain = (
+        RunnablePassthrough.assign(context=lambda x: format_context(x["chunks"]))
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+
+    logger.info("[generation.chain] RAG stream chain built (text + sources trailer)")
+    return chain
+
+
+class AnswerStream:
+    """Splits streamed text into answer deltas and the trailing sources list.
+
+    feed() returns the part of the answer that is safe to show: text that might be the start
+    of the trailer marker is held back until the next chunk settles it.
+    """
+
+    def __init__(self):
+        self.answer = ""       # answer text released so far
+        self._pending = ""     # held back, may be the start of the marker
+        self._trailer = None   # text after the marker, once seen
+
+    def feed(self, chunk: str) -> str:
+        if self._trailer is not None:
+            self._trailer += chunk
+            return ""
+        text = self._pending + chunk
+        at = text.find(SOURCES_TRAILER)
+        if at >= 0:
+            delta, self._pending = text[:at], ""
+            self._trailer = text[at + len(SOURCES_TRAILER):]
+        else:
+            cut = len(text) - _marker_prefix_len(text)
+            delta, self._pending = text[:cut], text[cut:]
+        self.answer += delta
+        return delta
+
+    def close(self) -> str:
+        """Releases what was held back when the stream ends without a trailer."""
+        delta, self._pending = self._pending, ""
+        self.answer += delta
+        return delta
+
+    @property
+    def sources(self) -> list[str]:
+        names = (f.strip().strip('"') for f in (self._trailer or "").split(","))
+        return [n for n in names if n]
+
+
+def _marker_prefix_len(text: str) -> int:
+    """Length of the longest suffix of text that is a prefix of the trailer marker."""
+    for n in range(min(len(SOURCES_TRAILER), len(text)), 0, -1):
+        if SOURCES_TRAILER.startswith(text[-n:]):
+            return n
+    return 0
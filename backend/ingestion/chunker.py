@@ -25,6 +25,8 @@ def chunk_documents(documents):
             file_name = node.metadata.get("file_name", "")
             node.metadata["doc_type"] = infer_doc_type(file_name)
             node.metadata["chunk_id"] = node.node_id
+            # random per run: keep it out of the embedded text so unchanged chunks hit the embedding cache
+            node.excluded_embed_metadata_keys.append("chunk_id")
 
         logger.info(f"[chunker] Produced {len(nodes)} chunks (nodes)")
         return nodes
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+import xxhash
+
+from backend.core.array_file import write_array_file, read_array_file
+from backend.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_SQL_VARS = 500  # keys per IN (...) query, under SQLite's variable limit
+
+KEYS_MAGIC = b"LMEKEYS"
+KEYS_FORMAT_VERSION = 1
+
+
+def new_run_id() -> int:
+    """Increasing across ingestion runs."""
+    return time.time_ns()
+
+
+def cache_key(model: str, dimension: int, text: str) -> bytes:
+    return xxhash.xxh3_128_digest(f"{model}\0{dimension}\0{text}".encode("utf-8"))
+
+
+def save_keys(path: str, keys: np.ndarray) -> None:
+    """Write a build's cache keys, one 16-byte row per chunk."""
+    write_array_file(path, KEYS_MAGIC, KEYS_FORMAT_VERSION, {}, {"keys": np.asarray(keys, dtype="uint8").reshape(-1, 16)})
+
+
+def load_keys(path: str) -> np.ndarray:
+    _, _, arrays = read_array_file(path, KEYS_MAGIC, versions=(KEYS_FORMAT_VERSION,))
+    return arrays["keys"]
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk embedding cache: xxh3-128(model, dimension, text) -> float32 bytes.
+
+    Lives in one SQLite file outside the index storage dir, so re-ingesting an unchanged
+    corpus makes no embedding calls. Every entry used by a run is stamped with that run's id
+    (one per ingestion, shared by all the caches it opens). Each build also records the key of
+    every chunk it holds (EMBED_KEYS_FILE), so prune() can keep exactly the live build's
+    entries, plus whatever runs newer than it have used.
+    """
+
+    def __init__(self, path: str, model: str, dimension: int, run: int | None = None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.model = model
+        self.dimension = dimension
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL, run INTEGER NOT NULL)"
+        )
+        self.run = run or new_run_id()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> bytes:
+        return cache_key(self.model, self.dimension, text)
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        """Cached vectors for the given keys; found entries are stamped as used by this run."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), _SQL_VARS):
+            part = unique[i:i + _SQL_VARS]
+            marks = ",".join("?" * len(part))
+            for key, blob in self.db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part):
+                found[key] = np.frombuffer(blob, dtype="float32")
+            self.db.execute(f"UPDATE embeddings SET run = ? WHERE key IN ({marks})", [self.run, *part])
+        self.db.commit()
+        self.hits += sum(1 for k in keys if k in found)
+        self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype="float32")
+        self.db.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, run) VALUES (?, ?, ?)",
+            [(k, v.tobytes(), self.run) for k, v in zip(keys, vectors)],
+        )
+        self.db.commit()
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+    def size(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def prune(self, since: int | None = None, keep=()) -> int:
+        """Delete entries not used by run `since` or any later one (default: the most recent
+        run), except the keys in `keep` (a build's, see load_keys); returns how many were removed."""
+        if since is None:
+            since = self.db.execute("SELECT MAX(run) FROM embeddings").fetchone()[0]
+            if since is None:
+                return 0
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS kept (key BLOB PRIMARY KEY)")
+        self.db.execute("DELETE FROM kept")
+        self.db.executemany("INSERT OR IGNORE INTO kept (key) VALUES (?)", ((bytes(k),) for k in keep))
+        removed = self.db.execute(
+            "DELETE FROM embeddings WHERE run < ? AND key NOT IN (SELECT key FROM kept)", (since,)
+        ).rowcount
+        self.db.commit()
+        self.db.execute("VACUUM")
+        logger.info(f"[embedding_cache] pruned {removed} entries, {self.size()} left")
+        return removed
+
+    def close(self) -> None:
+        self.db.close()
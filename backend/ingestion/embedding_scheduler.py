@@ -0,0 +1,168 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.core.config import get_settings
+from backend.core.logging import get_logger
+from backend.core.embeddings.local_embedder import LOCAL_MODEL
+
+logger = get_logger(__name__)
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _estimate_tokens(texts: list[str]) -> list[int]:
+    return [len(t) // 3 + 1 for t in texts]
+
+
+def get_token_counter(model: str):
+    """Token count function for `model`: tiktoken when its encoding can be loaded, else an
+    over-estimate (~3 chars/token) that keeps batches under the same budget."""
+    if model == LOCAL_MODEL:
+        return _estimate_tokens  # no API limits to respect
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda texts: [len(t) for t in encoding.encode_ordinary_batch(texts)]
+    except Exception as e:  # unknown model or BPE file not downloadable (offline)
+        logger.warning(f"[embed_scheduler] tiktoken unavailable for {model} ({e}), estimating tokens")
+        return _estimate_tokens
+
+
+def _is_retryable(e: Exception) -> bool:
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None:
+        return status in _RETRY_STATUS
+    # openai.APIConnectionError / APITimeoutError carry no status
+    return type(e).__name__ in ("APIConnectionError", "APITimeoutError", "RateLimitError", "TimeoutError")
+
+
+def _retry_after(e: Exception) -> float | None:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingScheduler:
+    """Embeds a corpus through `embedder.embed_documents` in token-budgeted batches.
+
+    Chunks are packed in order into batches of at most max_batch_tokens tokens and
+    max_batch_size inputs, up to `concurrency` batches are in flight at once, and
+    rate-limit / transient errors are retried with exponential backoff (honouring
+    Retry-After). Throughput is reported in embedded tokens per second. With a `cache`
+    (EmbeddingCache) only texts it doesn't hold are sent, each distinct text once.
+
+    Used as a context manager, its worker threads are started once and shared by every
+    embed() call until exit; otherwise each call starts and stops its own.
+    """
+
+    def __init__(self, embedder, max_batch_tokens: int | None = None, max_batch_size: int | None = None,
+                 concurrency: int | None = None, max_retries: int | None = None,
+                 backoff_s: float = 1.0, token_counter=None, cache=None):
+        s = get_settings()
+        self.embedder = embedder
+        self.cache = cache
+        self.max_batch_tokens = max_batch_tokens or s.EMBED_BATCH_MAX_TOKENS
+        self.max_batch_size = max_batch_size or s.EMBED_BATCH_SIZE
+        self.concurrency = concurrency or s.EMBED_CONCURRENCY
+        self.max_retries = s.EMBED_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_s = backoff_s
+        self.count_tokens = token_counter or get_token_counter(getattr(embedder, "model", s.EMBED_MODEL))
+        self.stats = {"texts": 0, "tokens": 0, "batches": 0, "retries": 0, "seconds": 0.0, "tokens_per_s": 0.0}
+        self._pool = None
+
+    def __enter__(self) -> "EmbeddingScheduler":
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._pool.shutdown(cancel_futures=True)
+        self._pool = None
+
+    def pack(self, texts: list[str]) -> list[tuple[int, int, int]]:
+        """(start, end, tokens) ranges over texts, in order, each within the batch budget."""
+        batches, start, tokens = [], 0, 0
+        for i, n in enumerate(self.count_tokens(texts)):
+            if i > start and (tokens + n > self.max_batch_tokens or i - start >= self.max_batch_size):
+                batches.append((start, i, tokens))
+                start, tokens = i, 0
+            tokens += n
+        if start < len(texts):
+            batches.append((start, len(texts), tokens))
+        return batches
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return np.asarray(self.embedder.embed_documents(texts), dtype="float32")
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_after(e) or self.backoff_s * 2 ** attempt * (0.5 + random.random())
+                self.stats["retries"] += 1
+                logger.warning(f"[embed_scheduler] {type(e).__name__}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """(len(texts), dim) float32 embeddings, in input order."""
+        if self.cache is None:
+            return self._embed_all(texts)
+
+        keys = [self.cache.key(t) for t in texts]
+        found = self.cache.get_many(keys)
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            vectors = self._embed_all(list(missing.values()))
+            self.cache.put_many(list(missing), vectors)
+            found.update(zip(missing, vectors))
+        logger.info(f"[embed_scheduler] cache {self.cache.stats}, embedded {len(missing)} distinct texts")
+        self.stats["cache"] = self.cache.stats
+        dim = getattr(self.embedder, "dimension", 0)
+        return np.stack([found[k] for k in keys]) if keys else np.zeros((0, dim), dtype="float32")
+
+    def _embed_all(self, texts: list[str]) -> np.ndarray:
+        start = time.perf_counter()
+        batches = self.pack(texts)
+        dim = getattr(self.embedder, "dimension", 0)
+        if not batches:
+            return np.zeros((0, dim), dtype="float32")
+
+        pool = self._pool or ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        try:
+            futures = [pool.submit(self._embed_batch, texts[a:b]) for a, b, _ in batches]
+            done_tokens, parts = 0, []
+            log_every = max(1, len(batches) // 20)
+            for i, ((a, b, tokens), future) in enumerate(zip(batches, futures)):
+                try:
+                    parts.append(future.result())
+                except Exception:
+                    for f in futures:
+                        f.cancel()  # don't keep spending on a run that already failed
+                    raise
+                done_tokens += tokens
+                if (i + 1) % log_every == 0:
+                    elapsed = time.perf_counter() - start
+                    logger.info(
+                        f"[embed_scheduler] {b}/{len(texts)} chunks | {done_tokens} tokens | {done_tokens / max(elapsed, 1e-9):.0f} tok/s"
+                    )
+        finally:
+            if pool is not self._pool:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - start
+        self.stats.update(
+            texts=len(texts),
+            tokens=done_tokens,
+            batches=len(batches),
+            seconds=round(elapsed, 3),
+            tokens_per_s=round(done_tokens / max(elapsed, 1e-9), 1),
+        )
+        logger.info(f"[embed_scheduler] done: {self.stats}")
+        return np.concatenate(parts)
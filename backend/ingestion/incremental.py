@@ -0,0 +1,115 @@
+import os, json
+
+import faiss
+import numpy as np
+import xxhash
+
+from backend.core.logging import get_logger
+from backend.core.config import get_settings
+from backend.core.exceptions import IndexBuildError
+from backend.core.constants import MANIFEST_FILE, BM25_FILE, EMBED_KEYS_FILE, NODES_FILE, VECTOR_INDEX_FILE
+from backend.core.embeddings.factory import get_embed_model_id
+from backend.core.vectorstores.faiss_vector_store import update_faiss_index
+from backend.ingestion.embedding_cache import load_keys, save_keys
+from backend.ingestion.indexer import embed_nodes, embedding_keys, bm25_tokens, node_chunk
+from backend.retrieval.bm25_index import BM25Index
+from backend.retrieval.node_store import NodeStore
+
+logger = get_logger(__name__)
+
+_READ_BLOCK = 1 << 20
+
+
+def file_hashes(paths: list[str]) -> dict[str, str]:
+    """file_path -> xxh3-128 hex digest of the file's bytes."""
+    hashes = {}
+    for path in paths:
+        h = xxhash.xxh3_128()
+        with open(path, "rb") as f:
+            while block := f.read(_READ_BLOCK):
+                h.update(block)
+        hashes[path] = h.hexdigest()
+    return hashes
+
+
+def read_manifest(storage_dir: str) -> dict | None:
+    path = os.path.join(storage_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def plan_update(manifest: dict | None, hashes: dict[str, str], embed_dim: int, storage_dir: str):
+    """(files to (re)index, files to drop) against the stored build, or None when it can't be
+    updated in place and needs a full rebuild (no build yet, or built with other settings)."""
+    if manifest is None:
+        logger.info("[incremental] No stored build, building from scratch")
+        return None
+    s = get_settings()
+    stored = {
+        "files": bool(manifest.get("files")),
+        "embedding_model": manifest.get("embedding_model") == get_embed_model_id(),
+        "embedding_dimension": manifest.get("embedding_dimension") == embed_dim,
+        "chunk_size": manifest.get("chunk_size") == s.CHUNK_SIZE,
+        "chunk_overlap": manifest.get("chunk_overlap") == s.CHUNK_OVERLAP,
+        "vector_index": manifest.get("vector_index", {}).get("type") == s.VECTOR_INDEX_TYPE,
+        "storage": all(os.path.exists(os.path.join(storage_dir, f)) for f in (BM25_FILE, NODES_FILE, VECTOR_INDEX_FILE, EMBED_KEYS_FILE)),
+    }
+    stale = [name for name, ok in stored.items() if not ok]
+    if stale:
+        logger.info(f"[incremental] Full rebuild needed (changed or missing: {', '.join(stale)})")
+        return None
+
+    previous = manifest["files"]
+    changed = [path for path, h in hashes.items() if previous.get(path) != h]
+    removed = [path for path in previous if path not in hashes]
+    logger.info(
+        f"[incremental] {len(changed)} new or changed, {len(removed)} removed, "
+        f"{len(hashes) - len(changed)} unchanged files"
+    )
+    return changed, removed
+
+
+def update_indexes(nodes, embed_model, source_dir: str, drop_files: list[str], target_dir: str | None = None,
+                   cache_run: int | None = None):
+    """Apply a delta to the build in source_dir and write the result to target_dir (default:
+    in place): rows of `drop_files` are removed from the vector index, BM25, node store and
+    embedding cache keys, and `nodes` are embedded and appended to all four. Only the new
+    nodes are embedded and tokenised; row == FAISS id == BM25 document holds afterwards."""
+    storage_dir = target_dir or source_dir
+    try:
+        index = faiss.read_index(os.path.join(source_dir, VECTOR_INDEX_FILE))
+        bm25 = BM25Index.load(os.path.join(source_dir, BM25_FILE))
+        store = NodeStore.load(os.path.join(source_dir, NODES_FILE))
+        keys = load_keys(os.path.join(source_dir, EMBED_KEYS_FILE))
+
+        keep = np.ones(len(store), dtype=bool)
+        for path in drop_files:
+            keep[store.rows({"file_path": path})] = False
+        logger.info(f"[incremental] Removing {int((~keep).sum())} chunks, adding {len(nodes)}")
+
+        index = update_faiss_index(index, keep, embed_nodes(nodes, embed_model, cache_run))
+        bm25 = bm25.update(keep, [bm25_tokens(n) for n in nodes])
+        store = store.update(keep, [node_chunk(n) for n in nodes])
+        keys = np.concatenate([keys[keep], embedding_keys(nodes, embed_model)])
+        if not index.ntotal == len(store) == bm25.corpus_size == len(keys):
+            raise IndexBuildError(
+                f"stores disagree after update: {index.ntotal} vectors, {len(store)} nodes, "
+                f"{bm25.corpus_size} BM25 docs, {len(keys)} cache keys"
+            )
+
+        # the old files may still be mapped (BM25, nodes) or loaded by a server; replace, don't overwrite
+        tmp = os.path.join(storage_dir, f"{VECTOR_INDEX_FILE}.tmp")
+        faiss.write_index(index, tmp)
+        os.replace(tmp, os.path.join(storage_dir, VECTOR_INDEX_FILE))
+        bm25.save(os.path.join(storage_dir, BM25_FILE))
+        store.save(os.path.join(storage_dir, NODES_FILE))
+        save_keys(os.path.join(storage_dir, EMBED_KEYS_FILE), keys)
+        logger.info(f"[incremental] Indexes updated in: {storage_dir} ({len(store)} chunks)")
+        return index
+
+    except IndexBuildError:
+        raise
+    except Exception as e:
+        raise IndexBuildError(f"Incremental index update failed: {e}") from e
@@ -1,43 +1,101 @@
-import os, json, pickle
+import os, json, uuid
 import faiss
-from rank_bm25 import BM25Okapi
+import numpy as np
 
-from llama_index.core import VectorStoreIndex, StorageContext
-from llama_index.vector_stores.faiss import FaissVectorStore
+from llama_index.core.schema import MetadataMode
 
 from backend.core.logging import get_logger
 from backend.core.config import get_settings
 from backend.core.exceptions import IndexBuildError
-from backend.core.constants import MANIFEST_FILE, BM25_FILE, NODES_FILE
-from backend.core.embeddings.factory import get_llama_embed_model
+from backend.core.constants import MANIFEST_FILE, BM25_FILE, NODES_FILE, VECTOR_INDEX_FILE
+from backend.core.embeddings.factory import get_embed_model_id
+from backend.core.vectorstores.faiss_vector_store import create_faiss_index, train_faiss_index, describe_faiss_index
+from backend.ingestion.embedding_cache import EmbeddingCache, cache_key
+from backend.ingestion.embedding_scheduler import EmbeddingScheduler
+from backend.retrieval.bm25_index import BM25Index
+from backend.retrieval.node_store import NodeStore
 
 logger = get_logger(__name__)
 
 def ensure_storage_dir(storage_dir: str) -> None:
     os.makedirs(storage_dir, exist_ok=True)
 
+class NodeEmbedder:
+    """embed_nodes for the batches of one ingestion run, sharing one embedding cache
+    connection and one scheduler (and its worker threads) between them. Use as a context
+    manager, from one thread."""
+
+    def __init__(self, embed_model, cache_run: int | None = None):
+        s = get_settings()
+        self.dimension = embed_model.dimension
+        self.cache = (
+            EmbeddingCache(s.EMBED_CACHE_PATH, get_embed_model_id(), self.dimension, run=cache_run)
+            if s.EMBED_CACHE_PATH else None
+        )
+        self.scheduler = EmbeddingScheduler(embed_model, cache=self.cache)
+
+    def __enter__(self) -> "NodeEmbedder":
+        self.scheduler.__enter__()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.scheduler.__exit__(*exc)
+        if self.cache is not None:
+            self.cache.close()
+
+    def embed(self, nodes) -> np.ndarray:
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        return self.scheduler.embed(texts).reshape(len(nodes), self.dimension)
+
+def embed_nodes(nodes, embed_model, cache_run: int | None = None) -> np.ndarray:
+    """(len(nodes), dim) float32 vectors of the text LlamaIndex embeds (content + embed-visible
+    metadata), in token-budgeted concurrent batches, skipping chunks in the embedding cache.
+    Cache entries used are stamped with `cache_run`, the ingestion run's id."""
+    with NodeEmbedder(embed_model, cache_run) as embedder:
+        return embedder.embed(nodes)
+
+def embedding_keys(nodes, embed_model) -> np.ndarray:
+    """(len(nodes), 16) uint8 embedding cache keys of the nodes' embedded text, in node order."""
+    model, dimension = get_embed_model_id(), embed_model.dimension
+    keys = b"".join(cache_key(model, dimension, node.get_content(metadata_mode=MetadataMode.EMBED)) for node in nodes)
+    return np.frombuffer(keys, dtype="uint8").reshape(len(nodes), 16)
+
+def bm25_tokens(node) -> list[str]:
+    return node.get_content().split()
+
+def node_chunk(node) -> dict:
+    return {"id": node.node_id, "text": node.get_content(), "metadata": node.metadata}
+
 def build_vector_index(nodes, embed_model, storage_dir: str):
     try:
         ensure_storage_dir(storage_dir)
 
         # Dimension MUST come from embedder, not hardcoded
         dimension = embed_model.dimension
-        logger.info(f"[indexer] Building FAISS index (dim={dimension})")
-
-        faiss_index = faiss.IndexFlatL2(dimension)
-        vector_store = FaissVectorStore(faiss_index=faiss_index)
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-
-        llama_embed_model = get_llama_embed_model()
-        index = VectorStoreIndex(
-            nodes,
-            storage_context=storage_context,
-            embed_model=llama_embed_model,
+        s = get_settings()
+        logger.info(f"[indexer] Building FAISS index (dim={dimension}, type={s.VECTOR_INDEX_TYPE})")
+
+        # Embed up front so IVF indexes can be trained on the chunks before anything is added.
+        vectors = embed_nodes(nodes, embed_model)
+
+        faiss_index = create_faiss_index(
+            dimension,
+            s.VECTOR_INDEX_TYPE,
+            n_train=len(vectors),
+            nlist=s.VECTOR_IVF_NLIST,
+            pq_m=s.VECTOR_PQ_M,
+            pq_nbits=s.VECTOR_PQ_NBITS,
+            hnsw_m=s.VECTOR_HNSW_M,
+            ef_construction=s.VECTOR_HNSW_EF_CONSTRUCTION,
         )
+        train_faiss_index(faiss_index, vectors)
+        logger.info(f"[indexer] FAISS index ready: {describe_faiss_index(faiss_index)}")
 
-        index.storage_context.persist(persist_dir=storage_dir)
+        # FAISS id i is row i of the node store (same node order), so no id mapping is persisted
+        faiss_index.add(vectors)
+        faiss.write_index(faiss_index, os.path.join(storage_dir, VECTOR_INDEX_FILE))
         logger.info(f"[indexer] FAISS index persisted to: {storage_dir}")
-        return index
+        return faiss_index
 
     except Exception as e:
         raise IndexBuildError(f"Vector index build failed: {e}") from e
@@ -47,19 +105,11 @@ def build_bm25_index(nodes, storage_dir: str):
         ensure_storage_dir(storage_dir)
 
         logger.info("[indexer] Building BM25 index")
-        tokenized = [node.get_content().split() for node in nodes]
-        bm25 = BM25Okapi(tokenized)
-
-        node_data = [
-            {"id": n.node_id, "text": n.get_content(), "metadata": n.metadata}
-            for n in nodes
-        ]
-
-        with open(os.path.join(storage_dir, BM25_FILE), "wb") as f:
-            pickle.dump(bm25, f)
+        bm25 = BM25Index.from_corpus([bm25_tokens(n) for n in nodes])
+        node_store = NodeStore.from_chunks([node_chunk(n) for n in nodes])
 
-        with open(os.path.join(storage_dir, NODES_FILE), "w") as f:
-            json.dump(node_data, f)
+        bm25.save(os.path.join(storage_dir, BM25_FILE))
+        node_store.save(os.path.join(storage_dir, NODES_FILE))
 
         logger.info(f"[indexer] BM25 + nodes persisted to: {storage_dir}")
         return bm25
@@ -67,16 +117,22 @@ def build_bm25_index(nodes, storage_dir: str):
     except Exception as e:
         raise IndexBuildError(f"BM25 index build failed: {e}") from e
 
-def write_manifest(embedder_name: str, embed_dim: int, storage_dir: str):
+def write_manifest(embedder_name: str, embed_dim: int, storage_dir: str, vector_index: dict | None = None,
+                   files: dict[str, str] | None = None, build_id: str | None = None,
+                   embedding_cache_run: int | None = None):
     s = get_settings()
     manifest = {
+        "build_id": build_id or uuid.uuid4().hex,  # identifies this build in cache keys
         "embedding_provider": s.EMBED_PROVIDER,
-        "embedding_model": s.EMBED_MODEL,
+        "embedding_model": get_embed_model_id(),
         "embedding_name": embedder_name,
         "embedding_dimension": embed_dim,
         "chunk_size": s.CHUNK_SIZE,
         "chunk_overlap": s.CHUNK_OVERLAP,
         "vector_store": s.VECTOR_STORE,
+        "vector_index": vector_index or {"type": "flat"},
+        "files": files or {},  # file_path -> content hash, for incremental ingestion
+        "embedding_cache_run": embedding_cache_run,  # run that wrote this build; see prune_embedding_cache
     }
     path = os.path.join(storage_dir, MANIFEST_FILE)
     with open(path, "w") as f:
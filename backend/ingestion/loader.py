@@ -4,14 +4,24 @@ from backend.core.exceptions import DocumentLoadError
 
 logger = get_logger(__name__)
 
-def load_documents(directory: str):
+DOCUMENT_EXTS = [".pdf", ".docx", ".txt"]
+
+def list_documents(directory: str) -> list[str]:
+    """Paths of the documents under `directory`, as load_documents records them in file_path."""
+    try:
+        reader = SimpleDirectoryReader(input_dir=directory, recursive=True, required_exts=DOCUMENT_EXTS)
+        return [str(p) for p in reader.input_files]
+    except Exception as e:
+        raise DocumentLoadError(f"Failed listing documents in {directory}: {e}") from e
+
+def load_documents(directory: str, files: list[str] | None = None):
+    """Load every document under `directory`, or only `files` (from list_documents)."""
     try:
-        logger.info(f"[loader] Loading documents from: {directory}")
-        reader = SimpleDirectoryReader(
-            input_dir=directory,
-            recursive=True,
-            required_exts=[".pdf", ".docx", ".txt"]
-        )
+        logger.info(f"[loader] Loading {len(files) if files is not None else 'all'} documents from: {directory}")
+        if files is not None:
+            reader = SimpleDirectoryReader(input_files=files)
+        else:
+            reader = SimpleDirectoryReader(input_dir=directory, recursive=True, required_exts=DOCUMENT_EXTS)
         docs = reader.load_data()
         logger.info(f"[loader] Loaded {len(docs)} documents")
         return docs
@@ -0,0 +1,198 @@
+import os, json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pypdf
+import xxhash
+from llama_index.core import Document, SimpleDirectoryReader
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.schema import TextNode
+
+from backend.core.logging import get_logger
+from backend.core.config import get_settings
+from backend.core.exceptions import DocumentLoadError
+from backend.ingestion.chunker import chunk_documents
+
+logger = get_logger(__name__)
+
+# bump when extraction changes; cached text from another parser version is ignored
+PARSER_VERSION = f"1-pypdf{pypdf.__version__}"
+
+# file metadata kept out of embeddings and prompts, as SimpleDirectoryReader does
+_EXCLUDED_FILE_KEYS = ["file_name", "file_type", "file_size", "creation_date", "last_modified_date", "last_accessed_date"]
+
+
+def _extract(path: str, pages: tuple[int, int] | None) -> list[dict]:
+    """[{text, metadata}] per PDF page in `pages`, or per document the reader returns;
+    metadata holds only what the reader adds (page_label), not file metadata."""
+    if path.lower().endswith(".pdf"):
+        pdf = pypdf.PdfReader(path)
+        start, end = pages or (0, len(pdf.pages))
+        return [
+            {"text": pdf.pages[i].extract_text(), "metadata": {"page_label": pdf.page_labels[i]}}
+            for i in range(start, end)
+        ]
+    file_keys = set(default_file_metadata_func(path))
+    return [
+        {"text": doc.text, "metadata": {k: v for k, v in doc.metadata.items() if k not in file_keys}}
+        for doc in SimpleDirectoryReader(input_files=[path]).load_data()
+    ]
+
+
+def _documents(path: str, pages: list[dict]) -> list[Document]:
+    """Documents with the same metadata and exclusions SimpleDirectoryReader gives them."""
+    file_meta = default_file_metadata_func(path)
+    docs = []
+    for page in pages:
+        doc = Document(text=page["text"], metadata={**page["metadata"], **file_meta})
+        doc.excluded_embed_metadata_keys.extend(_EXCLUDED_FILE_KEYS)
+        doc.excluded_llm_metadata_keys.extend(_EXCLUDED_FILE_KEYS)
+        docs.append(doc)
+    return docs
+
+
+def _to_dict(node) -> dict:
+    return {
+        "id": node.node_id,
+        "text": node.text,
+        "metadata": node.metadata,
+        "excluded_embed_metadata_keys": node.excluded_embed_metadata_keys,
+        "excluded_llm_metadata_keys": node.excluded_llm_metadata_keys,
+    }
+
+
+def _from_dict(chunk: dict) -> TextNode:
+    return TextNode(
+        id_=chunk["id"],
+        text=chunk["text"],
+        metadata=chunk["metadata"],
+        excluded_embed_metadata_keys=chunk["excluded_embed_metadata_keys"],
+        excluded_llm_metadata_keys=chunk["excluded_llm_metadata_keys"],
+    )
+
+
+def _parse_and_chunk(path: str, pages: tuple[int, int] | None, extracted: list[dict] | None) -> tuple[list[dict], list[dict]]:
+    """Pool task: (extracted pages, chunks) of one file or PDF page range. Picklable in and out.
+    Unreadable files are skipped with a warning (pages None), as SimpleDirectoryReader does."""
+    if extracted is None:
+        try:
+            extracted = _extract(path, pages)
+        except Exception as e:
+            logger.warning(f"[loader] Skipping {path} {pages or ''}: {e}")
+            return None, []
+    return extracted, [_to_dict(n) for n in chunk_documents(_documents(path, extracted))]
+
+
+class ParseCache:
+    """On-disk JSON cache of extracted text, keyed by (file hash, parser version), and of
+    chunks, keyed by (file path, file hash, parser version, chunk settings)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        s = get_settings()
+        self._chunking = f"{s.CHUNK_SIZE}-{s.CHUNK_OVERLAP}"
+        for sub in ("text", "chunks"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def _text_path(self, file_hash: str) -> str:
+        return os.path.join(self.root, "text", f"{file_hash}-{PARSER_VERSION}.json")
+
+    def _chunks_path(self, path: str, file_hash: str) -> str:
+        # chunk metadata carries the file path, so the same bytes elsewhere are chunked anew
+        key = xxhash.xxh3_128_hexdigest(f"{path}\0{file_hash}\0{PARSER_VERSION}\0{self._chunking}".encode("utf-8"))
+        return os.path.join(self.root, "chunks", f"{key}.json")
+
+    @staticmethod
+    def _read(path: str):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(path: str, value) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def get_text(self, file_hash: str):
+        return self._read(self._text_path(file_hash))
+
+    def set_text(self, file_hash: str, pages: list[dict]) -> None:
+        self._write(self._text_path(file_hash), pages)
+
+    def get_chunks(self, path: str, file_hash: str):
+        return self._read(self._chunks_path(path, file_hash))
+
+    def set_chunks(self, path: str, file_hash: str, chunks: list[dict]) -> None:
+        self._write(self._chunks_path(path, file_hash), chunks)
+
+
+def _tasks(path: str, pages_per_task: int) -> list[tuple[int, int] | None]:
+    """Page ranges a PDF is split into across workers; None (whole file) for everything else."""
+    if not path.lower().endswith(".pdf"):
+        return [None]
+    try:
+        n_pages = len(pypdf.PdfReader(path).pages)
+    except Exception:
+        return [None]  # the worker reports and skips it
+    return [(start, min(start + pages_per_task, n_pages)) for start in range(0, n_pages, pages_per_task)] or [None]
+
+
+def iter_chunks(files: dict[str, str], workers: int | None = None):
+    """Yield (file_path, nodes) for `files` (file_path -> content hash), in file order, pages in
+    order within a file. Parsing and chunking run on a process pool, per file and per page
+    range for large PDFs, at most 2 tasks per worker ahead of the consumer (backpressure).
+    Cached text and chunks of unchanged files are reused; results are cached as each file
+    completes, so an interrupted run resumes without re-parsing what it already did."""
+    s = get_settings()
+    workers = workers or s.INGEST_WORKERS or os.cpu_count() or 1
+    cache = ParseCache(s.PARSE_CACHE_DIR) if s.PARSE_CACHE_DIR else None
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(files) > 1 else None
+    pending = deque()  # (path, cached chunks or None, futures / jobs)
+    counts = {"cached": 0, "rechunked": 0, "parsed": 0, "chunks": 0}
+
+    def finish(path, cached, tasks):
+        if cached is not None:
+            chunks = cached
+        else:
+            results = [t.result() if pool else _parse_and_chunk(*t) for t in tasks]
+            chunks = [c for _, part in results for c in part]
+            if cache and all(pages is not None for pages, _ in results):  # failed files aren't cached
+                if cache.get_text(files[path]) is None:
+                    cache.set_text(files[path], [page for pages, _ in results for page in pages])
+                cache.set_chunks(path, files[path], chunks)
+        counts["chunks"] += len(chunks)
+        return path, [_from_dict(c) for c in chunks]
+
+    try:
+        for path, file_hash in files.items():
+            cached = cache.get_chunks(path, file_hash) if cache else None
+            jobs = []
+            if cached is None:
+                text = cache.get_text(file_hash) if cache else None
+                ranges = [None] if text is not None else _tasks(path, s.PDF_PAGES_PER_TASK)
+                jobs = [(path, pages, text) for pages in ranges]
+            counts["cached" if cached is not None else "rechunked" if jobs[0][2] is not None else "parsed"] += 1
+            pending.append((path, cached, [pool.submit(_parse_and_chunk, *job) for job in jobs] if pool else jobs))
+            while pending and (not pending[0][2] or sum(len(t) for _, _, t in pending) > 2 * workers):
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+    except Exception as e:
+        raise DocumentLoadError(f"Failed parsing documents: {e}") from e
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    logger.info(
+        f"[loader] {len(files)} files ({counts['cached']} cached, {counts['rechunked']} re-chunked, "
+        f"{counts['parsed']} parsed) -> {counts['chunks']} chunks"
+    )
+
+
+def load_chunks(files: dict[str, str], workers: int | None = None) -> list[TextNode]:
+    """All nodes of iter_chunks(files), in order."""
+    return [node for _, nodes in iter_chunks(files, workers) for node in nodes]
@@ -0,0 +1,240 @@
+import os
+import queue
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from backend.core.logging import get_logger
+from backend.core.config import get_settings
+from backend.core.exceptions import IndexBuildError
+from backend.core.constants import BM25_FILE, EMBED_KEYS_FILE, NODES_FILE, VECTOR_INDEX_FILE
+from backend.core.vectorstores.faiss_vector_store import create_faiss_index, train_faiss_index, describe_faiss_index
+from backend.ingestion.embedding_cache import new_run_id, save_keys
+from backend.ingestion.indexer import NodeEmbedder, embedding_keys, bm25_tokens, node_chunk, ensure_storage_dir
+from backend.ingestion.parsing import iter_chunks
+from backend.retrieval.bm25_index import BM25Builder
+from backend.retrieval.node_store import NodeStoreWriter
+
+logger = get_logger(__name__)
+
+# IVF training sample per centroid: above faiss's 39-point minimum, and a quarter of the 256 its
+# k-means would subsample to, since centroids barely move past that. The buffer is bounded by
+# VECTOR_IVF_NLIST * 64 * dim * 4 bytes: 400 MB at the default 1024 cells and 1536 dimensions.
+_TRAIN_POINTS_PER_CENTROID = 64
+_ADD_ROWS = 65536  # spilled vectors added to a trained IVF index per call
+
+_DONE = object()
+
+
+class _Stage(threading.Thread):
+    """Consumer thread behind a bounded queue; put() blocks while it is `maxsize` items behind.
+
+    A failure is re-raised to the producer on its next put() or on wait(); the thread keeps
+    draining meanwhile so the producer never deadlocks on a full queue.
+    """
+
+    def __init__(self, name: str, fn, maxsize: int):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self._closed = False
+        self.start()
+
+    def run(self):
+        while (item := self.queue.get()) is not _DONE:
+            if self.error is None:
+                try:
+                    self.fn(item)
+                except BaseException as e:
+                    self.error = e
+
+    def put(self, item) -> None:
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self) -> None:
+        """No more items; the thread stops once the queued ones are done."""
+        if self.is_alive() and not self._closed:
+            self._closed = True
+            self.queue.put(_DONE)
+
+    def wait(self) -> None:
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+class _VectorIndexBuilder:
+    """Adds vector batches to a new FAISS index as they arrive.
+
+    IVF types can't add anything before training, and training on the first vectors would
+    fit the coarse quantizer to the first few documents of a directory-ordered corpus. So
+    they keep a uniform reservoir sample of the whole stream (train_size vectors, see
+    _TRAIN_POINTS_PER_CENTROID) and spill every vector to `spill_path`; finish() trains on
+    the sample and adds the spilled vectors in order. Memory stays the sample plus the index.
+    """
+
+    def __init__(self, dimension: int, spill_path: str, seed: int = 0):
+        s = get_settings()
+        self.dimension = dimension
+        self.index_type = s.VECTOR_INDEX_TYPE
+        self.train_size = s.VECTOR_IVF_NLIST * _TRAIN_POINTS_PER_CENTROID if self.index_type.startswith("ivf") else 0
+        self.index = None
+        self.seen = 0
+        self._sample = np.zeros((self.train_size, dimension), dtype="float32")
+        self._rng = np.random.default_rng(seed)
+        self._spill = open(spill_path, "w+b") if self.train_size else None
+
+    def add(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self._spill is None:
+            if self.index is None:
+                self._create(self._sample)
+            self.index.add(vectors)
+            return
+
+        self._spill.write(vectors.data)
+        # reservoir sampling (algorithm R): vector t replaces a random slot with probability k / (t + 1)
+        fill = max(0, min(len(vectors), self.train_size - self.seen))
+        self._sample[self.seen:self.seen + fill] = vectors[:fill]
+        t = self.seen + np.arange(fill, len(vectors))
+        slots = self._rng.integers(0, t + 1)
+        hit = np.flatnonzero(slots < self.train_size)
+        # the later of two vectors drawing the same slot wins
+        last = len(hit) - 1 - np.unique(slots[hit][::-1], return_index=True)[1]
+        self._sample[slots[hit[last]]] = vectors[fill + hit[last]]
+        self.seen += len(vectors)
+
+    def _create(self, sample: np.ndarray) -> None:
+        s = get_settings()
+        self.index = create_faiss_index(
+            self.dimension,
+            self.index_type,
+            n_train=len(sample),
+            nlist=s.VECTOR_IVF_NLIST,
+            pq_m=s.VECTOR_PQ_M,
+            pq_nbits=s.VECTOR_PQ_NBITS,
+            hnsw_m=s.VECTOR_HNSW_M,
+            ef_construction=s.VECTOR_HNSW_EF_CONSTRUCTION,
+        )
+        train_faiss_index(self.index, sample)
+        logger.info(f"[pipeline] FAISS index ready: {describe_faiss_index(self.index)}")
+
+    def finish(self):
+        if self._spill is None:
+            if self.index is None:
+                self._create(self._sample)
+            return self.index
+        try:
+            self._create(self._sample[:min(self.seen, self.train_size)])
+            self._sample = None
+            self._spill.flush()
+            if self.seen:
+                spilled = np.memmap(self._spill.name, dtype="float32", mode="r", shape=(self.seen, self.dimension))
+                for start in range(0, self.seen, _ADD_ROWS):
+                    self.index.add(np.ascontiguousarray(spilled[start:start + _ADD_ROWS]))
+                del spilled
+        finally:
+            self.abort()
+        return self.index
+
+    def abort(self) -> None:
+        """Remove the spill file."""
+        if self._spill is not None:
+            self._spill.close()
+            if os.path.exists(self._spill.name):
+                os.remove(self._spill.name)
+
+
+def _batches(files: dict[str, str], batch_size: int):
+    """Nodes of iter_chunks regrouped into lists of batch_size."""
+    batch = []
+    for _, nodes in iter_chunks(files):
+        batch.extend(nodes)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+def run_pipeline(files: dict[str, str], embed_model, storage_dir: str, cache_run: int | None = None):
+    """Full build streamed in batches: parse/chunk -> embed -> (FAISS || BM25 + node store).
+
+    Parsing runs ahead on the process pool (bounded, see iter_chunks); each batch of chunks
+    is embedded, then handed to two index threads through bounded queues, so the vector and
+    BM25 / node-store builds run in parallel with each other and with the next batch's
+    embedding, and a slow stage holds the others back instead of piling batches up in memory.
+    Memory is the index under construction plus a few batches; chunk texts (and, for IVF
+    indexes, vectors until training) are spilled to disk. Parsed files and embedded batches land in their caches as they complete, which is
+    the checkpoint: rerunning an interrupted ingest skips straight past the finished work.
+    """
+    return index_batches(_batches(files, get_settings().INGEST_BATCH_SIZE), embed_model, storage_dir, cache_run)
+
+
+def index_batches(batches, embed_model, storage_dir: str, cache_run: int | None = None):
+    """The embed -> (FAISS || BM25 + node store) half of run_pipeline, for any iterable of node
+    lists (parsed documents, or synthetic chunks in benchmarks); returns the FAISS index.
+    All batches share one NodeEmbedder, stamping the cache with one run (default: a new one)."""
+    s = get_settings()
+    ensure_storage_dir(storage_dir)
+    start = time.perf_counter()
+    cache_run = cache_run or new_run_id()
+
+    vectors = _VectorIndexBuilder(embed_model.dimension, os.path.join(storage_dir, f"{VECTOR_INDEX_FILE}.spill.tmp"))
+    bm25 = BM25Builder()
+    nodes_path = os.path.join(storage_dir, NODES_FILE)
+    node_writer = NodeStoreWriter(f"{nodes_path}.building")
+    cache_keys = []
+
+    def index_text(nodes):
+        bm25.add([bm25_tokens(n) for n in nodes])
+        node_writer.add([node_chunk(n) for n in nodes])
+        cache_keys.append(embedding_keys(nodes, embed_model))
+
+    vector_stage = _Stage("index-vectors", vectors.add, s.INGEST_QUEUE_SIZE)
+    text_stage = _Stage("index-text", index_text, s.INGEST_QUEUE_SIZE)
+    stages = (vector_stage, text_stage)
+    n_chunks = 0
+    try:
+        try:
+            with NodeEmbedder(embed_model, cache_run) as embedder:
+                for batch in batches:
+                    text_stage.put(batch)
+                    vector_stage.put(embedder.embed(batch))
+                    n_chunks += len(batch)
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"[pipeline] {n_chunks} chunks embedded | {n_chunks / max(elapsed, 1e-9):.0f} chunks/s")
+        finally:
+            for stage in stages:
+                stage.close()
+        for stage in stages:
+            stage.wait()
+
+        index = vectors.finish()
+        bm25_index = bm25.build()
+        node_writer.close()
+        if not index.ntotal == node_writer.rows == bm25_index.corpus_size:
+            raise IndexBuildError(
+                f"stores disagree: {index.ntotal} vectors, {node_writer.rows} nodes, {bm25_index.corpus_size} BM25 docs"
+            )
+
+        tmp = os.path.join(storage_dir, f"{VECTOR_INDEX_FILE}.tmp")
+        faiss.write_index(index, tmp)
+        os.replace(tmp, os.path.join(storage_dir, VECTOR_INDEX_FILE))
+        bm25_index.save(os.path.join(storage_dir, BM25_FILE))
+        os.replace(f"{nodes_path}.building", nodes_path)
+        save_keys(os.path.join(storage_dir, EMBED_KEYS_FILE), np.concatenate(cache_keys) if cache_keys else np.zeros((0, 16)))
+        logger.info(f"[pipeline] {n_chunks} chunks indexed in {time.perf_counter() - start:.1f}s, persisted to: {storage_dir}")
+        return index
+
+    except Exception as e:
+        node_writer.abort()
+        vectors.abort()
+        if isinstance(e, IndexBuildError):
+            raise
+        raise IndexBuildError(f"Streaming index build failed: {e}") from e
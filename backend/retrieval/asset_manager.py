@@ -0,0 +1,146 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from backend.core.config import get_settings
+from backend.core.constants import MANIFEST_FILE
+from backend.core.exceptions import ConfigError
+from backend.core.logging import get_logger
+from backend.core.storage import current_build_dir, pointer_path
+from backend.retrieval.assets import RetrievalAssets, load_retrieval_assets, load_manifest, manifest_build_id
+
+logger = get_logger(__name__)
+
+
+def check_assets(assets: RetrievalAssets) -> None:
+    """Touch every store once, so a truncated or corrupt build fails here instead of on live
+    traffic: one vector search, the first and last node, and BM25 scores for a term of the first."""
+    try:
+        if assets.index.ntotal:
+            assets.index.search(np.zeros((1, assets.index.d), dtype="float32"), 1)
+        if len(assets.nodes):
+            assets.nodes.get(len(assets.nodes) - 1)
+            assets.bm25.get_scores(assets.nodes.get(0)["text"].split()[:1])
+    except Exception as e:
+        raise ConfigError(f"Build {assets.build_id} failed its load check: {e}") from e
+
+
+class _Entry:
+    def __init__(self, assets: RetrievalAssets):
+        self.assets = assets
+        self.refs = 0
+        self.retired = False
+
+
+class AssetManager:
+    """Holds the live RetrievalAssets and swaps a newly published build in without a restart.
+
+    Requests take the assets through acquire(), which counts them in and out. reload() loads
+    and checks the build STORAGE_DIR/CURRENT points at while the old one keeps serving, then
+    swaps it in under a lock, so every request sees exactly one build from start to end. The
+    old build is released when its last request finishes. `on_swap` callbacks get the new
+    assets right after each swap (and the first load), to drop caches of the old build.
+    """
+
+    def __init__(self, loader=load_retrieval_assets, on_swap=()):
+        self.loader = loader
+        self.on_swap = list(on_swap)
+        self._current: _Entry | None = None
+        self._lock = threading.Lock()         # _current and refcounts
+        self._reload_lock = threading.Lock()  # one load at a time
+        self._stop = threading.Event()
+        self._watcher = None
+
+    @property
+    def build_id(self) -> str | None:
+        entry = self._current
+        return entry.assets.build_id if entry else None
+
+    @contextmanager
+    def acquire(self):
+        """The live assets, pinned until the block exits even if a reload swaps them out."""
+        if self._current is None:
+            self.reload()
+        with self._lock:
+            entry = self._current
+            entry.refs += 1
+        try:
+            yield entry.assets
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                drained = entry.retired and entry.refs == 0
+            if drained:
+                self._release(entry)
+
+    def reload(self) -> dict:
+        """Load the published build and swap it in; {"status": "reloaded" | "unchanged", "build_id"}.
+        Raises (and keeps serving the current build) if the new one can't be loaded or checked."""
+        with self._reload_lock:
+            build_dir = current_build_dir(get_settings().STORAGE_DIR)
+            if self._current is not None:
+                build_id = manifest_build_id(load_manifest(build_dir))
+                if build_id == self.build_id:
+                    return {"status": "unchanged", "build_id": build_id}
+
+            assets = self.loader(build_dir)
+            check_assets(assets)
+
+            with self._lock:
+                old, self._current = self._current, _Entry(assets)
+                if old is not None:
+                    old.retired = True
+                    drained = old.refs == 0
+            logger.info(f"[assets] Serving build {assets.build_id} from {build_dir}")
+            for callback in self.on_swap:
+                callback(assets)
+            if old is not None and drained:
+                self._release(old)
+            return {"status": "reloaded", "build_id": assets.build_id}
+
+    @staticmethod
+    def _release(entry: _Entry) -> None:
+        # the last reference to the mapped files goes with it; a pruned build's data is freed then
+        logger.info(f"[assets] Released build {entry.assets.build_id}")
+        entry.assets = None
+
+    def start_watching(self, interval_s: float) -> None:
+        """Reload in a background thread whenever a new build is published."""
+        if self._watcher is not None or interval_s <= 0:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval_s,), name="asset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval_s: float) -> None:
+        storage_dir = get_settings().STORAGE_DIR
+        last = _published_mtime(storage_dir)
+        while not self._stop.wait(interval_s):
+            mtime = _published_mtime(storage_dir)
+            if mtime == last:
+                continue
+            last = mtime
+            try:
+                result = self.reload()
+                if result["status"] == "reloaded":
+                    logger.info(f"[assets] Picked up published build {result['build_id']}")
+            except Exception as e:
+                logger.error(f"[assets] Reload failed, still serving {self.build_id}: {e}")
+
+
+def _published_mtime(storage_dir: str) -> int | None:
+    # CURRENT is replaced on every publish; an unversioned STORAGE_DIR has only its manifest
+    for path in (pointer_path(storage_dir), os.path.join(storage_dir, MANIFEST_FILE)):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+    return None
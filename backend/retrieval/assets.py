@@ -1,33 +1,53 @@
 import os
 import json
-import pickle
-from dataclasses import dataclass
-
-from llama_index.core import StorageContext, load_index_from_storage
-from llama_index.vector_stores.faiss import FaissVectorStore
+import hashlib
+from dataclasses import dataclass, field
 
 from backend.core.config import get_settings
-from backend.core.embeddings.factory import get_llama_embed_model
-from backend.core.constants import MANIFEST_FILE, BM25_FILE, NODES_FILE
+from backend.core.embeddings.factory import get_query_embedder, get_embed_model_id
+from backend.core.constants import MANIFEST_FILE, BM25_FILE, NODES_FILE, VECTOR_INDEX_FILE
 from backend.core.logging import get_logger
+from backend.core.storage import current_build_dir
 from backend.core.exceptions import ConfigError
+from backend.core.vectorstores.faiss_vector_store import id_selector, set_search_params, read_faiss_index
+from backend.retrieval.bm25_index import BM25Index
+from backend.retrieval.node_store import NodeStore
 
 logger = get_logger(__name__)
 
 @dataclass
 class RetrievalAssets:
-    index: object                # llamaindex VectorStoreIndex loaded from storage
-    bm25: object                 # BM25Okapi
-    nodes_list: list[dict]       # list of {id,text,metadata}
-    nodes_by_id: dict[str, dict] # id -> node dict
+    index: object                # faiss.Index; FAISS id == node row
+    bm25: BM25Index              # CSR postings, memory-mapped from bm25.bin; doc i == node row
+    nodes: NodeStore             # chunk text + metadata by integer row, memory-mapped from nodes.bin
     manifest: dict
+    build_id: str                # manifest build_id; part of every cache key
+    embedder: object             # query embedder (process-level LRU), see get_query_embedder
+    filter_selectors: dict = field(default_factory=dict)  # doc_type -> FAISS IDSelectorBitmap of its rows
+
+def build_filter_selectors(nodes: NodeStore, ntotal: int) -> dict:
+    """One FAISS IDSelectorBitmap per doc_type (ntotal / 8 bytes each), built once per build
+    so a filtered vector search doesn't fill an ntotal-bit bitmap per query."""
+    if "doc_type" not in nodes.columns:
+        return {}
+    return {value: id_selector(nodes.rows({"doc_type": value}), ntotal) for value in nodes.columns["doc_type"][1]}
+
+def filter_selector(assets, filters: dict | None):
+    """The precomputed selector for a doc_type-only filter, else None (built per search)."""
+    if filters and list(filters) == ["doc_type"]:
+        return assets.filter_selectors.get(filters["doc_type"])
+    return None
 
 def load_manifest(storage_dir: str) -> dict:
     path = os.path.join(storage_dir, MANIFEST_FILE)
     with open(path, "r") as f:
         return json.load(f)
 
-def validate_manifest(manifest: dict) -> None:
+def manifest_build_id(manifest: dict) -> str:
+    # manifests written before build_id existed: derive a stable id from their contents
+    return manifest.get("build_id") or hashlib.sha1(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:32]
+
+def validate_manifest(manifest: dict, dimension: int | None = None) -> None:
     """Fail fast if runtime config doesn't match index build config."""
     s = get_settings()
 
@@ -36,9 +56,23 @@ def validate_manifest(manifest: dict) -> None:
             f"Manifest mismatch: EMBED_PROVIDER={s.EMBED_PROVIDER} but index built with {manifest.get('embedding_provider')}"
         )
 
-    if manifest.get("embedding_model") != s.EMBED_MODEL:
+    model = get_embed_model_id()
+    if manifest.get("embedding_model") != model:
+        raise ConfigError(
+            f"Manifest mismatch: embedding model {model} but index built with {manifest.get('embedding_model')}. Rebuild index."
+        )
+
+    built_dim = manifest.get("embedding_dimension")
+    if dimension is not None and built_dim is not None and int(built_dim) != int(dimension):
+        raise ConfigError(
+            f"Manifest mismatch: embedding dimension {dimension} but index built with {built_dim}. Rebuild index."
+        )
+
+    # manifests written before VECTOR_INDEX_TYPE existed are always flat
+    index_type = (manifest.get("vector_index") or {}).get("type", "flat")
+    if index_type != s.VECTOR_INDEX_TYPE:
         raise ConfigError(
-            f"Manifest mismatch: EMBED_MODEL={s.EMBED_MODEL} but index built with {manifest.get('embedding_model')}. Rebuild index."
+            f"Manifest mismatch: VECTOR_INDEX_TYPE={s.VECTOR_INDEX_TYPE} but index built as {index_type}. Rebuild index."
         )
 
     if int(manifest.get("chunk_size", -1)) != int(s.CHUNK_SIZE):
@@ -47,45 +81,54 @@ def validate_manifest(manifest: dict) -> None:
         )
 
 def load_vector_index(storage_dir: str):
-    logger.info("[retrieval.assets] Loading vector index from storage via LlamaIndex")
+    s = get_settings()
+    logger.info(f"[retrieval.assets] Loading FAISS index (mmap={s.VECTOR_INDEX_MMAP})")
 
-    # FAISS vector store persisted by LlamaIndex
-    vector_store = FaissVectorStore.from_persist_dir(storage_dir)
-    storage_context = StorageContext.from_defaults(
-        vector_store=vector_store,
-        persist_dir=storage_dir
+    # raw FAISS index written by the indexer; ids are node rows
+    faiss_index = read_faiss_index(
+        os.path.join(storage_dir, VECTOR_INDEX_FILE), index_type=s.VECTOR_INDEX_TYPE, mmap=s.VECTOR_INDEX_MMAP
     )
-    embed_model = get_llama_embed_model()
-    return load_index_from_storage(storage_context, embed_model=embed_model)
+    set_search_params(faiss_index, nprobe=s.VECTOR_NPROBE, ef_search=s.VECTOR_EF_SEARCH)
+    return faiss_index
 
-def load_retrieval_assets() -> RetrievalAssets:
-    s = get_settings()
-    storage_dir = s.STORAGE_DIR
+def load_retrieval_assets(storage_dir: str | None = None) -> RetrievalAssets:
+    """Load and cross-check one build; by default the live one (STORAGE_DIR/CURRENT)."""
+    storage_dir = storage_dir or current_build_dir(get_settings().STORAGE_DIR)
 
     logger.info(f"[retrieval.assets] Loading assets from: {storage_dir}")
 
     manifest = load_manifest(storage_dir)
-    validate_manifest(manifest)
+    embedder = get_query_embedder()
+    validate_manifest(manifest, dimension=embedder.dimension)
 
-    # nodes.json
-    with open(os.path.join(storage_dir, NODES_FILE), "r") as f:
-        nodes_list = json.load(f)
-    nodes_by_id = {n["id"]: n for n in nodes_list}
+    # nodes.bin (memory-mapped)
+    nodes_path = os.path.join(storage_dir, NODES_FILE)
+    if not os.path.exists(nodes_path):
+        raise ConfigError(f"{nodes_path} not found (indexes built before the binary node store need a rebuild). Rebuild index.")
+    nodes = NodeStore.load(nodes_path)
 
-    # bm25.pkl
-    with open(os.path.join(storage_dir, BM25_FILE), "rb") as f:
-        bm25 = pickle.load(f)
+    # bm25.bin (memory-mapped)
+    bm25_path = os.path.join(storage_dir, BM25_FILE)
+    if not os.path.exists(bm25_path) and os.path.exists(os.path.join(storage_dir, "bm25.pkl")):
+        raise ConfigError("Found legacy bm25.pkl but no bm25.bin; pickled indexes are no longer loaded. Rebuild index.")
+    bm25 = BM25Index.load(bm25_path)
 
     # vector index
     index = load_vector_index(storage_dir)
 
-    logger.info(
-        f"[retrieval.assets] Loaded nodes={len(nodes_list)} | bm25_corpus={getattr(bm25,'corpus_size','?')}"
-    )
+    # all three stores are addressed by the same integer row
+    if not (index.ntotal == len(nodes) == bm25.corpus_size):
+        raise ConfigError(
+            f"Index stores disagree: faiss={index.ntotal} nodes={len(nodes)} bm25={bm25.corpus_size}. Rebuild index."
+        )
+
+    logger.info(f"[retrieval.assets] Loaded nodes={len(nodes)} | bm25_corpus={bm25.corpus_size}")
     return RetrievalAssets(
         index=index,
         bm25=bm25,
-        nodes_list=nodes_list,
-        nodes_by_id=nodes_by_id,
-        manifest=manifest
-    )
\ No newline at end of file
+        nodes=nodes,
+        manifest=manifest,
+        build_id=manifest_build_id(manifest),
+        embedder=embedder,
+        filter_selectors=build_filter_selectors(nodes, index.ntotal),
+    )
@@ -0,0 +1,246 @@
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from backend.core.array_file import write_array_file, read_array_file
+
+BM25_MAGIC = b"LMBM25"
+BM25_FORMAT_VERSION = 1
+
+
+def _count_postings(tokenized_corpus: list[list[str]], vocab: dict[str, int], first_doc: int = 0):
+    """(term ids, doc ids, tfs) of each document's distinct terms, in document order; new terms are added to vocab."""
+    term_ids, doc_ids, tfs = [], [], []
+    for d, tokens in enumerate(tokenized_corpus, start=first_doc):
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(d)
+            tfs.append(tf)
+    return np.asarray(term_ids, dtype="int64"), np.asarray(doc_ids, dtype="int32"), np.asarray(tfs, dtype="int32")
+
+
+class SortedVocab:
+    """Read-only term -> id lookup over a sorted UTF-8 blob; binary search instead of a dict,
+    so loading a large vocabulary costs nothing until terms are looked up."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob        # uint8[total bytes], terms concatenated in sorted order
+        self.offsets = offsets  # int64[n_terms + 1]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def term(self, i: int) -> bytes:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def get(self, term: str, default=None):
+        key = term.encode("utf-8")
+        i = bisect_left(range(len(self)), key, key=self.term)
+        return i if i < len(self) and self.term(i) == key else default
+
+
+class BM25Index:
+    """BM25Okapi scoring over a precomputed CSR term -> document postings matrix.
+
+    Scores are identical to rank_bm25.BM25Okapi (same idf floor, k1, b), but a query only
+    touches the postings of its own terms instead of looping over every document in Python.
+    """
+
+    def __init__(self, vocab: dict[str, int], idf: np.ndarray, doc_len: np.ndarray,
+                 indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.vocab = vocab          # term -> term id (dict, or SortedVocab when loaded from disk)
+        self.idf = idf              # float64[n_terms]
+        self.doc_len = doc_len      # int32[n_docs]
+        self.indptr = indptr        # int64[n_terms + 1], postings of term t are [indptr[t], indptr[t+1])
+        self.doc_ids = doc_ids      # int32[n_postings]
+        self.tfs = tfs              # int32[n_postings] (uint16/uint32 on disk)
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        n_docs = len(doc_len)
+        self.avgdl = float(doc_len.sum()) / n_docs if n_docs else 0.0
+        # per-document length normalisation, k1 * (1 - b + b * dl / avgdl)
+        self._norm = k1 * (1 - b + b * doc_len / self.avgdl) if n_docs else np.zeros(0)
+
+    @property
+    def corpus_size(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def from_corpus(cls, tokenized_corpus: list[list[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        builder = BM25Builder(k1=k1, b=b, epsilon=epsilon)
+        builder.add(tokenized_corpus)
+        return builder.build()
+
+    @classmethod
+    def _from_postings(cls, vocab: dict[str, int], doc_len: np.ndarray, term_ids: np.ndarray,
+                       doc_ids: np.ndarray, tfs: np.ndarray, k1: float, b: float, epsilon: float):
+        """Index from (term, doc, tf) postings listed in document order."""
+        # group postings by term; stable so each list stays in document order
+        order = np.argsort(term_ids, kind="stable")
+        df = np.bincount(term_ids, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype="int64")
+        np.cumsum(df, out=indptr[1:])
+
+        idf = cls._okapi_idf(df, len(doc_len), epsilon)
+        return cls(
+            vocab=vocab,
+            idf=idf,
+            doc_len=doc_len,
+            indptr=indptr,
+            doc_ids=doc_ids[order],
+            tfs=tfs[order],
+            k1=k1, b=b, epsilon=epsilon,
+        )
+
+    def update(self, keep: np.ndarray, added: list[list[str]]) -> "BM25Index":
+        """Index over the kept documents (renumbered in order) followed by `added`.
+
+        Works on the existing postings, so only the added documents are tokenised and
+        counted; df, idf and avgdl are recomputed and scores match from_corpus over the
+        same documents.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        n_terms = len(self.indptr) - 1
+        if isinstance(self.vocab, SortedVocab):
+            terms = [self.vocab.term(i).decode("utf-8") for i in range(n_terms)]
+        else:
+            terms = sorted(self.vocab, key=self.vocab.__getitem__)
+        vocab = {t: i for i, t in enumerate(terms)}
+
+        live = keep[self.doc_ids]
+        new_doc = (np.cumsum(keep) - 1).astype("int32")
+        add_terms, add_docs, add_tfs = _count_postings(added, vocab, first_doc=int(keep.sum()))
+        term_ids = np.concatenate([np.repeat(np.arange(n_terms), np.diff(self.indptr))[live], add_terms])
+        doc_ids = np.concatenate([new_doc[self.doc_ids[live]], add_docs])
+        tfs = np.concatenate([np.asarray(self.tfs[live], dtype="int32"), add_tfs])
+
+        # drop terms that only occurred in removed documents
+        used = np.bincount(term_ids, minlength=len(vocab)) > 0
+        remap = np.cumsum(used) - 1
+        vocab = {t: int(remap[i]) for t, i in vocab.items() if used[i]}
+        doc_len = np.concatenate([self.doc_len[keep], [len(tokens) for tokens in added]]).astype("int32")
+        return self._from_postings(
+            vocab, doc_len, remap[term_ids], doc_ids, tfs, k1=self.k1, b=self.b, epsilon=self.epsilon
+        )
+
+    @staticmethod
+    def _okapi_idf(df: np.ndarray, n_docs: int, epsilon: float) -> np.ndarray:
+        """log((N - n + 0.5) / (n + 0.5)), negative values floored at epsilon * mean idf, as BM25Okapi."""
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            # sequential sum in vocabulary order, so the floor is bit-identical to BM25Okapi's
+            idf[idf < 0] = epsilon * (sum(idf.tolist()) / len(idf))
+        return idf
+
+    def save(self, path: str) -> None:
+        """Write the versioned binary format (terms sorted, postings as CSR arrays)."""
+        terms = sorted(self.vocab, key=lambda t: t.encode("utf-8"))
+        order = np.array([self.vocab[t] for t in terms], dtype="int64")
+        encoded = [t.encode("utf-8") for t in terms]
+        offsets = np.zeros(len(encoded) + 1, dtype="int64")
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+
+        # re-lay the postings in sorted-term order
+        starts, ends = self.indptr[order], self.indptr[order + 1]
+        indptr = np.zeros(len(order) + 1, dtype="int64")
+        np.cumsum(ends - starts, out=indptr[1:])
+        take = np.repeat(starts - indptr[:-1], ends - starts) + np.arange(indptr[-1])
+        tf_dtype = "uint16" if self.tfs.max(initial=0) < 2 ** 16 else "uint32"
+
+        write_array_file(
+            path, BM25_MAGIC, BM25_FORMAT_VERSION,
+            meta={"k1": self.k1, "b": self.b, "epsilon": self.epsilon, "n_docs": self.corpus_size},
+            arrays={
+                "vocab_blob": np.frombuffer(b"".join(encoded), dtype="uint8"),
+                "vocab_offsets": offsets,
+                "idf": np.asarray(self.idf, dtype="float64")[order],
+                "doc_len": np.asarray(self.doc_len, dtype="int32"),
+                "indptr": indptr,
+                "doc_ids": np.asarray(self.doc_ids, dtype="int32")[take],
+                "tfs": np.asarray(self.tfs)[take].astype(tf_dtype),
+            },
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Memory-map an index written by save(); postings stay on disk until a query reads them."""
+        _, meta, a = read_array_file(path, BM25_MAGIC, versions=(BM25_FORMAT_VERSION,))
+        return cls(
+            vocab=SortedVocab(a["vocab_blob"], a["vocab_offsets"]),
+            idf=a["idf"],
+            doc_len=a["doc_len"],
+            indptr=a["indptr"],
+            doc_ids=a["doc_ids"],
+            tfs=a["tfs"],
+            k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"],
+        )
+
+    def get_scores(self, query_tokens: list[str]) -> np.ndarray:
+        scores = np.zeros(self.corpus_size)
+        for term in query_tokens:  # repeated query terms count again, as in BM25Okapi
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype("float64")
+            # doc ids are unique within a posting list, so fancy-index += is safe
+            scores[docs] += self.idf[t] * (tf * (self.k1 + 1) / (tf + self._norm[docs]))
+        return scores
+
+    def get_scores_batch(self, queries: list[list[str]]) -> np.ndarray:
+        """(len(queries), corpus_size) scores, equal to get_scores per query: the postings of
+        all query terms are gathered and scored at once and summed with a single bincount."""
+        pairs = [(q, t) for q, tokens in enumerate(queries) for t in map(self.vocab.get, tokens) if t is not None]
+        n_docs = self.corpus_size
+        if not pairs:
+            return np.zeros((len(queries), n_docs))
+        query_of, term_ids = (np.asarray(col, dtype="int64") for col in zip(*pairs))
+        starts, lengths = self.indptr[term_ids], self.indptr[term_ids + 1] - self.indptr[term_ids]
+
+        # flat positions of every posting of every (query, term) pair, pairs in order
+        offsets = np.zeros(len(lengths) + 1, dtype="int64")
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        docs = self.doc_ids[positions].astype("int64")
+        tf = self.tfs[positions].astype("float64")
+        contrib = np.repeat(self.idf[term_ids], lengths) * (tf * (self.k1 + 1) / (tf + self._norm[docs]))
+
+        cells = np.repeat(query_of, lengths) * n_docs + docs
+        return np.bincount(cells, weights=contrib, minlength=len(queries) * n_docs).reshape(len(queries), n_docs)
+
+
+class BM25Builder:
+    """Builds a BM25Index from documents added in batches.
+
+    Postings are kept as numpy arrays per batch (10 bytes each instead of three Python ints)
+    and grouped into CSR once in build(); the result equals from_corpus over all documents.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: dict[str, int] = {}
+        self.n_docs = 0
+        self._parts = []  # (int32 term ids, int32 doc ids, uint16 / int32 tfs, int32 doc lengths)
+
+    def add(self, tokenized: list[list[str]]) -> None:
+        term_ids, doc_ids, tfs = _count_postings(tokenized, self.vocab, first_doc=self.n_docs)
+        tfs = tfs.astype("uint16") if tfs.max(initial=0) < 2 ** 16 else tfs
+        doc_len = np.fromiter(map(len, tokenized), dtype="int32", count=len(tokenized))
+        self._parts.append((term_ids.astype("int32"), doc_ids, tfs, doc_len))
+        self.n_docs += len(tokenized)
+
+    def build(self) -> BM25Index:
+        parts = list(zip(*self._parts)) or [[np.zeros(0, dtype="int32")]] * 4
+        term_ids, doc_ids, tfs, doc_len = (np.concatenate(p) for p in parts)
+        self._parts = []
+        return BM25Index._from_postings(
+            self.vocab, doc_len, term_ids.astype("int64"), doc_ids, tfs.astype("int32"),
+            k1=self.k1, b=self.b, epsilon=self.epsilon,
+        )
@@ -1,15 +1,56 @@
+import numpy as np
+
 from backend.core.logging import get_logger
 
 logger = get_logger(__name__)
 
-def bm25_search(bm25, nodes_list: list[dict], query: str, top_k: int = 20):
-    logger.info(f"[bm25_search] top_k={top_k}")
+# score matrix cells (float64) held at once by bm25_search_batch, ~64 MB
+_MAX_SCORE_CELLS = 1 << 23
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, ties broken by lower index.
+
+    Same order as a stable sort of the whole array, but O(n) via argpartition.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype="int64")
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    at_kth = np.flatnonzero(scores == kth)[: k - len(above)]
+    top = np.concatenate([above, at_kth])
+    return top[np.lexsort((top, -scores[top]))]
 
-    tokenized_query = query.split()
-    scores = bm25.get_scores(tokenized_query)
+def bm25_search(bm25, query: str | list[str], top_k: int = 20, rows: np.ndarray | None = None):
+    """Ranked (row, score) pairs; BM25 document i is node store row i.
 
-    top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-    results = [nodes_list[i] for i in top_indices]
+    query is the question text or its already-split tokens (QueryContext.tokens).
+    rows (sorted) restricts the ranking to those documents, e.g. the rows of one doc_type.
+    """
+    logger.info(f"[bm25_search] top_k={top_k} filtered={rows is not None}")
+
+    tokenized_query = query.split() if isinstance(query, str) else query
+    scores = np.asarray(bm25.get_scores(tokenized_query))
+    results = _top_rows(scores, top_k, rows)
 
     logger.info(f"[bm25_search] got={len(results)}")
-    return results
\ No newline at end of file
+    return results
+
+def _top_rows(scores: np.ndarray, top_k: int, rows: np.ndarray | None):
+    if rows is None:
+        top_indices = top_k_indices(scores, top_k)
+    else:
+        # rows are ascending, so ties still break by lower row
+        top_indices = rows[top_k_indices(scores[rows], top_k)]
+    return [(int(i), float(scores[i])) for i in top_indices]
+
+def bm25_search_batch(bm25, queries: list[list[str]], top_k: int = 20, rows: np.ndarray | None = None):
+    """bm25_search for many tokenized queries; scored in blocks of queries by get_scores_batch."""
+    logger.info(f"[bm25_search] queries={len(queries)} top_k={top_k} filtered={rows is not None}")
+    block = max(1, _MAX_SCORE_CELLS // max(bm25.corpus_size, 1))
+    results = []
+    for start in range(0, len(queries), block):
+        scores = bm25.get_scores_batch(queries[start:start + block])
+        results.extend(_top_rows(row, top_k, rows) for row in scores)
+    return results
@@ -3,16 +3,13 @@ from backend.core.logging import get_logger
 logger = get_logger(__name__)
 
 def reciprocal_rank_fusion(vector_results, bm25_results, k: int = 60):
-    scores: dict[str, float] = {}
+    """Fuse two ranked lists of (row, score) pairs; returns node rows, best first."""
+    scores: dict[int, float] = {}
 
-    for rank, r in enumerate(vector_results):
-        doc_id = r.node.node_id
-        scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    for results in (vector_results, bm25_results):
+        for rank, (row, _score) in enumerate(results):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank + 1)
 
-    for rank, r in enumerate(bm25_results):
-        doc_id = r.get("id", str(rank))
-        scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
-
-    merged_ids = sorted(scores, key=scores.get, reverse=True)
-    logger.info(f"[fusion] merged={len(merged_ids)}")
-    return merged_ids
\ No newline at end of file
+    merged_rows = sorted(scores, key=scores.get, reverse=True)
+    logger.info(f"[fusion] merged={len(merged_rows)}")
+    return merged_rows
\ No newline at end of file
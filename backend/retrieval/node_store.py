@@ -0,0 +1,301 @@
+import json
+import os
+
+import numpy as np
+
+from backend.core.array_file import write_array_file, read_array_file
+
+NODES_MAGIC = b"LMNODES"
+NODES_FORMAT_VERSION = 1
+
+# metadata keys that are per-chunk copies of the node id; rebuilt on read instead of stored
+_DERIVED_KEYS = ("chunk_id",)
+
+_ABSENT = object()
+
+
+def _value_key(value) -> str:
+    return json.dumps(value, sort_keys=True)
+
+
+def _blob(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype="uint8"), offsets
+
+
+def _take(blob, offsets, keep: np.ndarray, added: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Buffer and offsets of the kept rows' strings, in order, followed by `added`."""
+    # copy runs of consecutive kept rows as one slice each
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], keep.astype("int8"), [0]])))
+    starts, ends = edges[::2], edges[1::2]
+    added_blob, added_offsets = _blob(added)
+    lengths = np.diff(offsets)[keep]
+    new_offsets = np.zeros(len(lengths) + len(added) + 1, dtype="int64")
+    np.cumsum(lengths, out=new_offsets[1:len(lengths) + 1])
+    new_offsets[len(lengths) + 1:] = new_offsets[len(lengths)] + added_offsets[1:]
+    parts = [np.asarray(blob[offsets[s]:offsets[e]]) for s, e in zip(starts, ends)]
+    return np.concatenate(parts + [added_blob]).astype("uint8", copy=False), new_offsets
+
+
+def _save(path: str, id_blob, id_offsets, text_blob, text_offsets, columns: dict, derived_keys: list[str]) -> None:
+    arrays = {
+        "id_blob": id_blob,
+        "id_offsets": id_offsets,
+        "text_blob": text_blob,
+        "text_offsets": text_offsets,
+    }
+    meta = {"columns": {}, "derived_keys": list(derived_keys)}
+    for i, (key, (codes, values)) in enumerate(columns.items()):
+        arrays[f"col{i}"] = codes
+        meta["columns"][key] = {"array": f"col{i}", "values": values}
+    write_array_file(path, NODES_MAGIC, NODES_FORMAT_VERSION, meta, arrays)
+
+
+class NodeStore:
+    """Chunks addressed by integer row id; row i is FAISS id i and BM25 document i.
+
+    Texts and node ids live in contiguous UTF-8 buffers with offsets (memory-mapped when
+    loaded from nodes.bin). Metadata is stored per key as an int32 code column into a small
+    list of distinct values, so file_name / doc_type cost 4 bytes per chunk. Chunk dicts are
+    only built for the rows a request actually returns.
+    """
+
+    def __init__(self, id_blob, id_offsets, text_blob, text_offsets,
+                 columns: dict[str, tuple[np.ndarray, list]], derived_keys: list[str] = ()):
+        self.id_blob = id_blob
+        self.id_offsets = id_offsets
+        self.text_blob = text_blob
+        self.text_offsets = text_offsets
+        self.columns = columns  # key -> (int32 codes per row, -1 = key absent; distinct values)
+        self.derived_keys = list(derived_keys)
+
+        # metadata -> rows index for filtering: per key, rows grouped by value code (CSR, rows
+        # ascending within a value), plus a lookup from a value's JSON form to its code
+        self._filter_index = {}
+        for key, (codes, values) in columns.items():
+            codes = np.asarray(codes)
+            order = np.argsort(codes, kind="stable").astype("int64")
+            indptr = np.zeros(len(values) + 2, dtype="int64")
+            np.cumsum(np.bincount(codes + 1, minlength=len(values) + 1), out=indptr[1:])
+            lookup = {_value_key(v): code for code, v in enumerate(values)}
+            self._filter_index[key] = (order, indptr, lookup)
+
+    def __len__(self) -> int:
+        return len(self.text_offsets) - 1
+
+    @classmethod
+    def from_chunks(cls, chunks: list[dict]) -> "NodeStore":
+        """Build from {id, text, metadata} dicts, in row order."""
+        derived = [
+            k for k in _DERIVED_KEYS
+            if chunks and all(c.get("metadata", {}).get(k) == c["id"] for c in chunks)
+        ]
+        keys = []
+        for c in chunks:
+            keys.extend(k for k in c.get("metadata", {}) if k not in keys and k not in derived)
+
+        columns = {}
+        for key in keys:
+            values, lookup = [], {}
+            codes = np.full(len(chunks), -1, dtype="int32")
+            for row, c in enumerate(chunks):
+                meta = c.get("metadata", {})
+                if key not in meta:
+                    continue
+                # values are interned by their JSON form so unhashable values work too
+                v_key = _value_key(meta[key])
+                if v_key not in lookup:
+                    lookup[v_key] = len(values)
+                    values.append(meta[key])
+                codes[row] = lookup[v_key]
+            columns[key] = (codes, values)
+
+        id_blob, id_offsets = _blob([c["id"] for c in chunks])
+        text_blob, text_offsets = _blob([c.get("text", "") for c in chunks])
+        return cls(id_blob, id_offsets, text_blob, text_offsets, columns, derived)
+
+    def update(self, keep: np.ndarray, chunks: list[dict]) -> "NodeStore":
+        """Store of the kept rows, in order, followed by `chunks`; rows shift like the vector index and BM25.
+
+        Kept rows are sliced out of the buffers and code columns without decoding them, so
+        only the added chunks are encoded and interned. Values and keys no kept or added row
+        uses are dropped; rows read back as from_chunks over the same chunks would give them.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        if not keep.any():
+            return NodeStore.from_chunks(chunks)
+        id_blob, id_offsets = _take(self.id_blob, self.id_offsets, keep, [c["id"] for c in chunks])
+        text_blob, text_offsets = _take(self.text_blob, self.text_offsets, keep, [c.get("text", "") for c in chunks])
+
+        derived = [k for k in self.derived_keys if all(c.get("metadata", {}).get(k) == c["id"] for c in chunks)]
+        keys = list(self.columns) + [k for k in self.derived_keys if k not in derived]
+        for c in chunks:
+            keys.extend(k for k in c.get("metadata", {}) if k not in keys and k not in derived)
+
+        columns = {}
+        for key in keys:
+            if key in self.columns:
+                codes, values = np.asarray(self.columns[key][0])[keep], list(self.columns[key][1])
+            elif key in self.derived_keys:
+                # no longer derived: every kept row's value is its id
+                values = [self.node_id(row) for row in np.flatnonzero(keep)]
+                codes = np.arange(len(values), dtype="int32")
+            else:
+                codes, values = np.full(int(keep.sum()), -1, dtype="int32"), []
+            lookup = {_value_key(v): code for code, v in enumerate(values)}
+            added = np.full(len(chunks), -1, dtype="int32")
+            for row, c in enumerate(chunks):
+                meta = c.get("metadata", {})
+                if key not in meta:
+                    continue
+                v_key = _value_key(meta[key])
+                if v_key not in lookup:
+                    lookup[v_key] = len(values)
+                    values.append(meta[key])
+                added[row] = lookup[v_key]
+            codes = np.concatenate([codes, added])
+
+            used = np.bincount(codes[codes >= 0], minlength=len(values)) > 0
+            if not used.any():
+                continue  # only removed rows had this key
+            if not used.all():
+                remap = (np.cumsum(used) - 1).astype("int32")
+                codes = np.where(codes >= 0, remap[codes], -1).astype("int32")
+                values = [v for v, u in zip(values, used) if u]
+            columns[key] = (codes, values)
+        return NodeStore(id_blob, id_offsets, text_blob, text_offsets, columns, derived)
+
+    def save(self, path: str) -> None:
+        _save(path, self.id_blob, self.id_offsets, self.text_blob, self.text_offsets, self.columns, self.derived_keys)
+
+    @classmethod
+    def load(cls, path: str) -> "NodeStore":
+        _, meta, a = read_array_file(path, NODES_MAGIC, versions=(NODES_FORMAT_VERSION,))
+        columns = {key: (a[spec["array"]], spec["values"]) for key, spec in meta["columns"].items()}
+        return cls(a["id_blob"], a["id_offsets"], a["text_blob"], a["text_offsets"], columns, meta["derived_keys"])
+
+    def node_id(self, row: int) -> str:
+        return self.id_blob[self.id_offsets[row]:self.id_offsets[row + 1]].tobytes().decode("utf-8")
+
+    def text(self, row: int) -> str:
+        return self.text_blob[self.text_offsets[row]:self.text_offsets[row + 1]].tobytes().decode("utf-8")
+
+    def metadata(self, row: int) -> dict:
+        meta = {}
+        for key, (codes, values) in self.columns.items():
+            code = codes[row]
+            if code >= 0:
+                meta[key] = values[code]
+        for key in self.derived_keys:
+            meta[key] = self.node_id(row)
+        return meta
+
+    def get(self, row: int) -> dict:
+        row = int(row)
+        return {"id": self.node_id(row), "row": row, "text": self.text(row), "metadata": self.metadata(row)}
+
+    def get_many(self, rows) -> list[dict]:
+        return [self.get(r) for r in rows]
+
+    def iter_chunks(self):
+        for row in range(len(self)):
+            yield self.get(row)
+
+    def rows(self, filters: dict | None) -> np.ndarray | None:
+        """Sorted rows matching all metadata equality filters, or None when there is nothing to filter."""
+        if not filters:
+            return None
+        result = None
+        for key, value in filters.items():
+            if key not in self._filter_index:
+                return np.zeros(0, dtype="int64")
+            order, indptr, lookup = self._filter_index[key]
+            code = lookup.get(_value_key(value))
+            if code is None:
+                return np.zeros(0, dtype="int64")
+            # slot 0 of indptr holds rows without the key (code -1)
+            matches = order[indptr[code + 1]:indptr[code + 2]]
+            result = matches if result is None else np.intersect1d(result, matches, assume_unique=True)
+        return result
+
+
+class NodeStoreWriter:
+    """Writes the file NodeStore.from_chunks(chunks).save(path) would, from chunks added in
+    batches. Ids and texts are spilled to temporary files next to `path` and metadata is
+    interned as it arrives, so memory holds the code columns, not the corpus text."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._spill = {name: open(f"{path}.{name}.tmp", "w+b") for name in ("ids", "texts")}
+        self._lengths = {"ids": [], "texts": []}  # int64 byte lengths, one array per batch
+        self._codes: dict[str, list[np.ndarray]] = {}
+        self._values: dict[str, tuple[list, dict]] = {}
+        self._derived = list(_DERIVED_KEYS)  # while every chunk so far has metadata[key] == id
+        self.rows = 0
+
+    def add(self, chunks: list[dict]) -> None:
+        for name, strings in (("ids", [c["id"] for c in chunks]), ("texts", [c.get("text", "") for c in chunks])):
+            encoded = [s.encode("utf-8") for s in strings]
+            self._spill[name].write(b"".join(encoded))
+            self._lengths[name].append(np.fromiter(map(len, encoded), dtype="int64", count=len(encoded)))
+
+        for key in list(self._derived):
+            if any(c.get("metadata", {}).get(key) != c["id"] for c in chunks):
+                self._derived.remove(key)
+                self._add_column(key, self._ids())  # every earlier row had value == id
+
+        for c in chunks:
+            for key in c.get("metadata", {}):
+                if key not in self._codes and key not in self._derived:
+                    self._add_column(key, [None] * self.rows)
+        for key, parts in self._codes.items():
+            parts.append(self._encode(key, [c.get("metadata", {}).get(key, _ABSENT) for c in chunks]))
+        self.rows += len(chunks)
+
+    def _add_column(self, key: str, earlier: list) -> None:
+        self._values[key] = ([], {})
+        self._codes[key] = [self._encode(key, [_ABSENT if v is None else v for v in earlier])]
+
+    def _encode(self, key: str, column: list) -> np.ndarray:
+        values, lookup = self._values[key]
+        codes = np.full(len(column), -1, dtype="int32")
+        for row, value in enumerate(column):
+            if value is _ABSENT:
+                continue
+            v_key = _value_key(value)
+            if v_key not in lookup:
+                lookup[v_key] = len(values)
+                values.append(value)
+            codes[row] = lookup[v_key]
+        return codes
+
+    def _blob(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        self._spill[name].flush()
+        lengths = np.concatenate([np.zeros(1, dtype="int64"), *self._lengths[name]])
+        offsets = np.cumsum(lengths)
+        blob = np.memmap(self._spill[name].name, dtype="uint8", mode="r") if offsets[-1] else np.zeros(0, dtype="uint8")
+        return blob, offsets
+
+    def _ids(self) -> list[str]:
+        blob, offsets = self._blob("ids")
+        return [blob[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8") for i in range(self.rows)]
+
+    def close(self) -> None:
+        """Write the store and remove the spill files."""
+        try:
+            id_blob, id_offsets = self._blob("ids")
+            text_blob, text_offsets = self._blob("texts")
+            columns = {key: (np.concatenate(parts), self._values[key][0]) for key, parts in self._codes.items()}
+            _save(self.path, id_blob, id_offsets, text_blob, text_offsets, columns, self._derived if self.rows else [])
+            del id_blob, text_blob
+        finally:
+            self.abort()
+
+    def abort(self) -> None:
+        """Remove the spill files without writing the store."""
+        for f in self._spill.values():
+            f.close()
+            if os.path.exists(f.name):
+                os.remove(f.name)
@@ -25,12 +25,16 @@ class NoOpReranker:
         logger.info(f"[reranker] no-op, returning top_n={top_n} of {len(chunks)}")
         return chunks[:top_n]
 
+    async def arerank(self, query: str, chunks: list[dict], top_n: int = 5, **kwargs):
+        return self.rerank(query, chunks, top_n=top_n)
+
 
 class CohereReranker:
     def __init__(self):
         import cohere
         s = get_settings()
         self.client = cohere.Client(s.COHERE_API_KEY)
+        self.aclient = cohere.AsyncClient(s.COHERE_API_KEY)
 
     def rerank(self, query: str, chunks: list[dict], top_n: int = 5, model: str = "rerank-english-v3.0"):
         if not chunks:
@@ -45,4 +49,19 @@ class CohereReranker:
         )
         reranked = [chunks[r.index] for r in response.results]
         logger.info(f"[reranker] done, returned={len(reranked)}")
-        return reranked
\ No newline at end of file
+        return reranked
+
+    async def arerank(self, query: str, chunks: list[dict], top_n: int = 5, model: str = "rerank-english-v3.0"):
+        if not chunks:
+            return []
+        logger.info(f"[reranker] reranking {len(chunks)} -> top_n={top_n}")
+        documents = [c["text"] for c in chunks]
+        response = await self.aclient.rerank(
+            query=query,
+            documents=documents,
+            top_n=min(top_n, len(documents)),
+            model=model
+        )
+        reranked = [chunks[r.index] for r in response.results]
+        logger.info(f"[reranker] done, returned={len(reranked)}")
+        return reranked
@@ -0,0 +1,47 @@
+import json
+
+from backend.core.config import get_settings
+from backend.core.logging import get_logger
+from backend.core.lru import LocalLRU
+
+logger = get_logger(__name__)
+
+
+class RetrievalCache:
+    """Final reranked chunk rows per (normalised query, filters, top_k, top_n, index build).
+
+    Lets regenerations, retries and answer-cache misses (rewording aside) skip FAISS, BM25
+    and the rerank call. Entries of a previous index build are dropped when the API swaps
+    a new build in (set_index_version).
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lru = LocalLRU(maxsize)
+        self.index_version = None
+
+    @staticmethod
+    def key(ctx, top_k: int, top_n: int) -> tuple:
+        filters = json.dumps(ctx.filters, sort_keys=True) if ctx.filters else ""
+        return ctx.normalized.casefold(), filters, top_k, top_n, ctx.index_version
+
+    def set_index_version(self, build_id: str) -> None:
+        if build_id != self.index_version:
+            if self.index_version is not None:
+                logger.info(f"[retrieval_cache] index build changed, dropping {len(self._lru)} entries")
+            self._lru.clear()
+            self.index_version = build_id
+
+    def get(self, ctx, top_k: int, top_n: int) -> list[int] | None:
+        return self._lru.get(self.key(ctx, top_k, top_n))
+
+    def set(self, ctx, top_k: int, top_n: int, rows: list[int]) -> None:
+        self._lru.set(self.key(ctx, top_k, top_n), tuple(rows), self.ttl_seconds)
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    s = get_settings()
+    return RetrievalCache(maxsize=s.RETRIEVAL_CACHE_SIZE, ttl_seconds=s.RETRIEVAL_CACHE_TTL_S)
@@ -1,25 +1,246 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+
 from backend.core.config import get_settings
 from backend.core.logging import get_logger
 
-from backend.retrieval.vector_search import vector_search
-from backend.retrieval.bm25_search import bm25_search
+from backend.core.executors import CPU_POOL, run_cpu
+from backend.core.metrics import CACHE_LOOKUPS, RERANK_FALLBACKS, RETRIEVAL_LEG_FAILURES
+from backend.core.tracing import span
+from backend.core.query_context import QueryContext, aembed_contexts
+from backend.retrieval.assets import filter_selector
+from backend.retrieval.vector_search import search_vectors
+from backend.retrieval.bm25_search import bm25_search, bm25_search_batch
 from backend.retrieval.fusion import reciprocal_rank_fusion
 
 logger = get_logger(__name__)
 
-def build_merged_chunks(assets, query: str, top_k: int):
+def _leg_result(name: str, future, deadline: float) -> list | None:
+    """Result of one leg, or None if it failed or missed its deadline (the other leg still counts)."""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except TimeoutError:
+        # the thread can't be interrupted; it finishes in the background and is discarded
+        logger.warning(f"[retriever] {name} leg timed out, fusing without it")
+        RETRIEVAL_LEG_FAILURES.inc(leg=name, reason="timeout")
+    except Exception as e:
+        logger.warning(f"[retriever] {name} leg failed ({e}), fusing without it")
+        RETRIEVAL_LEG_FAILURES.inc(leg=name, reason="error")
+    return None
+
+async def _aleg_result(name: str, leg, deadline: float) -> list | None:
+    """_leg_result for a coroutine leg."""
+    try:
+        return await asyncio.wait_for(leg, timeout=max(0.0, deadline - time.monotonic()))
+    except TimeoutError:
+        logger.warning(f"[retriever] {name} leg timed out, fusing without it")
+        RETRIEVAL_LEG_FAILURES.inc(leg=name, reason="timeout")
+    except Exception as e:
+        logger.warning(f"[retriever] {name} leg failed ({e}), fusing without it")
+        RETRIEVAL_LEG_FAILURES.inc(leg=name, reason="error")
+    return None
+
+def _vector_leg(index, ctx: QueryContext, top_k: int, rows, selector=None):
+    # ctx.embedding is shared with the semantic cache, so this only embeds on a cold context
+    embedding = ctx.embedding
+    with span("faiss", ctx.timings):
+        return search_vectors(index, embedding, top_k=top_k, rows=rows, selector=selector)[0]
+
+async def _avector_leg(index, ctx: QueryContext, top_k: int, rows, selector=None):
+    embedding = await ctx.aembed()  # on the event loop; the pool thread only runs FAISS
+    with span("faiss", ctx.timings):
+        return (await run_cpu(search_vectors, index, embedding, top_k=top_k, rows=rows, selector=selector))[0]
+
+def _bm25_leg(bm25, ctx: QueryContext, top_k: int, rows):
+    with span("bm25", ctx.timings):
+        return bm25_search(bm25, ctx.tokens, top_k=top_k, rows=rows)
+
+async def _abm25_leg(bm25, ctx: QueryContext, top_k: int, rows):
+    with span("bm25", ctx.timings):
+        return await run_cpu(bm25_search, bm25, ctx.tokens, top_k=top_k, rows=rows)
+
+def _filter_rows(assets, ctx: QueryContext):
+    rows = assets.nodes.rows(ctx.filters)
+    if rows is not None and len(rows) == 0:
+        logger.info(f"[retriever] no chunks match filters={ctx.filters}")
+    return rows
+
+def _fuse(assets, ctx: QueryContext, vec, bm, top_k: int, start: float) -> list[dict]:
+    ctx.degraded = vec is None or bm is None
+    vec, bm = vec or [], bm or []
+    if not vec and not bm:
+        logger.error("[retriever] both retrieval legs returned nothing")
+
+    with span("fusion", ctx.timings):
+        merged_rows = reciprocal_rank_fusion(vec, bm)
+
+        # chunk dicts are only materialised for the rows that survive fusion
+        merged_chunks = assets.nodes.get_many(merged_rows[:top_k])
+    logger.info(f"[retriever] merged_chunks={len(merged_chunks)} in {(time.monotonic() - start) * 1000:.0f}ms")
+    return merged_chunks
+
+def build_merged_chunks(assets, ctx: QueryContext, top_k: int):
+    """Hybrid top_k chunks; ctx.filters (e.g. {"doc_type": "contract"}) are applied inside both legs."""
+    s = get_settings()
+
+    start = time.monotonic()
+    rows = _filter_rows(assets, ctx)
+    if rows is not None and len(rows) == 0:
+        return []
+
+    # the vector leg mostly waits on the embedding request, so the legs overlap well on threads
+    vec_future = CPU_POOL.submit(_vector_leg, assets.index, ctx, top_k, rows, filter_selector(assets, ctx.filters))
+    bm_future = CPU_POOL.submit(_bm25_leg, assets.bm25, ctx, top_k, rows)
+
+    vec = _leg_result("vector", vec_future, start + s.VECTOR_SEARCH_TIMEOUT_S)
+    bm = _leg_result("bm25", bm_future, start + s.BM25_SEARCH_TIMEOUT_S)
+    return _fuse(assets, ctx, vec, bm, top_k, start)
+
+async def abuild_merged_chunks(assets, ctx: QueryContext, top_k: int):
+    """build_merged_chunks without blocking the event loop: the question is embedded with the
+    async client and FAISS / BM25 run on the CPU pool, with the same per-leg deadlines."""
+    s = get_settings()
+
+    start = time.monotonic()
+    rows = _filter_rows(assets, ctx)
+    if rows is not None and len(rows) == 0:
+        return []
+
+    vec, bm = await asyncio.gather(
+        _aleg_result(
+            "vector", _avector_leg(assets.index, ctx, top_k, rows, filter_selector(assets, ctx.filters)),
+            start + s.VECTOR_SEARCH_TIMEOUT_S,
+        ),
+        _aleg_result("bm25", _abm25_leg(assets.bm25, ctx, top_k, rows), start + s.BM25_SEARCH_TIMEOUT_S),
+    )
+    return _fuse(assets, ctx, vec, bm, top_k, start)
+
+def _cached_rows(result_cache, ctx: QueryContext, top_k: int, top_n: int):
+    if result_cache is None:
+        return None
+    rows = result_cache.get(ctx, top_k, top_n)
+    CACHE_LOOKUPS.inc(cache="retrieval", result="miss" if rows is None else "hit")
+    return rows
+
+def _rerank_failed(ctx: QueryContext, chunks: list[dict], top_n: int, error: Exception) -> list[dict]:
+    # the fused order is still a usable ranking; serve it, but as a degraded result
+    logger.warning(f"[retriever] rerank failed ({error}), keeping the fused order")
+    RERANK_FALLBACKS.inc()
+    ctx.degraded = True
+    return chunks[:top_n]
+
+def _rerank(reranker, ctx: QueryContext, chunks: list[dict], top_n: int) -> list[dict]:
+    with span("rerank", ctx.timings):
+        try:
+            return reranker.rerank(ctx.question, chunks, top_n=top_n)
+        except Exception as e:
+            return _rerank_failed(ctx, chunks, top_n, e)
+
+async def _arerank(reranker, ctx: QueryContext, chunks: list[dict], top_n: int) -> list[dict]:
+    with span("rerank", ctx.timings):
+        try:
+            return await reranker.arerank(ctx.question, chunks, top_n=top_n)
+        except Exception as e:
+            return _rerank_failed(ctx, chunks, top_n, e)
+
+def retrieve_top_chunks(assets, ctx: QueryContext, reranker, result_cache=None, top_k: int = 20, top_n: int = 5):
+    """Hybrid retrieval + rerank, served from result_cache (a RetrievalCache) when possible.
+    A failed rerank falls back to the fused order."""
+    rows = _cached_rows(result_cache, ctx, top_k, top_n)
+    if rows is not None:
+        logger.info(f"[retriever] result cache HIT rows={len(rows)}")
+        return assets.nodes.get_many(rows)
+
+    merged_chunks = build_merged_chunks(assets, ctx, top_k=top_k)
+    top_chunks = _rerank(reranker, ctx, merged_chunks, top_n)
+
+    # results missing a leg or the rerank are a degraded answer to this query; don't pin them
+    if result_cache is not None and top_chunks and not ctx.degraded:
+        result_cache.set(ctx, top_k, top_n, [c["row"] for c in top_chunks])
+    return top_chunks
+
+async def aretrieve_top_chunks(assets, ctx: QueryContext, reranker, result_cache=None, top_k: int = 20, top_n: int = 5):
+    """retrieve_top_chunks for async endpoints (abuild_merged_chunks + reranker.arerank)."""
+    rows = _cached_rows(result_cache, ctx, top_k, top_n)
+    if rows is not None:
+        logger.info(f"[retriever] result cache HIT rows={len(rows)}")
+        return assets.nodes.get_many(rows)
+
+    merged_chunks = await abuild_merged_chunks(assets, ctx, top_k=top_k)
+    top_chunks = await _arerank(reranker, ctx, merged_chunks, top_n)
+
+    if result_cache is not None and top_chunks and not ctx.degraded:
+        result_cache.set(ctx, top_k, top_n, [c["row"] for c in top_chunks])
+    return top_chunks
+
+async def _avector_leg_batch(index, ctxs: list[QueryContext], top_k: int, rows, selector=None):
+    await aembed_contexts(ctxs)  # one embedding request for the whole group
+    with span("faiss_batch"):
+        return await run_cpu(
+            search_vectors, index, np.stack([c.embedding for c in ctxs]), top_k=top_k, rows=rows, selector=selector
+        )
+
+async def _abm25_leg_batch(bm25, ctxs: list[QueryContext], top_k: int, rows):
+    with span("bm25_batch"):
+        return await run_cpu(bm25_search_batch, bm25, [c.tokens for c in ctxs], top_k=top_k, rows=rows)
+
+async def _amerge_group(assets, ctxs: list[QueryContext], top_k: int) -> list[list[dict]]:
+    """abuild_merged_chunks for questions sharing one filter: one FAISS search over the (n, d)
+    query matrix and one batched BM25 pass, with the per-leg deadlines of a single query."""
     s = get_settings()
 
-    vec = vector_search(assets.index, query, top_k=top_k)
-    bm = bm25_search(assets.bm25, assets.nodes_list, query, top_k=top_k)
+    start = time.monotonic()
+    rows = _filter_rows(assets, ctxs[0])
+    if rows is not None and len(rows) == 0:
+        return [[] for _ in ctxs]
+
+    vec, bm = await asyncio.gather(
+        _aleg_result(
+            "vector", _avector_leg_batch(assets.index, ctxs, top_k, rows, filter_selector(assets, ctxs[0].filters)),
+            start + s.VECTOR_SEARCH_TIMEOUT_S,
+        ),
+        _aleg_result("bm25", _abm25_leg_batch(assets.bm25, ctxs, top_k, rows), start + s.BM25_SEARCH_TIMEOUT_S),
+    )
+    return [
+        _fuse(assets, ctx, vec[i] if vec is not None else None, bm[i] if bm is not None else None, top_k, start)
+        for i, ctx in enumerate(ctxs)
+    ]
+
+async def aretrieve_top_chunks_batch(assets, ctxs: list[QueryContext], reranker, result_cache=None,
+                                     top_k: int = 20, top_n: int = 5, concurrency: int = 8) -> list:
+    """aretrieve_top_chunks for many questions at once; per question its top chunks, or the
+    exception that failed it. Questions are grouped by filters and each group is retrieved
+    in one batch; reranks run `concurrency` at a time."""
+    results: list = [None] * len(ctxs)
+    groups: dict[str, list[int]] = {}
+    for i, ctx in enumerate(ctxs):
+        rows = _cached_rows(result_cache, ctx, top_k, top_n)
+        if rows is not None:
+            results[i] = assets.nodes.get_many(rows)
+        else:
+            groups.setdefault(json.dumps(ctx.filters, sort_keys=True), []).append(i)
+    logger.info(f"[retriever] batch of {len(ctxs)}: {len(ctxs) - sum(map(len, groups.values()))} result cache hits, {len(groups)} filter groups")
+
+    merged: dict[int, list[dict]] = {}
+    for members in groups.values():
+        try:
+            for i, chunks in zip(members, await _amerge_group(assets, [ctxs[i] for i in members], top_k)):
+                merged[i] = chunks
+        except Exception as e:
+            logger.error(f"[retriever] batch group failed: {e}")
+            for i in members:
+                results[i] = e
 
-    merged_ids = reciprocal_rank_fusion(vec, bm)
+    semaphore = asyncio.Semaphore(concurrency)
 
-    merged_chunks = []
-    for cid in merged_ids[:top_k]:
-        if cid in assets.nodes_by_id:
-            merged_chunks.append(assets.nodes_by_id[cid])
+    async def rerank(i: int) -> None:
+        async with semaphore:
+            results[i] = await _arerank(reranker, ctxs[i], merged[i], top_n)
+        if result_cache is not None and results[i] and not ctxs[i].degraded:
+            result_cache.set(ctxs[i], top_k, top_n, [c["row"] for c in results[i]])
 
-    # Note: vector_results have node ids that should match node_data ids
-    logger.info(f"[retriever] merged_chunks={len(merged_chunks)}")
-    return merged_chunks
\ No newline at end of file
+    await asyncio.gather(*(rerank(i) for i in merged))
+    return results
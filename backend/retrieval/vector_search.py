@@ -1,13 +1,54 @@
+import numpy as np
+
 from backend.core.logging import get_logger
+from backend.core.vectorstores.faiss_vector_store import id_selector, search_params
 
 logger = get_logger(__name__)
 
-def vector_search(index, query: str, top_k: int = 20, filters=None):
-    logger.info(f"[vector_search] top_k={top_k}")
+def vector_search_batch(index, embedder, queries: list[str], top_k: int = 20, rows: np.ndarray | None = None):
+    """Embed all queries in one request and run a single FAISS search over the (N, d) matrix.
+
+    Returns one ranked list of (row, l2_distance) per query; FAISS ids are node store rows.
+    rows restricts the search to those ids through an IDSelector, so non-matching vectors are
+    skipped inside FAISS rather than retrieved and thrown away.
+    """
+    logger.info(f"[vector_search] queries={len(queries)} top_k={top_k} filtered={rows is not None}")
+    if not queries:
+        return []
+    if rows is not None and len(rows) == 0:
+        return [[] for _ in queries]
+
+    query_vectors = np.asarray(embedder.embed_queries(queries), dtype="float32")
+    return search_vectors(index, query_vectors, top_k=top_k, rows=rows)
+
+def search_vectors(index, query_vectors: np.ndarray, top_k: int = 20, rows: np.ndarray | None = None, selector=None):
+    """FAISS search for already-embedded queries; same results as vector_search_batch.
+    selector, when given, is a prebuilt IDSelector for `rows` (see build_filter_selectors)."""
+    query_vectors = np.ascontiguousarray(np.atleast_2d(query_vectors), dtype="float32")
+    if rows is not None and len(rows) == 0:
+        return [[] for _ in query_vectors]
+
+    if rows is None:
+        distances, ids = index.search(query_vectors, top_k)
+    else:
+        if selector is None:
+            selector = id_selector(rows, index.ntotal)
+        distances, ids = index.search(query_vectors, top_k, params=search_params(index, selector))
+
+        # IVF probes / HNSW beams can hold fewer than top_k members of a selective filter
+        short = np.flatnonzero((ids >= 0).sum(axis=1) < min(top_k, len(rows)))
+        if len(short):
+            distances[short], ids[short] = index.search(
+                query_vectors[short], top_k, params=search_params(index, selector, exhaustive=True)
+            )
+
+    results = [
+        [(int(i), float(d)) for d, i in zip(row_distances, row_ids) if i >= 0]
+        for row_distances, row_ids in zip(distances, ids)
+    ]
 
-    # LlamaIndex retriever (filters optional later)
-    retriever = index.as_retriever(similarity_top_k=top_k)
-    results = retriever.retrieve(query)
+    logger.info(f"[vector_search] queries={len(results)} got={sum(len(r) for r in results)}")
+    return results
 
-    logger.info(f"[vector_search] got={len(results)}")
-    return results
\ No newline at end of file
+def vector_search(index, embedder, query: str, top_k: int = 20, rows: np.ndarray | None = None):
+    return vector_search_batch(index, embedder, [query], top_k=top_k, rows=rows)[0]
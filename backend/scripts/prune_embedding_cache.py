@@ -0,0 +1,30 @@
+"""Drop embedding cache entries the live build no longer uses.
+Run from project root: python -m backend.scripts.prune_embedding_cache"""
+import os
+
+from backend.core.config import get_settings
+from backend.core.constants import EMBED_KEYS_FILE
+from backend.core.storage import current_build_dir
+from backend.ingestion.embedding_cache import EmbeddingCache, load_keys
+from backend.ingestion.incremental import read_manifest
+
+def main():
+    s = get_settings()
+    if not s.EMBED_CACHE_PATH or not os.path.exists(s.EMBED_CACHE_PATH):
+        print("No embedding cache.")
+        return
+    live_dir = current_build_dir(s.STORAGE_DIR)
+    since = (read_manifest(live_dir) or {}).get("embedding_cache_run")
+    keys_path = os.path.join(live_dir, EMBED_KEYS_FILE)
+    if since is None or not os.path.exists(keys_path):
+        print("The live build doesn't record which cache entries it uses; run a full ingestion first.")
+        return
+    cache = EmbeddingCache(s.EMBED_CACHE_PATH, model="", dimension=0)
+    before = cache.size()
+    # entries of runs newer than the live build belong to an ingestion that may still be running
+    removed = cache.prune(since, keep=load_keys(keys_path))
+    print(f"Removed {removed} of {before} cached embeddings.")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
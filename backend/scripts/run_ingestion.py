@@ -1,11 +1,17 @@
 import os
+import shutil
 from backend.core.config import get_settings
 from backend.core.logging import setup_logging, get_logger
 
 from backend.core.embeddings.factory import get_embedder
-from backend.ingestion.loader import load_documents
-from backend.ingestion.chunker import chunk_documents
-from backend.ingestion.indexer import build_vector_index, build_bm25_index, write_manifest
+from backend.ingestion.loader import list_documents
+from backend.ingestion.parsing import load_chunks
+from backend.ingestion.embedding_cache import new_run_id
+from backend.ingestion.indexer import write_manifest
+from backend.ingestion.pipeline import run_pipeline
+from backend.ingestion.incremental import file_hashes, read_manifest, plan_update, update_indexes
+from backend.core.vectorstores.faiss_vector_store import describe_faiss_index
+from backend.core.storage import current_build_dir, new_build_id, new_build_dir, publish_build
 
 logger = get_logger(__name__)
 
@@ -18,25 +24,61 @@ def main():
     documents_dir = s.DOCUMENTS_DIR
     storage_dir = s.STORAGE_DIR
 
-    # 1) Load docs
-    docs = load_documents(documents_dir)
-
-    # 2) Chunk docs
-    nodes = chunk_documents(docs)
-
-    # 3) Embedder (provider-injected)
+    # 1) Embedder (provider-injected)
     embedder = get_embedder()
     logger.info(f"[embedder] Using: {embedder.name} (dim={embedder.dimension})")
 
-    # 4) Build indexes
-    build_vector_index(nodes, embedder, storage_dir=storage_dir)
-    build_bm25_index(nodes, storage_dir=storage_dir)
+    # 2) What changed since the live build
+    live_dir = current_build_dir(storage_dir)
+    live_manifest = read_manifest(live_dir)
+    hashes = file_hashes(list_documents(documents_dir))
+    plan = None
+    if s.INGEST_INCREMENTAL:
+        plan = plan_update(live_manifest, hashes, embedder.dimension, live_dir)
+    if plan is not None and not any(plan):
+        logger.info("=== PHASE 1: INGESTION DONE (up to date) ===")
+        return
+
+    # every run writes a new build next to the live one; servers keep using the live one until it's published
+    build_id = new_build_id()
+    build_dir = new_build_dir(storage_dir, build_id)
+    # every embedding this run uses is stamped with one run id; prune_embedding_cache keeps the
+    # entries of the live build and of runs newer than it
+    cache_run = new_run_id()
+    try:
+        if plan is None:
+            # 3-4) Load -> chunk -> embed -> index, streamed in batches
+            index = run_pipeline(hashes, embedder, storage_dir=build_dir, cache_run=cache_run)
+        else:
+            changed, removed = plan
+
+            # 3) Load + chunk new and changed docs only
+            nodes = load_chunks({path: hashes[path] for path in changed})
+
+            # 4) Replace their chunks (and drop removed files') in a copy of the live indexes
+            index = update_indexes(
+                nodes, embedder, live_dir, drop_files=changed + removed, target_dir=build_dir, cache_run=cache_run
+            )
+
+        # 5) Manifest
+        write_manifest(
+            embedder_name=embedder.name,
+            embed_dim=embedder.dimension,
+            storage_dir=build_dir,
+            vector_index=describe_faiss_index(index),
+            files=hashes,
+            build_id=build_id,
+            embedding_cache_run=cache_run,
+        )
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
 
-    # 5) Manifest
-    write_manifest(embedder_name=embedder.name, embed_dim=embedder.dimension, storage_dir=storage_dir)
+    # 6) Point STORAGE_DIR/CURRENT at the new build; API servers pick it up from there
+    publish_build(storage_dir, build_dir, keep=s.STORAGE_KEEP_BUILDS)
 
     logger.info("=== PHASE 1: INGESTION DONE ===")
-    logger.info(f"Storage ready at: {os.path.abspath(storage_dir)}")
+    logger.info(f"Storage ready at: {os.path.abspath(build_dir)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
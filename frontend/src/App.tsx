@@ -1,5 +1,5 @@
 import { useState, useRef, useEffect } from 'react';
-import { sendQuery } from './api';
+import { streamQuery } from './api';
 import { ChatMessage } from './components/ChatMessage';
 
 interface Message {
@@ -48,21 +48,15 @@ export default function App() {
     ]);
     setIsSubmitting(true);
 
+    const update = (patch: (m: Message) => Partial<Message>) =>
+      setMessages((prev) => prev.map((m) => (m.id === assistantId ? { ...m, ...patch(m) } : m)));
+
     try {
-      const res = await sendQuery(q);
-      setMessages((prev) =>
-        prev.map((m) =>
-          m.id === assistantId
-            ? {
-                ...m,
-                content: res.answer,
-                sources: res.sources,
-                isLoading: false,
-                useTypingEffect: true,
-              }
-            : m
-        )
-      );
+      // tokens render as they arrive; sources come with the final event
+      await streamQuery(q, {
+        onToken: (text) => update((m) => ({ content: m.content + text, isLoading: false, useTypingEffect: false })),
+        onDone: (done) => update(() => ({ sources: done.sources, isLoading: false })),
+      });
     } catch (err) {
       setMessages((prev) =>
         prev.map((m) =>
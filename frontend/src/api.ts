@@ -19,3 +19,45 @@ export async function sendQuery(question: string): Promise<QueryResponse> {
   }
   return res.json();
 }
+
+export interface StreamDone {
+  sources: string[];
+  cache_hit: boolean;
+  ttft_ms: number | null;
+}
+
+export interface StreamHandlers {
+  onToken: (text: string) => void;
+  onDone: (done: StreamDone) => void;
+}
+
+// POST /query/stream: server-sent events read off the fetch body (EventSource can't POST)
+export async function streamQuery(question: string, handlers: StreamHandlers): Promise<void> {
+  const res = await fetch(`${API_URL}/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ question, doc_type: null }),
+  });
+  if (!res.ok || !res.body) {
+    const err = await res.text();
+    throw new Error(err || `Request failed: ${res.status}`);
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let end;
+    while ((end = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      const event = block.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] ?? 'null');
+      if (event === 'token') handlers.onToken(data.text);
+      else if (event === 'done') handlers.onDone(data);
+      else if (event === 'error') throw new Error(data.detail);
+    }
+  }
+}
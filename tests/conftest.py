@@ -1,10 +1,12 @@
 """Pytest fixtures for law firm RAG system tests."""
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 
 from backend.api.main import create_app
-from backend.api.deps import get_assets, get_chain, get_cache, get_reranker
+from backend.api.deps import get_assets, get_chain, get_stream_chain, get_cache, get_reranker, get_retrieval_cache
+from backend.retrieval.node_store import NodeStore
+from backend.retrieval.result_cache import RetrievalCache
 
 
 @pytest.fixture
@@ -14,12 +16,17 @@ def mock_assets():
         {"id": "n1", "text": "Contract law governs agreements.", "metadata": {"file_name": "contracts.pdf"}},
         {"id": "n2", "text": "Liability limits apply.", "metadata": {"file_name": "liability.docx"}},
     ]
+    embedder = MagicMock()
+    embedder.aembed_query = AsyncMock(side_effect=lambda text: embedder.embed_query(text))
+    embedder.aembed_queries = AsyncMock(side_effect=lambda texts: embedder.embed_queries(texts))
     return MagicMock(
-        nodes_list=nodes,
-        nodes_by_id={n["id"]: n for n in nodes},
+        nodes=NodeStore.from_chunks(nodes),
         index=MagicMock(),
         bm25=MagicMock(),
-        manifest={"embedding_provider": "openai"},
+        manifest={"embedding_provider": "openai", "build_id": "test-build"},
+        build_id="test-build",
+        embedder=embedder,
+        filter_selectors={},
     )
 
 
@@ -31,6 +38,25 @@ def mock_chain():
     output.answer = "Based on the documents, the answer is X."
     output.sources_used = ["contracts.pdf"]
     chain.invoke.return_value = output
+    chain.ainvoke = AsyncMock(side_effect=lambda inputs: chain.invoke(inputs))
+
+    async def abatch_as_completed(inputs, config=None, return_exceptions=False):
+        for i, x in enumerate(inputs):
+            yield i, chain.invoke(x)
+
+    chain.abatch_as_completed.side_effect = abatch_as_completed
+    return chain
+
+
+@pytest.fixture
+def mock_stream_chain():
+    """Streaming chain: the same answer in pieces, then the sources trailer."""
+    async def astream(inputs):
+        for piece in ["Based on the documents, ", "the answer is X.", "\nSOUR", "CES: contracts.pdf"]:
+            yield piece
+
+    chain = MagicMock()
+    chain.astream.side_effect = astream
     return chain
 
 
@@ -39,6 +65,9 @@ def mock_cache():
     """Cache that always misses."""
     cache = MagicMock()
     cache.check.return_value = None
+    cache.acheck = AsyncMock(side_effect=lambda ctx: cache.check(ctx))
+    cache.acheck_many = AsyncMock(side_effect=lambda ctxs: [cache.check(ctx) for ctx in ctxs])
+    cache.asave = AsyncMock(side_effect=lambda ctx, answer: cache.save(ctx, answer))
     return cache
 
 
@@ -47,13 +76,15 @@ def mock_reranker():
     """Reranker that returns chunks as-is."""
     reranker = MagicMock()
     reranker.rerank.side_effect = lambda q, chunks, top_n=5, **kw: chunks[:top_n]
+    reranker.arerank = AsyncMock(side_effect=lambda q, chunks, top_n=5, **kw: reranker.rerank(q, chunks, top_n=top_n, **kw))
     return reranker
 
 
 @pytest.fixture
-def client(mock_assets, mock_chain, mock_cache, mock_reranker):
+def client(mock_assets, mock_chain, mock_stream_chain, mock_cache, mock_reranker):
     """Test client with mocked dependencies."""
     app = create_app()
+    retrieval_cache = RetrievalCache(maxsize=16, ttl_seconds=60)
 
     def override_get_assets():
         return mock_assets
@@ -70,7 +101,9 @@ def client(mock_assets, mock_chain, mock_cache, mock_reranker):
     app.dependency_overrides = {
         get_assets: override_get_assets,
         get_chain: override_get_chain,
+        get_stream_chain: lambda: mock_stream_chain,
         get_cache: override_get_cache,
         get_reranker: override_get_reranker,
+        get_retrieval_cache: lambda: retrieval_cache,
     }
     return TestClient(app)
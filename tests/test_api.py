@@ -14,18 +14,11 @@ def test_health(client):
 
 def test_query_endpoint(client, mock_assets, mock_chain):
     """Query endpoint returns answer when retrieval finds chunks."""
-    # Make build_merged_chunks return some chunks by mocking index and bm25
-    node_scores = [MagicMock(), MagicMock()]
-    node_scores[0].node = MagicMock()
-    node_scores[0].node.node_id = "n1"
-    node_scores[1].node = MagicMock()
-    node_scores[1].node.node_id = "n2"
-
-    retriever = MagicMock()
-    retriever.retrieve.return_value = node_scores
-    mock_assets.index.as_retriever.return_value = retriever
-
+    # Make build_merged_chunks return some chunks by mocking the FAISS search and bm25
     import numpy as np
+    mock_assets.embedder.embed_query.return_value = [0.1, 0.2]
+    mock_assets.index.search.return_value = (np.array([[0.1, 0.4]]), np.array([[0, 1]]))
+
     mock_assets.bm25.get_scores.return_value = np.array([0.5, 0.3])  # n1, n2
 
     r = client.post("/query", json={"question": "What is contract law?"})
@@ -37,6 +30,23 @@ def test_query_endpoint(client, mock_assets, mock_chain):
     assert data["cache_hit"] is False
 
 
+def test_query_reuses_cached_retrieval(client, mock_assets, mock_reranker):
+    """A repeated question skips FAISS, BM25 and the reranker; another doc_type does not."""
+    import numpy as np
+    mock_assets.embedder.embed_query.return_value = [0.1, 0.2]
+    mock_assets.index.search.return_value = (np.array([[0.1, 0.4]]), np.array([[0, 1]]))
+    mock_assets.bm25.get_scores.return_value = np.array([0.5, 0.3])
+
+    for question in ("What is contract law?", "what is  contract law?"):
+        r = client.post("/query", json={"question": question})
+        assert r.status_code == 200
+    assert mock_assets.index.search.call_count == 1
+    assert mock_reranker.rerank.call_count == 1
+
+    client.post("/query", json={"question": "What is contract law?", "doc_type": "contract"})
+    assert mock_reranker.rerank.call_count == 2
+
+
 def test_query_cache_hit(client, mock_assets, mock_cache):
     """Query returns cached answer when cache hits."""
     mock_cache.check.return_value = "Cached answer here"
@@ -48,6 +58,177 @@ def test_query_cache_hit(client, mock_assets, mock_cache):
     assert data["cache_hit"] is True
 
 
+def test_query_holds_many_requests_in_flight(client, mock_assets, mock_chain):
+    """/query awaits I/O instead of holding a threadpool thread, so far more than ~40 requests overlap."""
+    import asyncio
+    import httpx
+    import numpy as np
+    mock_assets.embedder.embed_query.return_value = [0.1, 0.2]
+    mock_assets.index.search.return_value = (np.array([[0.1, 0.4]]), np.array([[0, 1]]))
+    mock_assets.bm25.get_scores.return_value = np.array([0.5, 0.3])
+
+    n, in_flight = 200, 0
+
+    async def slow_llm(inputs):
+        # every request waits in the LLM call until all of them are in it at once
+        nonlocal in_flight
+        in_flight += 1
+        if in_flight == n:
+            all_in.set()
+        await asyncio.wait_for(all_in.wait(), timeout=10)
+        return mock_chain.invoke(inputs)
+
+    mock_chain.ainvoke.side_effect = slow_llm
+
+    async def run():
+        nonlocal all_in
+        all_in = asyncio.Event()
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(http.post("/query", json={"question": f"Question {i}?"}) for i in range(n)))
+
+    all_in = None
+    responses = asyncio.run(run())
+    assert all(r.status_code == 200 for r in responses)
+    assert in_flight == n
+
+
+def test_identical_queries_in_flight_share_one_run(client, mock_assets, mock_chain):
+    """Concurrent requests with the same normalised question and filters coalesce into one
+    retrieval + LLM call; a different doc_type runs on its own."""
+    import asyncio
+    import httpx
+    import numpy as np
+    from backend.core.metrics import QUERY_COALESCED
+    mock_assets.embedder.embed_query.return_value = [0.1, 0.2]
+    mock_assets.index.search.return_value = (np.array([[0.1, 0.4]]), np.array([[0, 1]]))
+    mock_assets.bm25.get_scores.return_value = np.array([0.5, 0.3])
+
+    n, before = 50, QUERY_COALESCED.value(scope="process")
+
+    async def slow_llm(inputs):
+        # hold the leader until every identical request has attached to it
+        async def attached():
+            while QUERY_COALESCED.value(scope="process") - before < n - 1:
+                await asyncio.sleep(0.01)
+        if inputs["question"] != "Other?":
+            await asyncio.wait_for(attached(), timeout=10)
+        return mock_chain.invoke(inputs)
+
+    mock_chain.ainvoke.side_effect = slow_llm
+
+    async def run():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            same = [http.post("/query", json={"question": "What is  contract law?" if i % 2 else "what is contract LAW?"}) for i in range(n)]
+            other = http.post("/query", json={"question": "What is contract law?", "doc_type": "contract"})
+            return await asyncio.gather(*same, other)
+
+    responses = asyncio.run(run())
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.json()["answer"] for r in responses}) == 1
+    assert mock_chain.ainvoke.call_count == 2
+    assert QUERY_COALESCED.value(scope="process") - before == n - 1
+
+
+def test_query_debug_timings_and_metrics(client, mock_assets, mock_reranker):
+    """Each stage is timed into debug.timings_ms and /metrics; a failed rerank keeps the fused order."""
+    import numpy as np
+    from backend.core.metrics import RERANK_FALLBACKS
+    mock_assets.embedder.embed_query.return_value = [0.1, 0.2]
+    mock_assets.index.search.return_value = (np.array([[0.1, 0.4]]), np.array([[0, 1]]))
+    mock_assets.bm25.get_scores.return_value = np.array([0.5, 0.3])
+    mock_reranker.arerank.side_effect = RuntimeError("Cohere 429")
+    fallbacks = RERANK_FALLBACKS.value()
+
+    r = client.post("/query", json={"question": "What is contract law?", "debug": True})
+    assert r.status_code == 200
+    timings = r.json()["debug"]["timings_ms"]
+    assert set(timings) == {"cache_lookup", "embed", "faiss", "bm25", "fusion", "rerank", "llm", "query"}
+    assert timings["query"] >= timings["llm"]
+    assert RERANK_FALLBACKS.value() == fallbacks + 1
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    text = metrics.text
+    assert "# TYPE query_stage_seconds histogram" in text
+    assert 'query_stage_seconds_bucket{stage="faiss",le="+Inf"}' in text
+    assert 'query_stage_seconds_quantile{stage="llm",quantile="0.99"}' in text
+    assert 'cache_lookups_total{cache="answer",result="miss"}' in text
+    assert "rerank_fallbacks_total" in text
+
+
+def _sse_events(body: str) -> list[tuple[str, dict]]:
+    import json
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_query_stream_sends_tokens_then_sources(client, mock_assets, mock_cache):
+    """/query/stream forwards answer text as it is generated; the sources trailer only shows up in `done`."""
+    import numpy as np
+    from backend.core.metrics import QUERY_TTFT
+    mock_assets.embedder.embed_query.return_value = [0.1, 0.2]
+    mock_assets.index.search.return_value = (np.array([[0.1, 0.4]]), np.array([[0, 1]]))
+    mock_assets.bm25.get_scores.return_value = np.array([0.5, 0.3])
+    observed = QUERY_TTFT.count(cache_hit=False)
+
+    r = client.post("/query/stream", json={"question": "What is contract law?"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(r.text)
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens).strip() == "Based on the documents, the answer is X."
+    event, done = events[-1]
+    assert event == "done"
+    assert done["sources"] == ["contracts.pdf"] and done["cache_hit"] is False and done["ttft_ms"] is not None
+    mock_cache.save.assert_called_once()
+    assert mock_cache.save.call_args.args[1] == "Based on the documents, the answer is X."
+    assert QUERY_TTFT.count(cache_hit=False) == observed + 1
+
+    mock_cache.check.return_value = "Cached answer here"
+    events = _sse_events(client.post("/query/stream", json={"question": "cached question?"}).text)
+    assert events[0] == ("token", {"text": "Cached answer here"})
+    assert events[1][0] == "done" and events[1][1]["cache_hit"] is True
+
+
+def test_query_batch_shares_embedding_and_search(client, mock_assets, mock_cache, mock_chain):
+    """/query/batch: one cache pass, one embedding request and one FAISS search for the misses;
+    per-question results and errors come back as NDJSON lines keyed by index."""
+    import json
+    import numpy as np
+    mock_cache.check.side_effect = lambda ctx: "Cached answer" if ctx.question == "cached?" else None
+    mock_assets.embedder.embed_queries.side_effect = lambda texts: [[0.1, 0.2] for _ in texts]
+    mock_assets.index.search.return_value = (np.array([[0.1, 0.4], [0.2, 0.3]]), np.array([[0, 1], [1, 0]]))
+    mock_assets.bm25.corpus_size = 2
+    mock_assets.bm25.get_scores_batch.return_value = np.array([[0.5, 0.3], [0.1, 0.9]])
+
+    def generate(inputs):
+        if inputs["question"] == "fails?":
+            raise RuntimeError("LLM down")
+        return mock_chain.invoke.return_value
+
+    mock_chain.invoke.side_effect = generate
+    questions = ["cached?", "What is contract law?", "fails?"]
+    r = client.post("/query/batch", json={"queries": [{"question": q} for q in questions]})
+    assert r.status_code == 200
+    items = {item["index"]: item for item in map(json.loads, r.text.splitlines())}
+    assert sorted(items) == [0, 1, 2]
+    assert items[0]["cache_hit"] is True and items[0]["answer"] == "Cached answer"
+    assert items[1]["answer"] == "Based on the documents, the answer is X." and items[1]["sources"] == ["contracts.pdf"]
+    assert items[2]["answer"] is None and "LLM down" in items[2]["error"]
+
+    mock_cache.acheck_many.assert_awaited_once()
+    mock_assets.embedder.embed_queries.assert_called_once_with(["What is contract law?", "fails?"])
+    assert mock_assets.index.search.call_count == 1
+    assert mock_assets.index.search.call_args.args[0].shape == (2, 2)
+
+
 def test_query_schema():
     """QueryRequest and QueryResponse validate correctly."""
     req = QueryRequest(question="test", doc_type=None)
@@ -58,3 +239,52 @@ def test_query_schema():
     assert resp.answer == "x"
     assert resp.sources == ["s1"]
     assert resp.cache_hit is False
+
+
+def test_reload_swaps_build_after_in_flight_requests(tmp_path, monkeypatch):
+    """A published build serves new requests at once; the old one is released when its last request ends."""
+    import json
+    from backend.core.config import get_settings
+    from backend.core.storage import new_build_dir, publish_build
+    from backend.retrieval.asset_manager import AssetManager
+    from backend.retrieval.assets import load_manifest
+    from backend.retrieval.node_store import NodeStore
+    from backend.retrieval.result_cache import RetrievalCache
+
+    monkeypatch.setattr(get_settings(), "STORAGE_DIR", str(tmp_path))
+
+    def publish(build_id):
+        build_dir = new_build_dir(str(tmp_path), build_id)
+        with open(f"{build_dir}/manifest.json", "w") as f:
+            json.dump({"build_id": build_id}, f)
+        publish_build(str(tmp_path), build_dir, keep=2)
+
+    def loader(build_dir):
+        nodes = NodeStore.from_chunks([{"id": "n1", "text": "Contract law.", "metadata": {}}])
+        return MagicMock(build_id=load_manifest(build_dir)["build_id"], nodes=nodes, index=MagicMock(ntotal=0))
+
+    retrieval_cache = RetrievalCache(maxsize=4, ttl_seconds=60)
+    manager = AssetManager(loader, on_swap=[lambda a: retrieval_cache.set_index_version(a.build_id)])
+    publish("b1")
+    with manager.acquire() as first:
+        old_entry = manager._current
+        retrieval_cache._lru.set("q", (0,), 60)
+        publish("b2")
+        assert manager.reload() == {"status": "reloaded", "build_id": "b2"}
+        assert manager.reload() == {"status": "unchanged", "build_id": "b2"}
+        with manager.acquire() as second:
+            assert (first.build_id, second.build_id) == ("b1", "b2")
+        assert retrieval_cache.index_version == "b2" and len(retrieval_cache._lru) == 0
+        assert manager._current.assets is second and old_entry.assets is first  # still pinned
+    assert old_entry.assets is None  # released with its last request
+    publish("b3")
+    assert sorted(p.name for p in (tmp_path / "builds").iterdir()) == ["b2", "b3"]
+
+
+def test_admin_reload_requires_token(client, monkeypatch):
+    """/admin/reload is off without ADMIN_TOKEN and rejects a wrong X-Admin-Token."""
+    from backend.core.config import get_settings
+    monkeypatch.setattr(get_settings(), "ADMIN_TOKEN", "")
+    assert client.post("/admin/reload", headers={"X-Admin-Token": ""}).status_code == 403
+    monkeypatch.setattr(get_settings(), "ADMIN_TOKEN", "secret")
+    assert client.post("/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
@@ -0,0 +1,109 @@
+"""Answer cache unit tests."""
+import threading
+
+import numpy as np
+
+from backend.generation.cache import EmbeddingMatrix, normalize
+
+
+def test_embedding_matrix_search_and_ring_buffer():
+    """Lookup is a cosine mat-vec over live rows; the oldest rows are overwritten past max_entries."""
+    rng = np.random.default_rng(0)
+    vectors = [normalize(v) for v in rng.standard_normal((5, 8))]
+    matrix = EmbeddingMatrix(max_entries=4)
+    for i, v in enumerate(vectors[:4]):
+        matrix.add(f"k{i}", v, expires_at=200.0 if i != 2 else 50.0)
+
+    assert matrix.search(vectors[1], threshold=0.95, now=100.0) == ["k1"]
+    assert matrix.search(vectors[2], threshold=0.95, now=100.0) == []  # expired
+    assert matrix.search(normalize(vectors[1] + 0.01), threshold=0.95, now=100.0) == ["k1"]
+
+    matrix.add("k4", vectors[4], expires_at=200.0)
+    assert len(matrix) == 4
+    assert matrix.search(vectors[0], threshold=0.95, now=100.0) == []  # overwritten by k4
+    assert matrix.search(vectors[4], threshold=0.95, now=100.0) == ["k4"]
+
+    matrix.drop("k4")
+    assert matrix.search(vectors[4], threshold=0.95, now=100.0) == []
+    assert matrix.search(np.ones(3, dtype="float32"), threshold=0.0) == []  # other embedding model
+
+
+def test_embedding_matrix_concurrent_search_and_add():
+    """Searches racing adds (growth and ring overwrites) never fail and only return keys whose
+    vector matched."""
+    rng = np.random.default_rng(1)
+    vectors = [normalize(v) for v in rng.standard_normal((64, 16))]
+    matrix = EmbeddingMatrix(max_entries=48)
+    stop, errors = threading.Event(), []
+
+    def write():
+        for n in range(20000):
+            matrix.add(f"k{n % 64}", vectors[n % 64], expires_at=float("inf"))
+        stop.set()
+
+    def read():
+        try:
+            while not stop.is_set():
+                i = int(rng.integers(64))
+                assert set(matrix.search(vectors[i], threshold=0.99)) <= {f"k{i}"}
+                for j, keys in zip((i, 63 - i), matrix.search_many(np.stack([vectors[i], vectors[63 - i]]), threshold=0.99)):
+                    assert set(keys) <= {f"k{j}"}
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+def test_exact_tier_answers_without_embedding():
+    """Repeated questions hit the exact tier (L1, then Redis) and never touch the embedder."""
+    from unittest.mock import MagicMock, patch
+    from backend.core.query_context import QueryContext
+    from backend.generation.cache import SemanticCache, exact_key
+
+    embedder = MagicMock()
+    ctx = QueryContext("What is  a contract?", embedder, filters={"doc_type": "contract"}, index_version="b1")
+    assert exact_key(ctx) == exact_key(QueryContext(" what is a CONTRACT? ", embedder, {"doc_type": "contract"}, "b1"))
+    assert exact_key(ctx) != exact_key(QueryContext("What is a contract?", embedder, None, "b1"))
+    assert exact_key(ctx) != exact_key(QueryContext("What is a contract?", embedder, {"doc_type": "contract"}, "b2"))
+
+    redis_client = MagicMock()
+    redis_client.pipeline.return_value.execute.return_value = [b"From Redis", 60_000]
+    with patch("redis.from_url", return_value=redis_client):
+        cache = SemanticCache(max_entries=10)
+
+    assert cache.check(ctx) == "From Redis"
+    redis_client.pipeline.return_value.execute.return_value = [None, -2]
+    assert cache.check(ctx) == "From Redis"  # now served by the in-process L1
+    embedder.embed_query.assert_not_called()
+    redis_client.xread.assert_not_called()
+
+
+def test_semantic_tier_only_matches_the_same_doc_type():
+    """The same question under another doc_type filter misses the semantic tier instead of
+    getting the answer retrieved for the other filter."""
+    from unittest.mock import MagicMock, patch
+    from backend.core.query_context import QueryContext
+    from backend.generation.cache import CACHE_STREAM, SemanticCache
+
+    embedder = MagicMock()
+    embedder.embed_query.return_value = [1.0, 0.0, 0.0]
+    redis_client = MagicMock()
+    pipe = redis_client.pipeline.return_value
+    with patch("redis.from_url", return_value=redis_client):
+        cache = SemanticCache(max_entries=10)
+
+    saved = QueryContext("What is the notice period?", embedder, {"doc_type": "contract"}, "b1")
+    cache.save(saved, "Thirty days.")
+    fields = {k.encode(): v if isinstance(v, bytes) else str(v).encode() for k, v in pipe.xadd.call_args[0][1].items()}
+    redis_client.xread.side_effect = [[[CACHE_STREAM, [(b"1-0", fields)]]], []]
+    cache.local.clear()
+
+    pipe.execute.side_effect = [[None, -2]]
+    assert cache.check(QueryContext("What's the notice period?", embedder, {"doc_type": "case_file"}, "b1")) is None
+    pipe.execute.side_effect = [[None, -2], [b"Thirty days."]]
+    assert cache.check(QueryContext("What's the notice period?", embedder, {"doc_type": "contract"}, "b1")) == "Thirty days."
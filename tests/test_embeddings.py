@@ -0,0 +1,97 @@
+"""Embedding provider unit tests."""
+import numpy as np
+import pytest
+
+from backend.core.embeddings.local_embedder import LocalHashEmbedder
+
+
+def test_local_embedder_is_deterministic_and_lexical():
+    """Same text -> same unit vector (batched or not); shared words -> higher cosine."""
+    embedder = LocalHashEmbedder(dimension=256)
+    texts = ["The tenant shall pay rent monthly.", "Rent is payable by the tenant each month.", "Indemnity clause"]
+
+    batch = embedder.embed_array(texts)
+    assert batch.shape == (3, 256) and batch.dtype == np.float32
+    assert np.allclose(np.linalg.norm(batch, axis=1), 1.0)
+    assert np.array_equal(batch[0], np.asarray(embedder.embed_query(texts[0]), dtype="float32"))
+    assert np.array_equal(batch, LocalHashEmbedder(dimension=256).embed_array(texts))
+    assert batch[0] @ batch[1] > batch[0] @ batch[2]
+
+    assert np.array_equal(embedder.embed_array([""]), np.zeros((1, 256), dtype="float32"))
+
+
+def test_local_llama_embedding_matches_embedder():
+    """The LlamaIndex adapter used by ingestion returns the same vectors as the query embedder."""
+    from backend.core.embeddings.local_llama import LocalHashEmbedding
+
+    llama = LocalHashEmbedding(dimension=64)
+    texts = ["breach of contract", "notice period"]
+    assert llama.get_text_embedding_batch(texts) == LocalHashEmbedder(64).embed_documents(texts)
+    assert llama.get_query_embedding("notice period") == LocalHashEmbedder(64).embed_query("notice period")
+
+
+def test_embedding_scheduler_packs_by_tokens_and_retries():
+    """Batches respect the token and size budgets, results keep input order, 429s are retried."""
+    from unittest.mock import MagicMock
+    from backend.ingestion.embedding_scheduler import EmbeddingScheduler
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    calls = []
+
+    def embed_documents(texts):
+        calls.append(list(texts))
+        if len(calls) == 2:
+            raise RateLimited()
+        return [[float(t)] for t in texts]
+
+    embedder = MagicMock(dimension=1)
+    embedder.embed_documents.side_effect = embed_documents
+    scheduler = EmbeddingScheduler(
+        embedder, max_batch_tokens=10, max_batch_size=3, concurrency=1, max_retries=2,
+        backoff_s=0.0, token_counter=lambda texts: [int(t) for t in texts],
+    )
+    texts = ["4", "4", "1", "9", "12", "1", "1", "1", "1"]
+
+    assert [(a, b) for a, b, _ in scheduler.pack(texts)] == [(0, 3), (3, 4), (4, 5), (5, 8), (8, 9)]
+    assert scheduler.embed(texts)[:, 0].tolist() == [float(t) for t in texts]
+    assert scheduler.stats["retries"] == 1 and scheduler.stats["tokens"] == 34
+    assert len(calls) == 6  # second batch sent twice
+
+    embedder.embed_documents.side_effect = ValueError("bad input")  # not retryable
+    with pytest.raises(ValueError):
+        scheduler.embed(texts)
+
+
+def test_embedding_cache_skips_unchanged_chunks(tmp_path):
+    """A second run over the same corpus makes no embedding calls; prune drops what it no longer uses."""
+    from backend.ingestion.embedding_cache import EmbeddingCache
+    from backend.ingestion.embedding_scheduler import EmbeddingScheduler
+
+    embedder = LocalHashEmbedder(32)
+    path = str(tmp_path / "embeddings.sqlite")
+    texts = ["notice period", "governing law", "notice period", "indemnity"]
+
+    def run(texts):
+        cache = EmbeddingCache(path, embedder.model, embedder.dimension)
+        sent = []
+        scheduler = EmbeddingScheduler(embedder, concurrency=1, cache=cache)
+        scheduler._embed_batch = lambda batch: (sent.extend(batch), embedder.embed_array(batch))[1]
+        return scheduler.embed(texts), sent, cache
+
+    first, sent, cache = run(texts)
+    assert sent == ["notice period", "governing law", "indemnity"]  # duplicates embedded once
+    assert np.allclose(first, embedder.embed_array(texts))
+    cache.close()
+
+    second, sent, cache = run(texts)
+    assert sent == [] and cache.stats["hit_rate"] == 1.0
+    assert np.array_equal(first, second)
+    cache.close()
+
+    _, sent, cache = run(["governing law", "termination"])
+    assert sent == ["termination"]
+    assert cache.prune() == 2 and cache.size() == 2
+    other = EmbeddingCache(path, embedder.model, 64)  # another dimension never shares entries
+    assert other.get_many([other.key("termination")]) == {}
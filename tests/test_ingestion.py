@@ -0,0 +1,158 @@
+import os
+from unittest.mock import MagicMock, patch
+
+from llama_index.core.schema import MetadataMode
+
+
+def test_load_chunks_reuses_parsed_text_and_chunks(tmp_path, monkeypatch):
+    """Unchanged files are never re-parsed; new chunk settings re-chunk cached text only."""
+    from backend.core.config import get_settings
+    from backend.ingestion.incremental import file_hashes
+    from backend.ingestion import parsing
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "contract.txt").write_text("The notice period is thirty days. " * 40)
+    (docs / "case.txt").write_text("The court held the clause void. " * 40)
+    files = file_hashes(sorted(str(p) for p in docs.iterdir()))
+    monkeypatch.setattr(get_settings(), "PARSE_CACHE_DIR", str(tmp_path / "cache"))
+
+    first = parsing.load_chunks(files, workers=1)
+    assert {n.metadata["doc_type"] for n in first} == {"contract", "case_file"}
+    assert "file_path" in first[0].get_content(metadata_mode=MetadataMode.EMBED)
+    assert "file_size" not in first[0].get_content(metadata_mode=MetadataMode.EMBED)
+
+    with patch.object(parsing, "_extract", side_effect=AssertionError("re-parsed")):
+        again = parsing.load_chunks(files, workers=1)
+        assert [(n.node_id, n.get_content(metadata_mode=MetadataMode.EMBED)) for n in again] == \
+            [(n.node_id, n.get_content(metadata_mode=MetadataMode.EMBED)) for n in first]
+
+        monkeypatch.setattr(get_settings(), "CHUNK_SIZE", 64)
+        smaller = parsing.load_chunks(files, workers=1)
+        assert len(smaller) > len(first)
+
+
+def test_streaming_pipeline_matches_batch_build(tmp_path, monkeypatch):
+    """Streamed in small batches through one embedder, the build writes the same stores as the
+    one-shot indexer; a failing stage aborts it without leaving spill files behind."""
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy as np
+    import faiss
+    import pytest
+    from backend.core.config import get_settings
+    from backend.core.embeddings.local_embedder import LocalHashEmbedder
+    from backend.core.exceptions import IndexBuildError
+    from backend.ingestion.incremental import file_hashes
+    from backend.ingestion.indexer import build_vector_index, build_bm25_index
+    from backend.ingestion.parsing import load_chunks
+    from backend.ingestion.pipeline import run_pipeline
+    from backend.retrieval.bm25_index import BM25Index
+    from backend.retrieval.node_store import NodeStore
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(4):
+        (docs / f"contract_{i}.txt").write_text(f"Clause {i}: the notice period is {i + 1} months. " * 60)
+    files = file_hashes(sorted(str(p) for p in docs.iterdir()))
+    s = get_settings()
+    monkeypatch.setattr(s, "PARSE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(s, "EMBED_CACHE_PATH", "")
+    monkeypatch.setattr(s, "INGEST_WORKERS", 1)
+    monkeypatch.setattr(s, "INGEST_BATCH_SIZE", 3)
+    monkeypatch.setattr(s, "INGEST_QUEUE_SIZE", 1)
+    embedder = LocalHashEmbedder(32)
+
+    nodes = load_chunks(files)
+    build_vector_index(nodes, embedder, str(tmp_path / "batch"))
+    build_bm25_index(nodes, str(tmp_path / "batch"))
+    with patch("backend.ingestion.embedding_scheduler.ThreadPoolExecutor", wraps=ThreadPoolExecutor) as pools:
+        index = run_pipeline(files, embedder, str(tmp_path / "stream"))
+    assert pools.call_count == 1  # one embedding thread pool shared by every batch
+
+    batch, stream = tmp_path / "batch", tmp_path / "stream"
+    expected = faiss.read_index(str(batch / "vectors.faiss"))
+    assert np.array_equal(index.reconstruct_n(0, index.ntotal), expected.reconstruct_n(0, expected.ntotal))
+    assert list(NodeStore.load(str(stream / "nodes.bin")).iter_chunks()) == \
+        list(NodeStore.load(str(batch / "nodes.bin")).iter_chunks())
+    query = ["notice", "period", "3"]
+    assert np.allclose(BM25Index.load(str(stream / "bm25.bin")).get_scores(query),
+                       BM25Index.load(str(batch / "bm25.bin")).get_scores(query))
+
+    monkeypatch.setattr("backend.retrieval.bm25_index.BM25Builder.add", MagicMock(side_effect=ValueError("boom")))
+    with pytest.raises(IndexBuildError, match="boom"):
+        run_pipeline(files, embedder, str(tmp_path / "failed"))
+    assert not [p for p in os.listdir(tmp_path / "failed") if p.endswith(".tmp")]
+
+
+def test_prune_keeps_every_embedding_of_the_live_build(tmp_path, monkeypatch):
+    """Pruning after a multi-batch build or an incremental update keeps exactly the entries of
+    the chunks the live build holds."""
+    from llama_index.core.schema import MetadataMode
+    from backend.core.config import get_settings
+    from backend.core.embeddings.factory import get_embed_model_id
+    from backend.ingestion.embedding_cache import EmbeddingCache
+    from backend.ingestion.incremental import file_hashes
+    from backend.ingestion.parsing import load_chunks
+    from backend.scripts import prune_embedding_cache, run_ingestion
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(4):
+        (docs / f"contract_{i}.txt").write_text(f"Clause {i}: the notice period is {i + 1} months. " * 60)
+    s = get_settings()
+    for name, value in {
+        "DOCUMENTS_DIR": str(docs), "STORAGE_DIR": str(tmp_path / "storage"), "PARSE_CACHE_DIR": str(tmp_path / "parsed"),
+        "EMBED_CACHE_PATH": str(tmp_path / "embeddings.sqlite"), "EMBED_PROVIDER": "local", "EMBED_DIMENSION": 32,
+        "INGEST_WORKERS": 1, "INGEST_BATCH_SIZE": 3, "INGEST_INCREMENTAL": True,
+    }.items():
+        monkeypatch.setattr(s, name, value)
+
+    def prune():
+        """(chunks in the corpus, their entries missing from the cache, entries left)."""
+        prune_embedding_cache.main()
+        cache = EmbeddingCache(s.EMBED_CACHE_PATH, get_embed_model_id(), s.EMBED_DIMENSION)
+        nodes = load_chunks(file_hashes(sorted(str(p) for p in docs.iterdir())))
+        keys = [cache.key(n.get_content(metadata_mode=MetadataMode.EMBED)) for n in nodes]
+        found = cache.get_many(keys)
+        size = cache.size()
+        cache.close()
+        return len(nodes), sum(k not in found for k in keys), size
+
+    run_ingestion.main()
+    n_chunks, missing, size = prune()
+    assert n_chunks > 2 * s.INGEST_BATCH_SIZE and missing == 0 and size == n_chunks
+
+    (docs / "contract_1.txt").write_text("Clause 1 now sets a notice period of two weeks. " * 60)
+    (docs / "contract_4.txt").write_text("Clause 4: the governing law is Dutch law. " * 60)
+    (docs / "contract_3.txt").unlink()
+    run_ingestion.main()  # incremental: only contract_1 and contract_4 are embedded
+    n_chunks, missing, size = prune()
+    assert missing == 0 and size == n_chunks  # entries of the old contract_1 and contract_3 are gone
+
+
+def test_ivf_training_sample_is_bounded(tmp_path, monkeypatch):
+    """The IVF builder trains on a bounded sample drawn from the whole stream, not its head,
+    and every vector still ends up in the index in order."""
+    import numpy as np
+    from backend.core.config import get_settings
+    from backend.ingestion import pipeline
+
+    s = get_settings()
+    monkeypatch.setattr(s, "VECTOR_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(s, "VECTOR_IVF_NLIST", 4)
+    bound = 4 * pipeline._TRAIN_POINTS_PER_CENTROID
+    vectors = np.random.default_rng(0).standard_normal((10 * bound, 8)).astype("float32")
+    vectors[:, 0] = np.arange(len(vectors))  # position in the stream
+
+    builder = pipeline._VectorIndexBuilder(8, str(tmp_path / "spill.tmp"))
+    for start in range(0, len(vectors), 100):  # batches straddle the bound
+        builder.add(vectors[start:start + 100])
+        assert builder._sample.shape == (bound, 8)
+    positions = builder._sample[:, 0]
+    assert len(np.unique(positions)) == bound and positions.max() > 5 * bound  # not just the first vectors
+    assert (positions >= 5 * bound).sum() > bound // 4
+
+    index = builder.finish()
+    assert index.ntotal == len(vectors)
+    assert np.allclose(index.reconstruct_n(0, index.ntotal), vectors)
+    assert not list(tmp_path.iterdir())  # spill file removed
@@ -3,10 +3,13 @@ import pytest
 from pathlib import Path
 
 from backend.core.config import get_settings
+from backend.core.constants import NODES_FILE
+from backend.core.storage import current_build_dir
 from backend.evaluation.dataset_io import load_json, save_json
 from backend.evaluation.test_generator import generate_test_cases
 from backend.evaluation.faithfulness import run_faithfulness_audit
 from backend.evaluation.citation_check import validate_citations
+from backend.retrieval.node_store import NodeStore
 
 FAITHFULNESS_THRESHOLD = 0.9
 
@@ -15,9 +18,9 @@ def golden_dataset():
     s = get_settings()
     dataset_path = s.EVAL_DATASET_PATH
 
-    # Load sample chunks from storage/nodes.json
-    nodes_path = Path(s.STORAGE_DIR) / "nodes.json"
-    chunks = load_json(str(nodes_path))
+    # Load sample chunks from the live build's nodes.bin
+    nodes_path = Path(current_build_dir(s.STORAGE_DIR)) / NODES_FILE
+    chunks = list(NodeStore.load(str(nodes_path)).iter_chunks())
 
     # If dataset exists, use it (stable + fast)
     if Path(dataset_path).exists():
@@ -5,40 +5,24 @@ import numpy as np
 
 from backend.retrieval.fusion import reciprocal_rank_fusion
 from backend.retrieval.bm25_search import bm25_search
+from backend.core.query_context import QueryContext
 
 
 def test_reciprocal_rank_fusion():
     """RRF merges vector and BM25 results by score."""
-    vec_results = [
-        MagicMock(), MagicMock(), MagicMock(),
-    ]
-    vec_results[0].node = MagicMock()
-    vec_results[0].node.node_id = "a"
-    vec_results[1].node = MagicMock()
-    vec_results[1].node.node_id = "b"
-    vec_results[2].node = MagicMock()
-    vec_results[2].node.node_id = "c"
-
-    bm25_results = [
-        {"id": "b", "text": "b"},
-        {"id": "a", "text": "a"},
-        {"id": "d", "text": "d"},
-    ]
+    vec_results = [(0, 0.1), (1, 0.2), (2, 0.3)]
+    bm25_results = [(1, 2.5), (0, 1.7), (3, 0.4)]
 
     merged = reciprocal_rank_fusion(vec_results, bm25_results, k=60)
-    # Both lists have a, b. So a and b should rank high. c only in vec, d only in bm25.
-    assert "a" in merged
-    assert "b" in merged
-    assert "c" in merged
-    assert "d" in merged
-    assert len(merged) == 4
-    # a and b appear in both, so they should be first
-    assert merged[0] in ("a", "b")
-    assert merged[1] in ("a", "b")
+    # Both lists have rows 0, 1. So they should rank high. 2 only in vec, 3 only in bm25.
+    assert sorted(merged) == [0, 1, 2, 3]
+    # 0 and 1 appear in both, so they should be first
+    assert merged[0] in (0, 1)
+    assert merged[1] in (0, 1)
 
 
 def test_bm25_search():
-    """BM25 search returns top-k nodes by score."""
+    """BM25 search returns top-k (row, score) pairs."""
     from rank_bm25 import BM25Okapi
 
     corpus = [
@@ -47,37 +31,387 @@ def test_bm25_search():
         ["contract", "breach"],
     ]
     bm25 = BM25Okapi(corpus)
-    nodes = [
-        {"id": "n1", "text": "contract law agreement", "metadata": {}},
-        {"id": "n2", "text": "liability limit", "metadata": {}},
-        {"id": "n3", "text": "contract breach", "metadata": {}},
-    ]
 
-    results = bm25_search(bm25, nodes, "contract", top_k=2)
+    results = bm25_search(bm25, "contract", top_k=2)
     assert len(results) == 2
-    ids = [r["id"] for r in results]
-    assert "n1" in ids or "n3" in ids  # both contain "contract"
+    assert {row for row, _ in results} == {0, 2}  # both contain "contract"
+
+
+def test_bm25_index_matches_bm25okapi():
+    """BM25Index scores and rankings are identical to rank_bm25.BM25Okapi."""
+    from rank_bm25 import BM25Okapi
+    from backend.retrieval.bm25_index import BM25Index
+    from backend.retrieval.bm25_search import top_k_indices
+
+    corpus = [
+        ["contract", "law", "agreement"],
+        ["liability", "limit"],
+        ["contract", "breach", "contract"],
+        ["termination", "notice", "agreement"],
+        ["liability", "contract"],
+    ]
+    okapi = BM25Okapi(corpus)
+    index = BM25Index.from_corpus(corpus)
+
+    for query in (["contract"], ["liability", "agreement"], ["contract", "contract"], ["unknown"]):
+        expected = okapi.get_scores(query)
+        assert np.array_equal(index.get_scores(query), expected)
+        ranked = sorted(range(len(expected)), key=lambda i: expected[i], reverse=True)[:3]
+        assert top_k_indices(index.get_scores(query), 3).tolist() == ranked
+
+
+def test_bm25_index_binary_roundtrip(tmp_path):
+    """bm25.bin loads memory-mapped, scores identically and rejects unknown format versions."""
+    import struct
+    from backend.core.exceptions import ConfigError
+    from backend.retrieval.bm25_index import BM25Index
+
+    corpus = [["contract", "law", "agreement"], ["liability", "limit"], ["contract", "breach", "naïve"]]
+    built = BM25Index.from_corpus(corpus)
+    path = tmp_path / "bm25.bin"
+    built.save(str(path))
+
+    loaded = BM25Index.load(str(path))
+    assert loaded.corpus_size == 3
+    for query in (["contract"], ["naïve", "limit"], ["missing"]):
+        assert np.array_equal(loaded.get_scores(query), built.get_scores(query))
+
+    raw = bytearray(path.read_bytes())
+    raw[8:12] = struct.pack("<I", 99)
+    path.write_bytes(bytes(raw))
+    with pytest.raises(ConfigError):
+        BM25Index.load(str(path))
+
+
+def test_top_k_indices_breaks_ties_by_index():
+    """Partial top-k keeps the order of a stable full sort."""
+    from backend.retrieval.bm25_search import top_k_indices
+
+    scores = np.array([0.5, 1.0, 0.5, 0.0, 1.0, 0.5])
+    assert top_k_indices(scores, 4).tolist() == [1, 4, 0, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 4, 0, 2, 5, 3]
+    assert top_k_indices(scores, 0).tolist() == []
 
 
 def test_build_merged_chunks(mock_assets):
-    """build_merged_chunks returns chunks from assets.nodes_by_id."""
+    """build_merged_chunks materialises fused rows from assets.nodes."""
+    from backend.retrieval.retriever import build_merged_chunks
+
+    with patch("backend.retrieval.retriever.search_vectors") as mock_vs:
+        with patch("backend.retrieval.retriever.bm25_search") as mock_bm:
+            mock_vs.return_value = [[(0, 0.1)]]
+            mock_bm.return_value = [(1, 0.2), (0, 0.1)]
+
+            chunks = build_merged_chunks(mock_assets, QueryContext("query", mock_assets.embedder), top_k=20)
+            assert [c["id"] for c in chunks] == ["n1", "n2"]
+            assert chunks[1]["metadata"] == {"file_name": "liability.docx"}
+
+
+def test_build_merged_chunks_survives_failed_or_slow_leg(mock_assets):
+    """A leg that raises or misses its timeout is dropped; RRF still runs on the other one."""
+    import time
     from backend.retrieval.retriever import build_merged_chunks
 
-    vec_results = [MagicMock()]
-    vec_results[0].node = MagicMock()
-    vec_results[0].node.node_id = "n1"
+    def slow_vector_search(*args, **kwargs):
+        time.sleep(0.5)
+        return [[(0, 0.1)]]
 
-    retriever = MagicMock()
-    retriever.retrieve.return_value = vec_results
-    mock_assets.index.as_retriever.return_value = retriever
+    settings = MagicMock(VECTOR_SEARCH_TIMEOUT_S=0.05, BM25_SEARCH_TIMEOUT_S=1.0)
+    with patch("backend.retrieval.retriever.get_settings", return_value=settings), \
+            patch("backend.retrieval.retriever.search_vectors", side_effect=slow_vector_search), \
+            patch("backend.retrieval.retriever.bm25_search", return_value=[(1, 0.2)]):
+        chunks = build_merged_chunks(mock_assets, QueryContext("query", mock_assets.embedder), top_k=20)
+    assert [c["id"] for c in chunks] == ["n2"]
 
-    mock_assets.bm25.get_scores.return_value = np.array([0.1, 0.2])
+    with patch("backend.retrieval.retriever.search_vectors", return_value=[[(0, 0.1)]]), \
+            patch("backend.retrieval.retriever.bm25_search", side_effect=RuntimeError("boom")):
+        chunks = build_merged_chunks(mock_assets, QueryContext("query", mock_assets.embedder), top_k=20)
+    assert [c["id"] for c in chunks] == ["n1"]
 
-    with patch("backend.retrieval.retriever.vector_search") as mock_vs:
-        with patch("backend.retrieval.retriever.bm25_search") as mock_bm:
-            mock_vs.return_value = vec_results
-            mock_bm.return_value = [{"id": "n2", "text": "x", "metadata": {}}]
 
-            chunks = build_merged_chunks(mock_assets, "query", top_k=20)
-            assert len(chunks) >= 1
-            assert all("id" in c and "text" in c for c in chunks)
+def test_async_merged_chunks_match_sync_and_drop_slow_leg(mock_assets):
+    """abuild_merged_chunks fuses the same rows as the sync path and applies the same leg deadlines."""
+    import asyncio
+    import time
+    from backend.retrieval.retriever import abuild_merged_chunks, build_merged_chunks
+
+    with patch("backend.retrieval.retriever.search_vectors", return_value=[[(0, 0.1)]]), \
+            patch("backend.retrieval.retriever.bm25_search", return_value=[(1, 0.2), (0, 0.1)]):
+        sync = build_merged_chunks(mock_assets, QueryContext("query", mock_assets.embedder), top_k=20)
+        ctx = QueryContext("query", mock_assets.embedder)
+        assert asyncio.run(abuild_merged_chunks(mock_assets, ctx, top_k=20)) == sync
+    mock_assets.embedder.aembed_query.assert_awaited_once_with("query")
+
+    def slow_bm25(*args, **kwargs):
+        time.sleep(0.5)
+        return [(1, 0.2)]
+
+    settings = MagicMock(VECTOR_SEARCH_TIMEOUT_S=1.0, BM25_SEARCH_TIMEOUT_S=0.05)
+    with patch("backend.retrieval.retriever.get_settings", return_value=settings), \
+            patch("backend.retrieval.retriever.search_vectors", return_value=[[(0, 0.1)]]), \
+            patch("backend.retrieval.retriever.bm25_search", side_effect=slow_bm25):
+        ctx = QueryContext("query", mock_assets.embedder)
+        assert [c["id"] for c in asyncio.run(abuild_merged_chunks(mock_assets, ctx, top_k=20))] == ["n1"]
+    assert ctx.degraded
+
+
+def test_query_embedded_once_per_request(mock_assets):
+    """The context's embedding is computed once and reused by the vector leg; the LRU skips repeats."""
+    from backend.core.embeddings.cached_embedder import CachedQueryEmbedder
+    from backend.retrieval.retriever import build_merged_chunks
+
+    inner = MagicMock()
+    inner.embed_query.side_effect = lambda text: [float(len(text)), 1.0]
+    embedder = CachedQueryEmbedder(inner, maxsize=2)
+    mock_assets.index.search.return_value = (np.array([[0.1]]), np.array([[0]]))
+
+    ctx = QueryContext("  what   is a contract? ", embedder)
+    assert ctx.normalized == "what is a contract?"
+    assert ctx.embedding.tolist() == [19.0, 1.0]  # e.g. semantic cache lookup
+    with patch("backend.retrieval.retriever.bm25_search", return_value=[]):
+        assert [c["id"] for c in build_merged_chunks(mock_assets, ctx, top_k=5)] == ["n1"]
+    assert ctx.embedding.tolist() == [19.0, 1.0]  # e.g. semantic cache save
+    assert inner.embed_query.call_count == 1
+
+    QueryContext("what is a contract?", embedder).embedding
+    assert inner.embed_query.call_count == 1
+    for q in ("a", "b", "what is a contract?"):
+        embedder.embed_query(q)
+    assert inner.embed_query.call_count == 4  # evicted by "a" and "b"
+
+
+def test_node_store_roundtrip(tmp_path):
+    """nodes.bin loads memory-mapped and rebuilds the same chunk dicts by row."""
+    from backend.retrieval.node_store import NodeStore
+
+    chunks = [
+        {"id": "a", "text": "Contract law.", "metadata": {"file_name": "c.pdf", "doc_type": "contract", "chunk_id": "a"}},
+        {"id": "b", "text": "Naïve clause.", "metadata": {"file_name": "c.pdf", "doc_type": "contract", "chunk_id": "b"}},
+        {"id": "c", "text": "", "metadata": {"file_name": "m.txt", "chunk_id": "c"}},
+    ]
+    path = tmp_path / "nodes.bin"
+    NodeStore.from_chunks(chunks).save(str(path))
+
+    store = NodeStore.load(str(path))
+    assert len(store) == 3
+    assert [{k: v for k, v in c.items() if k != "row"} for c in store.iter_chunks()] == chunks
+    assert store.get(1)["row"] == 1
+    assert store.rows({"doc_type": "contract"}).tolist() == [0, 1]
+    assert store.rows({"doc_type": "contract", "file_name": "m.txt"}).tolist() == []
+    assert store.rows({"doc_type": "memo"}).tolist() == []
+    assert store.rows(None) is None
+
+
+def test_vector_search_batch():
+    """N queries are embedded in one call and searched with one FAISS call over an (N, d) matrix."""
+    import faiss
+    from backend.retrieval.vector_search import vector_search_batch, vector_search
+
+    vectors = np.eye(3, dtype="float32")
+    index = faiss.IndexFlatL2(3)
+    index.add(vectors)
+    embedder = MagicMock()
+    embedder.embed_queries.side_effect = lambda qs: [vectors[int(q)] for q in qs]
+
+    results = vector_search_batch(index, embedder, ["2", "0"], top_k=2)
+    embedder.embed_queries.assert_called_once_with(["2", "0"])
+    assert [r[0][0] for r in results] == [2, 0]
+    assert all(len(r) == 2 for r in results)
+    assert results[0][0][1] == pytest.approx(0.0)
+
+    assert vector_search(index, embedder, "1", top_k=1) == [(1, 0.0)]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+def test_filtered_search_returns_full_top_k(index_type):
+    """A metadata filter is applied inside both legs: only allowed rows, still top_k of them."""
+    from backend.core.vectorstores.faiss_vector_store import create_faiss_index, train_faiss_index, set_search_params
+    from backend.retrieval.bm25_index import BM25Index
+    from backend.retrieval.vector_search import vector_search_batch
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 16)).astype("float32")
+    index = create_faiss_index(16, index_type, n_train=len(vectors), nlist=32, hnsw_m=8)
+    train_faiss_index(index, vectors)
+    index.add(vectors)
+    set_search_params(index, nprobe=1, ef_search=16)
+
+    rows = np.arange(7, 2000, 97)  # 21 rows, mostly outside the probed lists / beam
+    embedder = MagicMock()
+    embedder.embed_queries.return_value = vectors[:2]
+    results = vector_search_batch(index, embedder, ["q1", "q2"], top_k=10, rows=rows)
+    for query, hits in zip(vectors[:2], results):
+        exact = rows[np.argsort(((vectors[rows] - query) ** 2).sum(axis=1))[:10]]
+        assert [r for r, _ in hits] == exact.tolist()
+
+    bm25 = BM25Index.from_corpus([["contract", "law"], ["memo"], ["contract", "memo"], ["memo"], ["policy"], ["notice"]])
+    assert [r for r, _ in bm25_search(bm25, "contract", top_k=5, rows=np.array([1, 2, 3]))] == [2, 1, 3]
+
+
+def test_doc_type_selectors_are_built_once():
+    """Each doc_type gets one IDSelectorBitmap at load; filtered searches reuse it instead of
+    filling a bitmap per query, with the same results."""
+    import faiss
+    from backend.retrieval.assets import build_filter_selectors, filter_selector
+    from backend.retrieval.node_store import NodeStore
+    from backend.retrieval.vector_search import search_vectors
+
+    doc_types = ["contract", "memo"] * 50
+    store = NodeStore.from_chunks([{"id": str(i), "text": "", "metadata": {"doc_type": t}} for i, t in enumerate(doc_types)])
+    vectors = np.random.default_rng(0).standard_normal((len(doc_types), 8)).astype("float32")
+    index = faiss.IndexFlatL2(8)
+    index.add(vectors)
+
+    assets = MagicMock(filter_selectors=build_filter_selectors(store, index.ntotal))
+    assert set(assets.filter_selectors) == {"contract", "memo"}
+    assert filter_selector(assets, {"doc_type": "memo", "file_name": "m.txt"}) is None
+    rows = store.rows({"doc_type": "memo"})
+    with patch("backend.retrieval.vector_search.id_selector") as built:
+        hits = search_vectors(index, vectors[:3], top_k=5, rows=rows, selector=filter_selector(assets, {"doc_type": "memo"}))
+    built.assert_not_called()
+    assert hits == search_vectors(index, vectors[:3], top_k=5, rows=rows)
+    assert all(r % 2 == 1 for found in hits for r, _ in found)
+
+
+def test_build_merged_chunks_applies_filters(mock_assets):
+    """Filters become a row set passed to both legs; no matching rows skips retrieval."""
+    from backend.retrieval.retriever import build_merged_chunks
+
+    with patch("backend.retrieval.retriever.search_vectors", return_value=[[(1, 0.1)]]) as mock_vs, \
+            patch("backend.retrieval.retriever.bm25_search", return_value=[(1, 0.2)]) as mock_bm:
+        ctx = QueryContext("query", mock_assets.embedder, filters={"file_name": "liability.docx"})
+        chunks = build_merged_chunks(mock_assets, ctx, top_k=20)
+        assert [c["id"] for c in chunks] == ["n2"]
+        assert mock_vs.call_args.kwargs["rows"].tolist() == [1]
+        assert mock_bm.call_args.kwargs["rows"].tolist() == [1]
+
+        ctx = QueryContext("query", mock_assets.embedder, filters={"file_name": "none.pdf"})
+        assert build_merged_chunks(mock_assets, ctx, top_k=20) == []
+        assert mock_vs.call_count == 1
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_faiss_index_types(index_type):
+    """Every VECTOR_INDEX_TYPE trains, finds an exact self-match and describes itself for the manifest."""
+    from backend.core.vectorstores.faiss_vector_store import (
+        create_faiss_index, train_faiss_index, set_search_params, describe_faiss_index,
+    )
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((512, 32)).astype("float32")
+
+    index = create_faiss_index(32, index_type, n_train=len(vectors), nlist=64, pq_m=8, hnsw_m=16)
+    train_faiss_index(index, vectors)
+    index.add(vectors)
+    set_search_params(index, nprobe=64, ef_search=64)
+
+    _, ids = index.search(vectors[:5], 1)
+    assert describe_faiss_index(index)["type"] == index_type
+    if index_type != "ivf_pq":  # PQ is lossy
+        assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_mmap_load_matches_heap_load(tmp_path, index_type):
+    """An index mapped read-only from vectors.faiss searches exactly like one read onto the heap,
+    filtered or not."""
+    import faiss
+    from backend.core.vectorstores.faiss_vector_store import (
+        create_faiss_index, train_faiss_index, set_search_params, read_faiss_index,
+    )
+    from backend.retrieval.vector_search import search_vectors
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1024, 32)).astype("float32")
+    index = create_faiss_index(32, index_type, n_train=len(vectors), nlist=16, pq_m=8, hnsw_m=16)
+    train_faiss_index(index, vectors)
+    index.add(vectors)
+    path = str(tmp_path / "vectors.faiss")
+    faiss.write_index(index, path)
+
+    heap = read_faiss_index(path, index_type=index_type)
+    mapped = read_faiss_index(path, index_type=index_type, mmap=True)
+    queries = vectors[:8] + 0.1 * rng.standard_normal((8, 32)).astype("float32")
+    rows = np.arange(3, 1024, 7)
+    for loaded in (heap, mapped):
+        set_search_params(loaded, nprobe=4, ef_search=32)
+    assert mapped.ntotal == heap.ntotal == len(vectors)
+    assert search_vectors(mapped, queries, top_k=10) == search_vectors(heap, queries, top_k=10)
+    assert search_vectors(mapped, queries, top_k=10, rows=rows) == search_vectors(heap, queries, top_k=10, rows=rows)
+
+
+def test_validate_manifest_checks_vector_index_type():
+    """An index built as one type can't be served with VECTOR_INDEX_TYPE set to another."""
+    from backend.core.config import get_settings
+    from backend.core.exceptions import ConfigError
+    from backend.retrieval.assets import validate_manifest
+
+    s = get_settings()
+    manifest = {"embedding_provider": s.EMBED_PROVIDER, "embedding_model": s.EMBED_MODEL, "chunk_size": s.CHUNK_SIZE}
+    validate_manifest(manifest)  # older manifests without vector_index are flat
+
+    with pytest.raises(ConfigError):
+        validate_manifest({**manifest, "vector_index": {"type": "hnsw"}})
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+def test_faiss_update_keeps_rows_dense(index_type):
+    """Removed rows disappear, kept rows shift down in order and new vectors follow, as after a rebuild."""
+    from backend.core.vectorstores.faiss_vector_store import (
+        create_faiss_index, train_faiss_index, set_search_params, update_faiss_index,
+    )
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((600, 32)).astype("float32")
+    added = rng.standard_normal((50, 32)).astype("float32")
+    keep = np.ones(len(vectors), dtype=bool)
+    keep[100:200] = False
+
+    index = create_faiss_index(32, index_type, n_train=len(vectors), nlist=16, hnsw_m=16)
+    train_faiss_index(index, vectors)
+    index.add(vectors)
+    index = update_faiss_index(index, keep, added)
+    set_search_params(index, nprobe=16, ef_search=64)
+
+    expected = np.concatenate([vectors[keep], added])
+    _, ids = index.search(expected[::25], 1)
+    assert index.ntotal == len(expected)
+    assert ids[:, 0].tolist() == list(range(0, len(expected), 25))
+
+
+def test_incremental_bm25_and_node_store_match_rebuild(tmp_path):
+    """Deltas on the stored BM25 index and node store equal building them from the final corpus."""
+    from backend.retrieval.bm25_index import BM25Index
+    from backend.retrieval.node_store import NodeStore
+
+    docs = {
+        "a.pdf": ["notice period is thirty days", "termination for cause"],
+        "b.pdf": ["governing law is england", "notice must be written"],
+        "c.pdf": ["payment within thirty days", "late payment interest"],
+    }
+    chunks = [
+        {"id": f"{f}-{i}", "text": t, "metadata": {"file_path": f, "chunk_id": f"{f}-{i}"}}
+        for f, texts in docs.items() for i, t in enumerate(texts)
+    ]
+    chunks[0]["metadata"]["parties"] = ["Acme", "Bolt"]  # only on a removed row
+    chunks[4]["metadata"]["chunk_id"] = "c-first"          # chunk_id no longer derivable from the id
+    BM25Index.from_corpus([c["text"].split() for c in chunks[:4]]).save(str(tmp_path / "bm25.bin"))
+    NodeStore.from_chunks(chunks[:4]).save(str(tmp_path / "nodes.bin"))
+    bm25 = BM25Index.load(str(tmp_path / "bm25.bin"))
+    store = NodeStore.load(str(tmp_path / "nodes.bin"))
+
+    # a.pdf removed, c.pdf added
+    keep = np.ones(len(store), dtype=bool)
+    keep[store.rows({"file_path": "a.pdf"})] = False
+    bm25 = bm25.update(keep, [c["text"].split() for c in chunks[4:]])
+    store = store.update(keep, chunks[4:])
+
+    final = chunks[2:]
+    rebuilt = BM25Index.from_corpus([c["text"].split() for c in final])
+    assert "termination" not in bm25.vocab
+    for query in (["notice", "thirty"], ["payment", "law"], ["termination"]):
+        assert np.allclose(bm25.get_scores(query), rebuilt.get_scores(query))
+    assert list(store.iter_chunks()) == list(NodeStore.from_chunks(final).iter_chunks())
+    assert store.rows({"file_path": "c.pdf"}).tolist() == [2, 3]
+    assert store.columns["file_path"][1] == ["b.pdf", "c.pdf"] and "parties" not in store.columns
+    assert store.update(np.zeros(len(store), dtype=bool), chunks[:1]).get(0)["metadata"] == chunks[0]["metadata"]